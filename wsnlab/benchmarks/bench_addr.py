@@ -0,0 +1,75 @@
+"""Microbenchmark of address handling in Node.can_receive() and SensorNode.route_and_forward_package().
+
+The data_collection_tree.py scenario is run first (in a temporary directory, visualization off) to
+get formed neighbor, member and child network tables. Then both calls are timed on the final
+nodes with unicast packages to every assigned address. Sending and route logging are disabled
+while route_and_forward_package() is timed, so only the routing decision is measured.
+
+Usage (from wsnlab directory):
+    python benchmarks/bench_addr.py [--duration T] [--repeat R]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+WSNLAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(1, WSNLAB_DIR)
+import data_collection_tree
+from source import wsnlab
+
+
+def run_scenario(duration):
+    """Runs the scenario and returns its RunContext."""
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            ctx = data_collection_tree.setup_run({'SIM_VISUALIZATION': False, 'SIM_DURATION': duration}, tmp)
+            ctx.sim.run()
+            ctx.sim.trace.close()
+    return ctx
+
+
+def per_call_ns(func, pairs, repeat):
+    """Calls func(node, pck) for all pairs repeat times and returns best ns per call."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for node, pck in pairs:
+            func(node, pck)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=1000, help='SIM_DURATION of scenario run')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    ctx = run_scenario(args.duration)
+    nodes = [n for n in ctx.nodes if n.addr is not None and not n.is_sleep]
+    addrs = [n.addr for n in nodes] + [n.ch_addr for n in nodes if n.ch_addr is not None]
+    # fresh Addr objects, as they arrive in packages
+    dests = [wsnlab.Addr(a.net_addr, a.node_addr) for a in addrs] + [wsnlab.BROADCAST_ADDR]
+
+    rx_pairs = [(n, {'dest': d, 'type': 'SENSOR_DATA'}) for n in nodes for d in dests]
+    can_receive_ns = per_call_ns(lambda n, p: n.can_receive(p), rx_pairs, args.repeat)
+
+    ctx.params.ENABLE_PACKET_ROUTE_LOGGING = False
+    for n in nodes:
+        n.send = lambda pck: None
+    fw_pairs = [(n, d) for n in nodes for d in dests[:-1]]
+    route_ns = per_call_ns(lambda n, d: n.route_and_forward_package({'dest': d, 'type': 'SENSOR_DATA'}),
+                           fw_pairs, args.repeat)
+
+    print(f"nodes: {len(nodes)}, destinations: {len(dests)}")
+    print(f"{'call':>26} {'calls':>8} {'ns/call':>9}")
+    print(f"{'can_receive':>26} {len(rx_pairs):>8} {can_receive_ns:>9.0f}")
+    print(f"{'route_and_forward_package':>26} {len(fw_pairs):>8} {route_ns:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
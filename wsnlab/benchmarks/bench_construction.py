@@ -0,0 +1,47 @@
+"""Benchmark of network construction time with the spatial grid index.
+
+Nodes are placed like create_network() in data_collection_tree.py (grid with jitter),
+so node density stays the same while N grows. Construction time per node should stay
+roughly flat, i.e. total construction time should scale linearly. Both one-by-one
+Simulator.add_node() and bulk Simulator.add_nodes() are measured.
+
+Usage (from wsnlab directory):
+    python benchmarks/bench_construction.py [N ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from source import config
+from source import placement
+from source import wsnlab
+
+DEFAULT_SIZES = [100, 500, 1000, 5000, 10000, 50000]
+
+
+def build(number_of_nodes, bulk, seed=1):
+    """Builds a network of base nodes and returns construction time in seconds and average degree."""
+    positions = placement.grid_jitter(number_of_nodes, config.SIM_NODE_PLACING_CELL_SIZE, rng=seed)
+    sim = wsnlab.Simulator(duration=1, timescale=0)
+    start = time.perf_counter()
+    if bulk:
+        sim.add_nodes(wsnlab.Node, positions)
+    else:
+        for pos in positions.tolist():
+            sim.add_node(wsnlab.Node, tuple(pos))
+    elapsed = time.perf_counter() - start
+    degree = sum(len(n.neighbor_distance_list) for n in sim.nodes) / number_of_nodes
+    return elapsed, degree
+
+
+def main(sizes):
+    print(f"{'N':>8} {'add_node (s)':>13} {'us/node':>8} {'add_nodes (s)':>14} {'us/node':>8} {'avg degree':>11}")
+    for n in sizes:
+        single, degree = build(n, bulk=False)
+        bulk, _ = build(n, bulk=True)
+        print(f"{n:>8} {single:>13.3f} {single / n * 1e6:>8.1f} {bulk:>14.3f} {bulk / n * 1e6:>8.1f} {degree:>11.1f}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
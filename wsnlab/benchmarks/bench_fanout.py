@@ -0,0 +1,35 @@
+"""Event count and wall time of per-receiver delivery vs single-event broadcast fan-out
+(config.SIM_BROADCAST_FANOUT) on the data_collection_tree.py scenario.
+
+Usage (from wsnlab directory):
+    python benchmarks/bench_fanout.py [--kernel simpy|heap]
+"""
+import argparse
+
+import scenario
+
+# (label, config overrides)
+SCENARIOS = [
+    ('100 nodes, 5000 s', {}),
+    ('5k nodes, 300 s', {'SIM_NODE_COUNT': 5000, 'SIM_DURATION': 300, 'SIM_TERRAIN_SIZE': [5000, 5000]}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kernel', default='heap', choices=['simpy', 'heap'])
+    args = parser.parse_args()
+
+    print(f"{'scenario':>18} {'fanout':>7} {'events':>10} {'run (s)':>9}")
+    for label, overrides in SCENARIOS:
+        results = {}
+        for fanout in (False, True):
+            results[fanout] = scenario.run(dict(overrides, SIM_KERNEL=args.kernel, SIM_BROADCAST_FANOUT=fanout))
+            r = results[fanout]
+            print(f"{label:>18} {str(fanout):>7} {r['events']:>10} {r['runtime']:>9.2f}")
+        print(f"{'':>18} events x{results[False]['events'] / results[True]['events']:.2f}, "
+              f"wall time x{results[False]['runtime'] / results[True]['runtime']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Cost of headless (SIM_VISUALIZATION = False) runs: import time of source.wsnlab_vis and wall time
+of a large data_collection_tree.py scenario.
+
+Usage (from wsnlab directory):
+    python benchmarks/bench_headless.py [--nodes N] [--duration T] [--kernel simpy|heap]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import scenario
+
+
+def import_time(repeat=5):
+    """Returns best wall time in ms of importing source.wsnlab_vis in a fresh interpreter."""
+    code = ("import sys, time; sys.path.insert(1, %r); t = time.perf_counter(); "
+            "from source import wsnlab_vis; print((time.perf_counter() - t) * 1000, "
+            "'tkinter' in sys.modules)" % os.path.abspath(scenario.WSNLAB_DIR))
+    best = None
+    for _ in range(repeat):
+        ms, tk = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True,
+                                text=True).stdout.split()
+        best = float(ms) if best is None else min(best, float(ms))
+    return best, tk == 'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--duration', type=float, default=300)
+    parser.add_argument('--kernel', default='heap', choices=['simpy', 'heap'])
+    args = parser.parse_args()
+
+    ms, tk = import_time()
+    print(f"import source.wsnlab_vis: {ms:.1f} ms, tkinter imported: {tk}")
+
+    side = 1400 * (args.nodes / 100) ** 0.5
+    r = scenario.run({'SIM_NODE_COUNT': args.nodes, 'SIM_DURATION': args.duration,
+                      'SIM_TERRAIN_SIZE': [side, side], 'SIM_KERNEL': args.kernel})
+    print(f"{args.nodes} nodes, {args.duration:g} s: {r['events']} events, {r['runtime']:.2f} s, "
+          f"{r['runtime'] / r['events'] * 1e9:.0f} ns/event")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Events/sec comparison of the SimPy and heap simulation kernels on the data_collection_tree.py scenario.
+
+Usage (from wsnlab directory):
+    python benchmarks/bench_kernel.py [--nodes N] [--duration T]
+"""
+import argparse
+
+import scenario
+
+KERNELS = ['simpy', 'heap']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=None, help='SIM_NODE_COUNT override')
+    parser.add_argument('--duration', type=float, default=None, help='SIM_DURATION override')
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.nodes is not None:
+        overrides['SIM_NODE_COUNT'] = args.nodes
+    if args.duration is not None:
+        overrides['SIM_DURATION'] = args.duration
+    results = {kernel: scenario.run(dict(overrides, SIM_KERNEL=kernel)) for kernel in KERNELS}
+
+    print(f"{'kernel':>8} {'events':>10} {'run (s)':>9} {'events/s':>10}")
+    for kernel in KERNELS:
+        r = results[kernel]
+        print(f"{kernel:>8} {r['events']:>10} {r['runtime']:>9.2f} {r['events'] / r['runtime']:>10.0f}")
+    print(f"speedup: {results['simpy']['runtime'] / results['heap']['runtime']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
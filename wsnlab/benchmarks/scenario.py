@@ -0,0 +1,62 @@
+"""Helper to run the data_collection_tree.py scenario for benchmarks with config overrides.
+
+Each run happens in its own interpreter with a temporary output directory, so CSV outputs do not
+overwrite the ones in wsnlab and runs do not share heap or allocator state. Visualization
+is off and node logging output is discarded.
+"""
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+WSNLAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_child(overrides):
+    """Runs the scenario in this process and prints a JSON result line."""
+    sys.path.insert(1, WSNLAB_DIR)
+    import data_collection_tree
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        ctx = data_collection_tree.setup_run(dict(overrides, SIM_VISUALIZATION=False), os.getcwd())
+        setup = time.perf_counter() - start
+        start = time.perf_counter()
+        try:
+            ctx.sim.run()
+        except BaseException:
+            ctx.sim.trace.close()
+            raise
+        runtime = time.perf_counter() - start
+        start = time.perf_counter()
+        result = data_collection_tree.finish_run(ctx, runtime)
+        finish = time.perf_counter() - start
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+    print(json.dumps({'events': result.event_count, 'runtime': result.runtime, 'setup': setup,
+                      'finish': finish, 'sim_time': result.sim_time, 'peak_rss_mb': rss_mb}))
+
+
+def run(overrides):
+    """Runs the scenario with given config overrides in a child process.
+
+    Args:
+        overrides (Dict): config attribute name -> value.
+
+    Returns:
+        Dict: 'events' (callbacks scheduled), 'runtime' (wall seconds of sim.run()), 'setup' (wall
+        seconds of setup_run(), i.e. network construction), 'finish' (wall seconds of the end of run
+        exports), 'sim_time' (sim seconds reached) and 'peak_rss_mb' (peak resident memory of the run).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), json.dumps(overrides)],
+                             cwd=tmp, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    run_child(json.loads(sys.argv[1]))
@@ -0,0 +1,265 @@
+"""Benchmark suite of the simulator with scaling curves and regression baselines.
+
+'run' times the data_collection_tree.py scenario headless (heap kernel, SEED 1) at growing node
+counts with the terrain grown along, so node density stays the same. For each N it records wall
+time, events/s, sim seconds per wall second, peak RSS and construction time (see scenario.py).
+Then it runs microbenchmarks on the nodes of a formed network: Simulator.update_neighbor_list(),
+Node.send(), Node.can_receive(), SensorNode.route_and_forward_package() and the trace CSV writers.
+The results are written to a JSON file, e.g. a baseline.
+
+'compare' checks a result file against a baseline and lists every metric that got worse by more
+than the threshold. It exits with status 1 if there is any, so it can gate an optimization.
+
+Usage (from wsnlab directory):
+    python benchmarks/suite.py run [--sizes N ...] [--duration T] [--out FILE] [--no-scaling] [--no-micro]
+    python benchmarks/suite.py compare BASELINE NEW [--threshold 0.1]
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import scenario
+
+DEFAULT_SIZES = [100, 500, 2000, 10000, 50000]
+SEED = 1
+
+# metric name -> True if higher is better
+HIGHER_IS_BETTER = {
+    'wall_s': False,
+    'setup_s': False,
+    'finish_s': False,
+    'events_per_s': True,
+    'sim_s_per_wall_s': True,
+    'peak_rss_mb': False,
+    'ns_per_call': False,
+}
+
+
+def scenario_overrides(nodes, duration):
+    """Config overrides of the scaling run with given node count (terrain grows with sqrt(N)).
+    All-pairs distance CSVs are skipped at every N, so construction time is comparable across N."""
+    side = 1400 * (nodes / 100) ** 0.5
+    return {'SIM_NODE_COUNT': nodes, 'SIM_DURATION': duration, 'SIM_TERRAIN_SIZE': [side, side],
+            'SIM_KERNEL': 'heap', 'SEED': SEED, 'DISTANCE_CSV_MAX_NODES': 0}
+
+
+def scaling(sizes, duration):
+    """Runs the scenario at each node count in a child process and returns metrics by N."""
+    results = {}
+    print(f"{'N':>7} {'events':>10} {'wall (s)':>9} {'events/s':>10} {'sim s/s':>9} "
+          f"{'setup (s)':>10} {'RSS (MB)':>9}")
+    for nodes in sizes:
+        r = scenario.run(scenario_overrides(nodes, duration))
+        results[str(nodes)] = {
+            'events': r['events'],
+            'wall_s': r['runtime'],
+            'setup_s': r['setup'],
+            'finish_s': r['finish'],
+            'events_per_s': r['events'] / r['runtime'],
+            'sim_s_per_wall_s': r['sim_time'] / r['runtime'],
+            'peak_rss_mb': r['peak_rss_mb'],
+        }
+        m = results[str(nodes)]
+        print(f"{nodes:>7} {m['events']:>10} {m['wall_s']:>9.2f} {m['events_per_s']:>10.0f} "
+              f"{m['sim_s_per_wall_s']:>9.1f} {m['setup_s']:>10.2f} {m['peak_rss_mb']:>9.0f}")
+    return results
+
+
+def best_ns(func, calls, repeat):
+    """Runs func() (which makes `calls` calls) repeat times and returns best ns per call."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / max(calls, 1)
+
+
+def micro(nodes, duration, repeat):
+    """Microbenchmarks on the network of a finished scenario run. Returns ns per call by name."""
+    sys.path.insert(1, scenario.WSNLAB_DIR)
+    import data_collection_tree
+    from source import trace
+    from source import wsnlab
+    from source import wsnlab_vis
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            overrides = dict(scenario_overrides(nodes, duration), SIM_VISUALIZATION=False)
+            ctx = data_collection_tree.setup_run(overrides, tmp)
+            sim = ctx.sim
+            sim.run()
+            sim.trace.close()
+        formed = [n for n in ctx.nodes if n.addr is not None and not n.is_sleep]
+
+        # neighbor list upkeep of a moved node, here moved in place
+        ids = [n.id for n in ctx.nodes]
+        results['update_neighbor_list'] = best_ns(
+            lambda: [sim.update_neighbor_list(i) for i in ids], len(ids), repeat)
+
+        # broadcast send of the kernel (loss and radio of the visual layer, no energy accounting);
+        # the run is over, so the scheduled deliveries are dropped
+        beat = wsnlab.Packet(type='HEART_BEAT', dest=wsnlab.BROADCAST_ADDR)
+
+        def send_all():
+            sim._queue.clear()
+            for n in formed:
+                wsnlab_vis.Node.send(n, beat.copy())
+        results['Node.send'] = best_ns(send_all, len(formed), repeat)
+
+        addrs = [n.addr for n in formed] + [n.ch_addr for n in formed if n.ch_addr is not None]
+        dests = [wsnlab.Addr(a.net_addr, a.node_addr) for a in addrs] + [wsnlab.BROADCAST_ADDR]
+        rx = [(n, {'dest': d, 'type': 'SENSOR_DATA'}) for n in formed[:200] for d in dests]
+        results['can_receive'] = best_ns(lambda: [n.can_receive(p) for n, p in rx], len(rx), repeat)
+
+        ctx.params.ENABLE_PACKET_ROUTE_LOGGING = False
+        for n in formed:
+            n.send = lambda pck: None
+        fw = [(n, d) for n in formed[:200] for d in dests[:-1]]
+        results['route_and_forward_package'] = best_ns(
+            lambda: [n.route_and_forward_package({'dest': d, 'type': 'SENSOR_DATA'}) for n, d in fw],
+            len(fw), repeat)
+
+        # trace writers: packet_routes style rows through the buffered writer, per row
+        rows = [[i * 0.5, 'SENSOR_DATA', 7, i % 500, 8, 0, 3, 'mesh'] for i in range(20000)]
+        header = ['time', 'packet_type', 'source', 'current_node', 'next_hop', 'dest', 'hop_count',
+                  'routing_direction']
+        kinds = [trace.FLOAT, trace.STR, trace.STR, trace.INT, trace.STR, trace.STR, trace.INT, trace.STR]
+        for fmt in ('csv', 'npy'):
+            def write_rows():
+                writer = trace.TraceWriter(1000, True, fmt, False, tmp)
+                writer.open('bench_routes.csv', header, kinds=kinds)
+                for row in rows:
+                    writer.write('bench_routes.csv', row)
+                writer.close()
+            results[f'TraceWriter.write {fmt}'] = best_ns(write_rows, len(rows), repeat)
+
+        # end of run exports over the formed network
+        results['write_energy_metrics_csv'] = best_ns(
+            lambda: data_collection_tree.write_energy_metrics_csv(ctx), len(ctx.nodes), repeat)
+        results['log_all_packets'] = best_ns(
+            lambda: data_collection_tree.log_all_packets(ctx, sim.packet_log),
+            len(sim.packet_log), repeat)
+
+    print(f"\n{'microbenchmark':>28} {'ns/call':>10}")
+    for name, ns in results.items():
+        print(f"{name:>28} {ns:>10.0f}")
+    return {name: {'ns_per_call': ns} for name, ns in results.items()}
+
+
+def git_revision():
+    """Commit of the working tree, or None."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=scenario.WSNLAB_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results):
+    """Metric values of a result file by 'section/name/metric' path."""
+    flat = {}
+    for section in ('scaling', 'micro'):
+        for name, metrics in results.get(section, {}).items():
+            for metric, value in metrics.items():
+                if metric in HIGHER_IS_BETTER:
+                    flat[f"{section}/{name}/{metric}"] = value
+    return flat
+
+
+def compare(baseline, new, threshold):
+    """Lists the change of every metric of both files and returns the regressed paths.
+
+    Args:
+        baseline (Dict): Baseline result file.
+        new (Dict): New result file.
+        threshold (double): Relative change that counts as a regression, e.g. 0.1 for 10%.
+
+    Returns:
+        List of strings: Paths of the metrics that got worse by more than threshold.
+    """
+    base, cur = flatten(baseline), flatten(new)
+    regressions = []
+    print(f"{'metric':<52} {'baseline':>12} {'new':>12} {'change':>8}")
+    for path in sorted(base.keys() & cur.keys()):
+        old, value = base[path], cur[path]
+        if not old:
+            continue
+        change = (value - old) / old
+        worse = -change if HIGHER_IS_BETTER[path.rsplit('/', 1)[1]] else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressions.append(path)
+        elif worse < -threshold:
+            flag = '  improved'
+        print(f"{path:<52} {old:>12.4g} {value:>12.4g} {change * 100:>+7.1f}%{flag}")
+    missing = sorted(base.keys() - cur.keys())
+    if missing:
+        print(f"\nnot in new results: {', '.join(missing)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_p = sub.add_parser('run', help='run the suite and write a result file')
+    run_p.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='node counts of the scaling runs')
+    run_p.add_argument('--duration', type=float, default=300, help='SIM_DURATION of the scaling runs')
+    run_p.add_argument('--micro-nodes', type=int, default=500, help='node count of the microbenchmark network')
+    run_p.add_argument('--micro-duration', type=float, default=1000, help='SIM_DURATION of the microbenchmark network')
+    run_p.add_argument('--repeat', type=int, default=5, help='repeats of each microbenchmark (best is kept)')
+    run_p.add_argument('--no-scaling', action='store_true', help='skip the scaling runs')
+    run_p.add_argument('--no-micro', action='store_true', help='skip the microbenchmarks')
+    run_p.add_argument('--out', default='benchmarks/baseline.json', help='result file')
+    cmp_p = sub.add_parser('compare', help='compare a result file against a baseline')
+    cmp_p.add_argument('baseline')
+    cmp_p.add_argument('new')
+    cmp_p.add_argument('--threshold', type=float, default=0.1, help='relative change flagged as regression')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(baseline, new, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions above {args.threshold * 100:.0f}%")
+            return 1
+        print(f"\nno regressions above {args.threshold * 100:.0f}%")
+        return 0
+
+    results = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'duration': args.duration,
+            'seed': SEED,
+        },
+    }
+    if not args.no_scaling:
+        results['scaling'] = scaling(args.sizes, args.duration)
+    if not args.no_micro:
+        results['micro'] = micro(args.micro_nodes, args.micro_duration, args.repeat)
+    tmp = args.out + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp, args.out)
+    print(f"\nResults written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Forked scenario branches of the data collection tree scenario.
+
+Runs the scenario once up to a fork time (the trunk, e.g. network formation before FAILURE_TIME)
+and then forks one child process per branch with os.fork(), so every branch starts from the same
+in-memory state copy-on-write instead of replaying the formation. Each branch applies its own
+config overrides at the fork and runs to the end:
+    FAILURE_NODE_IDS    which nodes the failure event kills (instead of random ones)
+    PACKET_LOSS_RATIO   channel loss of the tail, or any other value read while the run goes on
+    SEED                reseeds the random generator of the branch, so otherwise equal branches differ
+Event times already scheduled by the trunk (e.g. FAILURE_TIME) stay as they are.
+
+The trunk writes its files to <out>/trunk/. Every branch starts from a copy of them in
+<out>/branch_<i>/ and appends its own events. The parent collects the summary record of every branch
+(see replicate.py) into <out>/branches.csv and writes <out>/summary.csv over all branches.
+os.fork() is only available on POSIX systems.
+
+Usage (from wsnlab directory):
+    python branch.py --branches branches.json [--fork-time T] [--workers W] [--out DIR] [--set NAME=VALUE ...]
+    python branch.py --seeds 100 [...]
+"""
+
+import argparse
+import contextlib
+import csv
+import gc
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+import traceback
+
+import data_collection_tree
+import replicate
+from source import trace
+
+
+def apply_branch(ctx, overrides):
+    """Applies branch overrides to a forked run. Params are resolved again with the overrides, so
+    derived values follow them. SEED reseeds the random generator of the simulator."""
+    params = ctx.params
+    resolved = data_collection_tree.RunParams(dict(params.overrides, **overrides))
+    params.__dict__.clear()
+    params.__dict__.update(vars(resolved))
+    ctx.sim.duration = params.SIM_DURATION
+    if "SEED" in overrides:
+        ctx.sim.random.seed(overrides["SEED"])
+
+
+def run_branch(ctx, overrides, trace_state, output_dir):
+    """Runs one branch of a forked trunk to the end in output_dir and returns its RunResult.
+
+    The trunk files are copied to output_dir first, and the trace files are resumed there."""
+    sim = ctx.sim
+    shutil.copytree(ctx.output_dir, output_dir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns(os.path.basename(sim.checkpoint_path)))
+    ctx.output_dir = output_dir
+    sim.checkpoint_path = os.path.join(output_dir, os.path.basename(sim.checkpoint_path))
+    sim.trace = trace.TraceWriter.resume(dict(trace_state, directory=output_dir))
+    apply_branch(ctx, overrides)
+    start_time = time.time()
+    try:
+        sim.resume()
+    except BaseException:
+        sim.trace.close()
+        raise
+    return data_collection_tree.finish_run(ctx, time.time() - start_time)
+
+
+def _child(ctx, overrides, trace_state, output_dir):
+    """Forked child: runs a branch, writes its result to output_dir/result.pkl and exits."""
+    status = 1
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "run.log"), "w") as log, contextlib.redirect_stdout(log):
+            try:
+                result = run_branch(ctx, overrides, trace_state, output_dir)
+                data_collection_tree.print_report(result)
+            except BaseException:
+                traceback.print_exc(file=log)
+                raise
+        path = os.path.join(output_dir, "result.pkl")
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        status = 0
+    finally:
+        # Skip atexit hooks and buffers inherited from the parent
+        os._exit(status)
+
+
+def run_branches(branches, fork_time=None, overrides=None, output_dir="branches", workers=None,
+                 progress=True):
+    """Runs the trunk to fork_time once, then every branch from it in a forked child process.
+
+    Args:
+        branches (List of Dicts): Config overrides each branch applies at the fork.
+        fork_time (double): Sim time of the fork. None forks at FAILURE_TIME, before the failure event.
+        overrides (Dict): Config overrides of the trunk, shared by all branches.
+        output_dir (string): Directory of the trunk, branch directories and tables.
+        workers (int): Max branches running at once. None uses every core.
+        progress (bool): If True, print a line per finished branch.
+
+    Returns:
+        Tuple(List of Dicts, List of Dicts): Summary records of the branches sorted by branch index
+        (failed branches are left out) and replicate.aggregate() rows over them.
+    """
+    params = dict(overrides or {}, SIM_VISUALIZATION=False)
+    workers = min(workers or os.cpu_count() or 1, max(len(branches), 1))
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.time()
+    trunk_dir = os.path.join(output_dir, "trunk")
+    with open(os.path.join(output_dir, "trunk.log"), "w") as log, contextlib.redirect_stdout(log):
+        ctx = data_collection_tree.setup_run(params, trunk_dir)
+        sim = ctx.sim
+        if fork_time is None:
+            fork_time = ctx.params.FAILURE_TIME
+        try:
+            sim.start()
+            sim.run_until(fork_time)
+            trace_state = sim.trace.checkpoint()
+        except BaseException:
+            sim.trace.close()
+            raise
+    if progress:
+        print(f"Trunk reached time {fork_time} in {time.time() - start:.1f} s, forking {len(branches)} branches")
+
+    # Trunk objects stay as they are from here on, keep the collector from touching their pages
+    sys.stdout.flush()
+    gc.freeze()
+    records = []
+    running = {}
+    try:
+        with open(os.path.join(output_dir, "branches.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["branch", "overrides"] + replicate.METRICS)
+            writer.writeheader()
+            pending = list(enumerate(branches))
+            while pending or running:
+                while pending and len(running) < workers:
+                    index, branch = pending.pop(0)
+                    branch_dir = os.path.join(output_dir, f"branch_{index}")
+                    pid = os.fork()
+                    if pid == 0:
+                        _child(ctx, branch, trace_state, branch_dir)
+                    running[pid] = (index, branch, branch_dir)
+                pid, status = os.wait()
+                index, branch, branch_dir = running.pop(pid)
+                if status != 0:
+                    print(f"⚠️  Branch {index} {branch} failed, see {os.path.join(branch_dir, 'run.log')}")
+                    continue
+                with open(os.path.join(branch_dir, "result.pkl"), "rb") as rf:
+                    result = pickle.load(rf)
+                record = {"branch": index, "overrides": json.dumps(branch)}
+                record.update(replicate.summarize(result))
+                records.append(record)
+                writer.writerow(record)
+                f.flush()
+                if progress:
+                    print(f"[{len(records)}/{len(branches)}] branch {index} {branch} done "
+                          f"({record['runtime']:.1f} s, {time.time() - start:.1f} s elapsed)")
+    finally:
+        gc.unfreeze()
+        sim.trace.close()
+    records.sort(key=lambda r: r["branch"])
+    rows = replicate.aggregate(records)
+    replicate.write_summary_csv(rows, os.path.join(output_dir, "summary.csv"))
+    return records, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--branches", help="JSON file with a list of override dicts, one per branch")
+    parser.add_argument("--seeds", type=int, default=0,
+                        help="add branches that only reseed the random generator (SEED=1 .. SEEDS)")
+    parser.add_argument("--fork-time", type=float, default=None, help="sim time of the fork (default: FAILURE_TIME)")
+    parser.add_argument("--workers", type=int, default=None, help="max branches at once (default: all cores)")
+    parser.add_argument("--out", default="branches", help="output directory")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help="config override of the trunk, e.g. --set SIM_NODE_COUNT=200")
+    args = parser.parse_args()
+
+    branches = []
+    if args.branches:
+        with open(args.branches) as f:
+            branches = json.load(f)
+    branches += [{"SEED": seed} for seed in range(1, args.seeds + 1)]
+    if not branches:
+        parser.error("no branches, give --branches and/or --seeds")
+
+    _, rows = run_branches(branches, args.fork_time, replicate.parse_overrides(args.overrides),
+                           args.out, args.workers)
+    print(f"\n{'metric':>22} {'n':>4} {'mean':>12} {'95% CI':>27}")
+    for row in rows:
+        if row["n"]:
+            print(f"{row['metric']:>22} {row['n']:>4} {row['mean']:>12.4f} "
+                  f"[{row['ci_low']:>12.4f}, {row['ci_high']:>12.4f}]")
+        else:
+            print(f"{row['metric']:>22} {row['n']:>4} {'-':>12}")
+    print(f"\n📁 Tables written to {os.path.join(args.out, 'branches.csv')} and "
+          f"{os.path.join(args.out, 'summary.csv')}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,91 +1,367 @@
+import argparse
 import time
 import csv
+import os
 from collections import Counter
 from source import config
 import math
 from source import wsnlab_vis as wsn
-import random
+from source import placement
+from source import energy
+from source import profiler
+from source import trace
 from enum import Enum
 import sys
 sys.path.insert(1, '.')
 
-# Make runs reproducible but can have config overrides
-random.seed(getattr(config, "SEED", 22))
-# Made table o(1) just by using a dict to help performance
-# ---- Config fallbacks(backup) so this file works but overwritten by config.py ----
-# Variables belows just have default just in case config.py is not found
-TX_RANGES = getattr(config, "NODE_TX_RANGES", {0: config.NODE_TX_RANGE})
-TX_POWER_LEVELS = getattr(config, "TX_POWER_LEVELS", list(TX_RANGES.keys()))
-NODE_DEFAULT_TX_POWER = getattr(
-    config,
-    "NODE_DEFAULT_TX_POWER",
-    next(iter(TX_POWER_LEVELS), 0)
-)
-ALLOW_TX_POWER_CHOICE = getattr(config, "ALLOW_TX_POWER_CHOICE", False)
-POWER_LEVELS_ASC = sorted(TX_POWER_LEVELS)
 
-HEART_BEAT_INTERVAL = getattr(
-    config,
-    "HEART_BEAT_TIME_INTERVAL",
-    getattr(config, "HEARTH_BEAT_TIME_INTERVAL", 101)
-)
-ROLE_OPTIMIZE_TIME = getattr(config, "ROLE_OPTIMIZE_TIME", 2000)
-JOIN_REQ_EXPAND_THRESHOLD = getattr(config, "JOIN_REQ_EXPAND_THRESHOLD", 3)
-JOIN_REQ_EXPAND_WINDOW = getattr(
-    config, "JOIN_REQ_EXPAND_WINDOW", HEART_BEAT_INTERVAL * 2)
-JOIN_REQUEST_INTERVAL = getattr(config, "JOIN_REQUEST_TIME_INTERVAL", 20)
-DATA_INTERVAL = getattr(config, "DATA_INTERVAL", 50)
-ENABLE_DATA_PACKETS = getattr(config, "ENABLE_DATA_PACKETS", False)
-ALLOW_ROUTER_PARENT_FALLBACK = getattr(
-    config, "ALLOW_ROUTER_PARENT_FALLBACK", True
-)
-TABLE_SHARE_INTERVAL = getattr(
-    config, "TABLE_SHARE_INTERVAL", HEART_BEAT_INTERVAL)  # defaults to 100 for tableshare
-MESH_HOP_N = getattr(
-    config,
-    "MESH_HOP_N",
-    getattr(config, "NEIGHBOR_TABLE_MAX_HOPS", 2)
-)
-NUM_OF_CLUSTERS = getattr(config, "NUM_OF_CLUSTERS", 255)
-NUM_OF_CHILDREN = getattr(config, "NUM_OF_CHILDREN", 254)
-
-# Performance: disable detailed packet route logging (causes slowdown with many packets)
-ENABLE_PACKET_ROUTE_LOGGING = getattr(
-    config, "ENABLE_PACKET_ROUTE_LOGGING", False)
-
-RX_CURRENT = getattr(config, "RX_CURRENT", 18.8)
-VOLTAGE = getattr(config, "VOLTAGE", 3.0)
-MTU_BITS = getattr(config, "MTU", 127 * 8)       # got some bits
-# python allows _ for readability# bps per the ieee 802 standard
-DATARATE = getattr(config, "DATARATE", 250_000.)
-
-# TX current mapping for energy model (8)
-TX_CURRENTS_MA = getattr(
-    config,
-    "TX_CURRENT_LEVELS_MA",
-    {level: 17.4 for level in TX_POWER_LEVELS}  # fallback: max power current
-)
+###########################################################
+class RunParams:
+    """Config values of one run: every upper-case name of source/config.py, overridden by the
+    values given for the run, plus the protocol constants derived from them. Nodes read config
+    values from here (self.params) instead of the config module, so runs with different values
+    can share a process.
+
+       Attributes:
+           overrides (Dict of string to value): Values given for the run.
+    """
+
+    ############################
+    def __init__(self, overrides=None):
+        """Constructor for RunParams class.
+
+           Args:
+               overrides (Dict of string to value): Config names and values to use instead of config.py ones.
+
+           Returns:
+               RunParams: Created RunParams object.
+        """
+        self.__dict__.update((k, v) for k, v in vars(config).items() if k.isupper())
+        self.overrides = dict(overrides or {})
+        self.__dict__.update(self.overrides)
+        # ---- Config fallbacks(backup) so this file works but overwritten by config.py ----
+        # Variables belows just have default just in case config.py is not found
+        self.SEED = getattr(self, "SEED", 22)
+        self.TX_RANGES = getattr(self, "NODE_TX_RANGES", {0: self.NODE_TX_RANGE})
+        self.TX_POWER_LEVELS = getattr(self, "TX_POWER_LEVELS", list(self.TX_RANGES.keys()))
+        self.NODE_DEFAULT_TX_POWER = getattr(
+            self,
+            "NODE_DEFAULT_TX_POWER",
+            next(iter(self.TX_POWER_LEVELS), 0)
+        )
+        self.ALLOW_TX_POWER_CHOICE = getattr(self, "ALLOW_TX_POWER_CHOICE", False)
+        self.POWER_LEVELS_ASC = sorted(self.TX_POWER_LEVELS)
+
+        self.HEART_BEAT_INTERVAL = getattr(
+            self,
+            "HEART_BEAT_TIME_INTERVAL",
+            getattr(self, "HEARTH_BEAT_TIME_INTERVAL", 101)
+        )
+        self.HEART_BEAT_TRICKLE = getattr(self, "HEART_BEAT_TRICKLE", False)
+        self.HEART_BEAT_MAX_INTERVAL = getattr(
+            self, "HEART_BEAT_MAX_INTERVAL", self.HEART_BEAT_INTERVAL * 16)
+        self.HEART_BEAT_REDUNDANCY = getattr(self, "HEART_BEAT_REDUNDANCY", 0)
+        self.ROLE_OPTIMIZE_TIME = getattr(self, "ROLE_OPTIMIZE_TIME", 2000)
+        self.JOIN_REQ_EXPAND_THRESHOLD = getattr(self, "JOIN_REQ_EXPAND_THRESHOLD", 3)
+        self.JOIN_REQ_EXPAND_WINDOW = getattr(
+            self, "JOIN_REQ_EXPAND_WINDOW", self.HEART_BEAT_INTERVAL * 2)
+        self.JOIN_REQUEST_INTERVAL = getattr(self, "JOIN_REQUEST_TIME_INTERVAL", 20)
+        self.JOIN_RETRY_BACKOFF = getattr(self, "JOIN_RETRY_BACKOFF", 1.0)
+        self.JOIN_RETRY_MAX_INTERVAL = getattr(
+            self, "JOIN_RETRY_MAX_INTERVAL", self.JOIN_REQUEST_INTERVAL * 32)
+        self.JOIN_RETRY_JITTER = getattr(self, "JOIN_RETRY_JITTER", 0.0)
+        self.PROBE_REPLY_DELAY = getattr(self, "PROBE_REPLY_DELAY", 0.0)
+        self.PROBE_REPLY_SUPPRESS = getattr(self, "PROBE_REPLY_SUPPRESS", 0)
+        self.PROBE_REPLY_MIN_INTERVAL = getattr(self, "PROBE_REPLY_MIN_INTERVAL", 0.0)
+        self.DATA_INTERVAL = getattr(self, "DATA_INTERVAL", 50)
+        self.ENABLE_DATA_PACKETS = getattr(self, "ENABLE_DATA_PACKETS", False)
+        self.ALLOW_ROUTER_PARENT_FALLBACK = getattr(
+            self, "ALLOW_ROUTER_PARENT_FALLBACK", True
+        )
+        self.TABLE_SHARE_INTERVAL = getattr(
+            self, "TABLE_SHARE_INTERVAL", self.HEART_BEAT_INTERVAL)  # defaults to 100 for tableshare
+        self.MESH_HOP_N = getattr(
+            self,
+            "MESH_HOP_N",
+            getattr(self, "NEIGHBOR_TABLE_MAX_HOPS", 2)
+        )
+        self.MAX_MESH_EXPORT = getattr(self, "MAX_MESH_EXPORT", 500)
+        self.TABLE_SHARE_DELTA = getattr(self, "TABLE_SHARE_DELTA", False)
+        self.TABLE_SHARE_FULL_EVERY = getattr(self, "TABLE_SHARE_FULL_EVERY", 10)
+        self.TABLE_SHARE_ENTRY_BYTES = getattr(self, "TABLE_SHARE_ENTRY_BYTES", 8)
+        self.NUM_OF_CLUSTERS = getattr(self, "NUM_OF_CLUSTERS", 255)
+        self.NUM_OF_CHILDREN = getattr(self, "NUM_OF_CHILDREN", 254)
+
+        # Performance: disable detailed packet route logging (causes slowdown with many packets)
+        self.ENABLE_PACKET_ROUTE_LOGGING = getattr(
+            self, "ENABLE_PACKET_ROUTE_LOGGING", False)
+
+        self.RX_CURRENT = getattr(self, "RX_CURRENT", 18.8)
+        self.VOLTAGE = getattr(self, "VOLTAGE", 3.0)
+        self.MTU_BITS = getattr(self, "MTU", 127 * 8)       # got some bits
+        # python allows _ for readability# bps per the ieee 802 standard
+        self.DATARATE = getattr(self, "DATARATE", 250_000.)
+
+        # TX current mapping for energy model (8)
+        self.TX_CURRENTS_MA = getattr(
+            self,
+            "TX_CURRENT_LEVELS_MA",
+            {level: 17.4 for level in self.TX_POWER_LEVELS}  # fallback: max power current
+        )
 
-# Energy thresholds
-INITIAL_ENERGY_J = getattr(config, "INITIAL_ENERGY_J", 5.0)
-MIN_ENERGY_J = getattr(config, "MIN_ENERGY_J", 0.01)
-ENERGY_PSDU_BYTES = getattr(config, "ENERGY_PSDU_BYTES", 50)
-TX_TURNAROUND_ENERGY_J = getattr(config, "TX_TURNAROUND_ENERGY_J", 10e-6)
-RX_TURNAROUND_ENERGY_J = getattr(config, "RX_TURNAROUND_ENERGY_J", 10e-6)
-NETWORK_DEATH_THRESHOLD = getattr(config, "NETWORK_DEATH_THRESHOLD", 0.5)
+        # Energy thresholds
+        self.INITIAL_ENERGY_J = getattr(self, "INITIAL_ENERGY_J", 5.0)
+        self.MIN_ENERGY_J = getattr(self, "MIN_ENERGY_J", 0.01)
+        self.ENERGY_PSDU_BYTES = getattr(self, "ENERGY_PSDU_BYTES", 50)
+        self.TX_TURNAROUND_ENERGY_J = getattr(self, "TX_TURNAROUND_ENERGY_J", 10e-6)
+        self.RX_TURNAROUND_ENERGY_J = getattr(self, "RX_TURNAROUND_ENERGY_J", 10e-6)
+        self.IDLE_CURRENT_MA = getattr(self, "IDLE_CURRENT_MA", 0.0)
+        self.SLEEP_CURRENT_MA = getattr(self, "SLEEP_CURRENT_MA", 0.0)
+        self.NETWORK_DEATH_THRESHOLD = getattr(self, "NETWORK_DEATH_THRESHOLD", 0.5)
 
-# Network lifetime tracking
-NETWORK_DEATH_TIME = None
 
-# Track where each node is placed and basic mappings
-NODE_POS = {}          # {node_id: (x, y)}
-ADDR_TO_NODE = {}      # (net_addr, node_addr) -> node
-NODES_REGISTERED = 0
+###########################################################
+class RunContext:
+    """State of one simulation run. Everything a run changes lives here (and in its Simulator),
+    so runs are independent of each other.
+
+       Attributes:
+           params (RunParams): Config values of the run.
+           output_dir (string): Directory of the CSV files of the run.
+           sim (Simulator): Simulator of the run. Its ctx attribute is this object.
+           energy (EnergyModel): Energy accounting of the nodes.
+           nodes (List of SensorNode): Node objects.
+           node_pos (Dict of int to Tuple): Position of each node by id.
+           addr_to_node (Dict of Addr to SensorNode): Node of each assigned node and cluster head address.
+           children (Dict of int to Set of int): Ids of the nodes whose parent_gui is a node id, by that id.
+           nodes_registered (int): Number of registrations so far.
+           role_counts (Counter): Live tally of nodes per Roles enum.
+           registered_count (int): Live tally of nodes in REGISTERED_ROLES.
+           dead_count (int): Live tally of failed (killed or energy dead) nodes.
+           check_tallies (bool): If True, every tally query is checked against a scan of all nodes.
+           root_id (int): Id of the root node.
+           network_death_time (double): Time the network death threshold was reached, or None.
+           recovery_start_time (double): Time of the last node recovery, or None.
+           recovery_duration (double): Time from recovery start to no orphans, or None.
+           max_orphan_count (int): Max number of unregistered nodes seen at failure events.
+           table_share_entries (int): Neighbor entries sent in TABLE_SHARE packets.
+           table_share_full_entries (int): Entries those packets would have carried as full tables.
+           heart_beats_sent (int): HEART_BEAT packets sent.
+           heart_beats_suppressed (int): HEART_BEATs left out by Trickle after enough consistent ones were heard.
+           probe_replies (int): HEART_BEATs sent as PROBE replies.
+           probe_replies_suppressed (int): Delayed PROBE replies cancelled after equal or better ones were heard.
+           probe_replies_limited (int): PROBEs not replied to because of PROBE_REPLY_MIN_INTERVAL.
+    """
+
+    ############################
+    def __init__(self, params, output_dir='.'):
+        """Constructor for RunContext class.
 
-# --- tracking containers ---
-ALL_NODES = []              # node objects
-CLUSTER_HEADS = []
-ROLE_COUNTS = Counter()     # live tally per Roles enum
+           Args:
+               params (RunParams): Config values of the run.
+               output_dir (string): Directory of the CSV files of the run.
+
+           Returns:
+               RunContext: Created RunContext object.
+        """
+        self.params = params
+        self.output_dir = output_dir
+        self.sim = None
+        self.energy = None
+        self.nodes = []
+        self.node_pos = {}          # {node_id: (x, y)}
+        self.addr_to_node = {}      # Addr -> node
+        self.children = {}          # parent gui -> {child gui}
+        self.nodes_registered = 0
+        self.role_counts = Counter()
+        self.registered_count = 0
+        self.dead_count = 0
+        self.check_tallies = getattr(params, "CHECK_TALLIES", False)
+        self.root_id = None
+        self.network_death_time = None
+        self.recovery_start_time = None
+        self.recovery_duration = None
+        self.max_orphan_count = 0
+        self.table_share_entries = 0
+        self.table_share_full_entries = 0
+        self.heart_beats_sent = 0
+        self.heart_beats_suppressed = 0
+        self.probe_replies = 0
+        self.probe_replies_suppressed = 0
+        self.probe_replies_limited = 0
+
+    ############################
+    def path(self, filename):
+        """Returns path of an output file of the run."""
+        return os.path.join(self.output_dir, filename)
+
+    ############################
+    def orphan_count(self):
+        """Number of nodes that are not registered / CH / ROOT / ROUTER, in O(1) from the live tallies."""
+        if self.check_tallies:
+            self.assert_tallies()
+        return len(self.nodes) - self.registered_count
+
+    ############################
+    def children_of(self, node_id):
+        """Nodes whose parent_gui is node_id, sorted by id (the order of a scan of all nodes)."""
+        return [self.sim.nodes[i] for i in sorted(self.children.get(node_id, ()))]
+
+    ############################
+    def root_failed(self):
+        """True if the root node is failed."""
+        return self.sim.nodes[self.root_id].failed
+
+    ############################
+    def assert_tallies(self):
+        """Checks role_counts, registered_count, dead_count and children against a scan of all nodes.
+
+           Raises:
+               AssertionError: If a tally differs from the scan.
+        """
+        roles = Counter(node.role for node in self.nodes)
+        registered = sum(1 for node in self.nodes if node.role in REGISTERED_ROLES)
+        dead = sum(1 for node in self.nodes if node.failed)
+        if roles != self.role_counts or registered != self.registered_count or dead != self.dead_count:
+            raise AssertionError(
+                f"Tallies out of sync at time {self.sim.now}: role_counts {dict(self.role_counts)} vs "
+                f"{dict(roles)}, registered {self.registered_count} vs {registered}, dead {self.dead_count} vs {dead}")
+        children = {}
+        for node in self.nodes:
+            if node.parent_gui is not None:
+                children.setdefault(node.parent_gui, set()).add(node.id)
+        if children != self.children:
+            raise AssertionError(f"Children index out of sync at time {self.sim.now}: {self.children} vs {children}")
+
+
+###########################################################
+class _IndexedTable(dict):
+    """Dict of node gui to entry with a reverse index from keys of the entries (e.g. an address)
+    to the guis holding them. Entries are only added or replaced, never removed (tables are reset
+    by making a new one), so the table order is the order guis were first added and the index
+    keeps the guis of each key in that order too: the first gui of a key is the one a scan of
+    the table would find first.
+
+       Attributes:
+           index (Dict of object to List of int): Guis of the entries of each key, in table order.
+           position (Dict of int to int): Table position of each gui.
+    """
+
+    ############################
+    def __init__(self, entries=()):
+        """Constructor for _IndexedTable class.
+
+           Args:
+               entries (Dict): Initial entries, in table order.
+
+           Returns:
+               _IndexedTable: Created table.
+        """
+        super().__init__()
+        self.index = {}
+        self.position = {}
+        for gui, entry in dict(entries).items():
+            self[gui] = entry
+
+    ############################
+    def __reduce__(self):
+        # Rebuild the index from the entries, pickle would set the items before the index exists.
+        # The state then restores the attributes as they were.
+        return type(self), (dict(self),), self.__dict__
+
+    ############################
+    def keys_of(self, entry):
+        """Index keys of an entry. Overridden by subclasses."""
+        return ()
+
+    ############################
+    def __setitem__(self, gui, entry):
+        old = self.get(gui)
+        if old is not None:
+            for key in self.keys_of(old):
+                guis = self.index[key]
+                guis.remove(gui)
+                if not guis:
+                    del self.index[key]
+        else:
+            self.position.setdefault(gui, len(self.position))
+        dict.__setitem__(self, gui, entry)
+        pos = self.position[gui]
+        for key in self.keys_of(entry):
+            guis = self.index.setdefault(key, [])
+            i = len(guis)
+            while i and self.position[guis[i - 1]] > pos:
+                i -= 1
+            guis.insert(i, gui)
+
+    ############################
+    def first(self, key):
+        """Gui of the first entry with given key in table order, or None."""
+        guis = self.index.get(key)
+        return guis[0] if guis else None
+
+
+###########################################################
+class NeighborTable(_IndexedTable):
+    """neighbors_table of a node: HEART_BEAT packets of 1-hop neighbors and TABLE_SHARE copies of
+    mesh neighbors by gui, indexed by their 'addr'. Every entry has a version, the count of table
+    changes when it was added or its hop count changed, so a TABLE_SHARE only has to carry the
+    entries above the version its receiver acknowledged.
+
+       Attributes:
+           version (int): Version of the last change. A reset table goes on from the old one.
+           versions (Dict of int to int): Version of each entry by gui.
+    """
+
+    ############################
+    def __init__(self, entries=(), version=0):
+        """Constructor for NeighborTable class.
+
+           Args:
+               entries (Dict): Initial entries, in table order.
+               version (int): Version to count on from, the version of the table it replaces.
+
+           Returns:
+               NeighborTable: Created table.
+        """
+        self.version = version
+        self.versions = {}
+        super().__init__(entries)
+
+    ############################
+    def __setitem__(self, gui, entry):
+        old = self.get(gui)
+        # A HEART_BEAT of a known 1-hop neighbor changes nothing a receiver of a share would take
+        if old is None or old['neighbor_hop_count'] != entry['neighbor_hop_count']:
+            self.version += 1
+            self.versions[gui] = self.version
+        super().__setitem__(gui, entry)
+
+    ############################
+    def keys_of(self, entry):
+        addr = entry.get('addr')
+        return () if addr is None else (addr,)
+
+    ############################
+    def find_addr(self, addr):
+        """First entry whose address is addr, or None."""
+        gui = self.first(addr)
+        return None if gui is None else dict.__getitem__(self, gui)
+
+
+###########################################################
+class ChildNetworksTable(_IndexedTable):
+    """child_networks_table of a node: net addresses reachable through each child by child gui,
+    from NETWORK_UPDATE packets, indexed by net address."""
+
+    ############################
+    def keys_of(self, networks):
+        return dict.fromkeys(networks)
+
+    ############################
+    def owner(self, net_addr):
+        """Gui of the first child whose networks include net_addr, or None."""
+        return self.first(net_addr)
 
 
 def _addr_str(a):
@@ -100,18 +376,18 @@ def _role_name(r):
     return r.name if hasattr(r, "name") else str(r)
 
 
-def _min_power_for_distance(distance):
+def _min_power_for_distance(params, distance):
     """
     Pick the lowest TX power whose range (scaled) covers the given distance.
     Falls back to highest level if none cover it or defaults if levels missing.
     """
-    if not POWER_LEVELS_ASC:
-        return NODE_DEFAULT_TX_POWER
+    if not params.POWER_LEVELS_ASC:
+        return params.NODE_DEFAULT_TX_POWER
 
     # Compare using scaled ranges to match node positions.
-    sorted_levels = sorted(TX_RANGES.items(), key=lambda kv: kv[1])
+    sorted_levels = sorted(params.TX_RANGES.items(), key=lambda kv: kv[1])
     for level, rng in sorted_levels:
-        if distance <= rng * config.SCALE:
+        if distance <= rng * params.SCALE:
             return level
     # Distance exceeds all ranges; use strongest available power.
     return sorted_levels[-1][0]
@@ -123,29 +399,34 @@ Roles = Enum(
 )
 """Enumeration of roles"""
 
+REGISTERED_ROLES = {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}
+
+# HEART_BEAT fields of a neighbor's state, a beat that changes one is a Trickle inconsistency
+HEART_BEAT_STATE = ('role', 'addr', 'ch_addr', 'hop_count')
+
 
-def log_all_nodes_registered():
+def log_all_nodes_registered(ctx):
     """Log every node's status and role to topology.csv and check if all are registered."""
     # Example: Exports final network state and verifies all nodes reached REGISTERED/CLUSTER_HEAD/ROOT/ROUTER
     filename = "topology.csv"
 
-    with open(filename, mode="w", newline="") as file:
+    with open(ctx.path(filename), mode="w", newline="") as file:
         writer = csv.writer(file)
         writer.writerow(["Node ID", "Position", "Role"])
 
         unregistered_nodes = []
 
-        for node in ALL_NODES:
+        for node in ctx.nodes:
             role = getattr(node, "role", "UNKNOWN")
             position = getattr(node, "pos", None)
             writer.writerow([node.id, position, role])
 
-            if role not in {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}:
+            if role not in REGISTERED_ROLES:
                 unregistered_nodes.append(node.id)
 
     if not unregistered_nodes:
         print(
-            f"✅ All {len(ALL_NODES)} nodes are registered. Logged to {filename}.")
+            f"✅ All {len(ctx.nodes)} nodes are registered. Logged to {filename}.")
         return True
     else:
         print(
@@ -156,43 +437,41 @@ def log_all_nodes_registered():
 # CSV files will be initialized in init_csv_files() before simulation runs
 
 
-def init_csv_files():
+def init_csv_files(ctx):
     """Initialize all CSV files by clearing them and writing headers."""
     # Example: Overwrites all CSV files at simulation start to prevent data accumulation
+    # Per-event logs go through sim.trace, which keeps the files open and writes rows in batches
+    sim = ctx.sim
     # Registration log CSV
-    with open("registration_log.csv", "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            ["node_id", "start_time", "registered_time", "delta_time"])
+    sim.trace.open("registration_log.csv",
+                   ["node_id", "start_time", "registered_time", "delta_time"])
 
     # Role change log CSV
-    with open("role_changes.csv", "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["time", "node_id", "old_role", "new_role"])
+    sim.trace.open("role_changes.csv", ["time", "node_id", "old_role", "new_role"],
+                   kinds=[trace.FLOAT, trace.INT, trace.STR, trace.STR])
 
     # Packet route CSV (per-hop) - only initialize if logging is enabled
-    if ENABLE_PACKET_ROUTE_LOGGING:
-        with open("packet_routes.csv", "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "time",
-                "packet_type",
-                "source",
-                "current_node",
-                "next_hop",
-                "dest",
-                "hop_count",
-                "routing_direction",
-            ])
+    if ctx.params.ENABLE_PACKET_ROUTE_LOGGING:
+        sim.trace.open("packet_routes.csv", [
+            "time",
+            "packet_type",
+            "source",
+            "current_node",
+            "next_hop",
+            "dest",
+            "hop_count",
+            "routing_direction",
+        ], kinds=[trace.FLOAT, trace.STR, trace.STR, trace.INT,
+                  trace.STR, trace.STR, trace.INT, trace.STR])
 
     # Power over time CSV
-    with open("power_over_time.csv", "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["time", "avg_power_j", "min_power_j",
-                        "max_power_j", "alive_nodes", "dead_nodes"])
+    sim.trace.open("power_over_time.csv", ["time", "avg_power_j", "min_power_j",
+                                           "max_power_j", "alive_nodes", "dead_nodes"],
+                   kinds=[trace.FLOAT, trace.FLOAT, trace.FLOAT, trace.FLOAT, trace.INT, trace.INT],
+                   formats={"avg_power_j": ".6f", "min_power_j": ".6f", "max_power_j": ".6f"})
 
     # Energy metrics CSV
-    with open("energy_metrics.csv", "w", newline="") as f:
+    with open(ctx.path("energy_metrics.csv"), "w", newline="") as f:
         writer = csv.writer(f)
         writer.writerow([
             "node_id",
@@ -208,85 +487,91 @@ def init_csv_files():
             "avg_energy_per_tx_packet_j",
             "avg_energy_per_rx_packet_j",
             "energy_efficiency_j_per_packet",
+            "idle_energy_consumed_j",
         ])
 
 
-def log_all_packets(packet_log, filename="packet_log.csv"):
+def log_all_packets(ctx, packet_log, filename="packet_log.csv"):
     """
-    Write all packet deliveries to a CSV file.
+    Write all packet deliveries to a CSV file (or columnar table with TRACE_FORMAT 'npy').
 
     Works with the list-of-dicts format we append to sim.packet_log
     in SensorNode.maybe_log_packet_delivery().
     """
-    with open(filename, mode="w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "packet_id",
-            "packet_type",
-            "source_gui",
-            "dest_gui",
-            "created_at",
-            "received_at",
-            "delay",
-            "path",
-        ])
-
-        # Accept either dict (old style) or list-of-dicts (our style)
-        if isinstance(packet_log, dict):
-            for pck_id, entry in packet_log.items():
-                created_at = entry.get("created_at")
-                source = entry.get("source")
-                for recv_time in entry.get("received_at", []) or [""]:
-                    delay = "" if not recv_time else (recv_time - created_at)
-                    writer.writerow([
-                        pck_id,
-                        "",
-                        source,
-                        "",
-                        created_at,
-                        recv_time,
-                        delay,
-                        "",
-                    ])
-        else:
-            for entry in packet_log:
-                writer.writerow([
-                    entry.get("pkt_id"),
-                    entry.get("type"),
-                    entry.get("source_gui"),
-                    entry.get("dest_gui"),
-                    entry.get("created_at"),
-                    entry.get("received_at"),
-                    entry.get("delay"),
-                    " -> ".join(str(n) for n in entry.get("path", [])),
+    sim = ctx.sim
+    sim.trace.open(filename, [
+        "packet_id",
+        "packet_type",
+        "source_gui",
+        "dest_gui",
+        "created_at",
+        "received_at",
+        "delay",
+        "path",
+    ], kinds=[trace.INT, trace.STR, trace.INT, trace.INT,
+              trace.FLOAT, trace.FLOAT, trace.FLOAT, trace.PATH])
+    # Columnar tables keep paths as id lists, CSV joins them
+    columnar = sim.trace.is_columnar(filename)
+
+    # Accept either dict (old style) or list-of-dicts (our style)
+    if isinstance(packet_log, dict):
+        for pck_id, entry in packet_log.items():
+            created_at = entry.get("created_at")
+            source = entry.get("source")
+            for recv_time in entry.get("received_at", []) or [""]:
+                delay = "" if not recv_time else (recv_time - created_at)
+                sim.trace.write(filename, [
+                    pck_id,
+                    "",
+                    source,
+                    "",
+                    created_at,
+                    recv_time,
+                    delay,
+                    [] if columnar else "",
                 ])
+    else:
+        for entry in packet_log:
+            path = entry.get("path", [])
+            sim.trace.write(filename, [
+                entry.get("pkt_id"),
+                entry.get("type"),
+                entry.get("source_gui"),
+                entry.get("dest_gui"),
+                entry.get("created_at"),
+                entry.get("received_at"),
+                entry.get("delay"),
+                path if columnar else " -> ".join(str(n) for n in path),
+            ])
+    sim.trace.flush()
 
 
-def log_registration_time(node_id, start_time, registered_time, diff):
-    with open("registration_log.csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([node_id, start_time, registered_time, diff])
+def export_columnar_traces(ctx):
+    """Export columnar trace tables as CSV files with the same schema as TRACE_FORMAT 'csv'."""
+    sim = ctx.sim
+    for filename in ("packet_log.csv", "packet_routes.csv", "role_changes.csv", "power_over_time.csv"):
+        if sim.trace.is_columnar(filename):
+            path = ctx.path(filename)
+            trace.export_csv(trace.columnar_path(path, sim.trace.compress), path)
 
 
-def check_all_nodes_registered():
-    """Return True when all nodes are registered / CH / ROOT / ROUTER."""
-    global RECOVERY_DURATION, RECOVERY_START_TIME
+def log_registration_time(ctx, node_id, start_time, registered_time, diff):
+    ctx.sim.trace.write("registration_log.csv", [node_id, start_time, registered_time, diff])
 
-    unregistered_nodes = []
 
-    for node in ALL_NODES:
-        role = getattr(node, "role", "UNKNOWN")
-        if role not in {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}:
-            unregistered_nodes.append(node.id)
+def check_all_nodes_registered(ctx):
+    """Return True when all nodes are registered / CH / ROOT / ROUTER."""
+    converged = ctx.orphan_count() == 0
 
     # Check if recovery is complete (0 orphans after recovery started)
-    if RECOVERY_START_TIME is not None and RECOVERY_DURATION is None:
-        if not unregistered_nodes:
-            RECOVERY_DURATION = sim.now - RECOVERY_START_TIME
+    if ctx.recovery_start_time is not None and ctx.recovery_duration is None:
+        if converged:
+            now = ctx.sim.now
+            ctx.recovery_duration = now - ctx.recovery_start_time
             print(
-                f"✅ RECOVERY COMPLETE at time {sim.now:.2f}. Duration: {RECOVERY_DURATION:.2f} sim seconds")
+                f"✅ RECOVERY COMPLETE at time {now:.2f}. Duration: {ctx.recovery_duration:.2f} sim seconds")
 
-    return not unregistered_nodes
+    return converged
 
 
 # CSV files will be initialized in init_csv_files() before simulation runs
@@ -294,17 +579,15 @@ def check_all_nodes_registered():
 
 def log_packet_route(pck, current_node, next_hop, path_type):
     """Append a routing trace row to packet_routes.csv (only if enabled)."""
-    if not ENABLE_PACKET_ROUTE_LOGGING:
+    if not current_node.params.ENABLE_PACKET_ROUTE_LOGGING:
         return
-    with open("packet_routes.csv", "a", newline="") as f:
-        w = csv.writer(f)
-        time = getattr(current_node, "now", "")
-        ptype = pck.get("type", "")
-        src = str(pck.get("source", ""))
-        dest = str(pck.get("dest", ""))
-        hop = pck.get("hop_count", "")
-        w.writerow([time, ptype, src, current_node.id,
-                   next_hop, dest, hop, path_type])
+    time = getattr(current_node, "now", "")
+    ptype = pck.get("type", "")
+    src = str(pck.get("source", ""))
+    dest = str(pck.get("dest", ""))
+    hop = pck.get("hop_count", "")
+    current_node.sim.trace.write("packet_routes.csv", [time, ptype, src, current_node.id,
+                                                       next_hop, dest, hop, path_type])
 
 
 ###########################################################
@@ -314,6 +597,9 @@ class SensorNode(wsn.Node):
     ###################
     def init(self):
         """Initialization of node."""
+        # Per-run state and config values, see RunContext
+        self.ctx = self.sim.ctx
+        self.params = self.ctx.params
         self.scene.nodecolor(self.id, 1, 1, 1)  # white
         self.sleep()
         self.addr = None
@@ -323,19 +609,25 @@ class SensorNode(wsn.Node):
         self.parent_gui = None
         self.root_addr = None
         self.wake_up_time = None
-        # Energy model (8) - will be set to INITIAL_ENERGY_J below
-        self.power = INITIAL_ENERGY_J
 
         self.set_role(Roles.UNDISCOVERED)
-        self.is_root_eligible = True if self.id == ROOT_ID else False
+        self.is_root_eligible = True if self.id == self.ctx.root_id else False
         self.c_probe = 0
         self.th_probe = 10
         self.hop_count = 99999
         self.jr_threshold = 8
-        self.neighbors_table = {}
+        self.hb_interval = self.params.HEART_BEAT_INTERVAL  # Trickle interval I
+        self.hb_heard = 0  # consistent HEART_BEATs heard in the Trickle interval
+        self.join_retries = 0  # join retries backed off since the last new candidate parent
+        self.probe_reply_heard = 0  # equal or better HEART_BEATs heard while a PROBE reply waits
+        self.last_probe_reply = None  # time of the last PROBE reply
+        self.neighbors_table = NeighborTable()
+        self.share_acked = {}  # gui -> version of our neighbors_table the neighbor has
+        self.share_received = {}  # gui -> version of the neighbor's table we have
+        self.share_count = 0  # TABLE_SHAREs sent, every TABLE_SHARE_FULL_EVERY-th is full
         self.candidate_parents_table = []
-        self.child_networks_table = {}
-        self.members_table = []
+        self.child_networks_table = ChildNetworksTable()
+        self.members_table = {}  # Addr -> gui of members that sent JOIN_ACK
         self.net_req_flag = None
         self.join_req_attempts = {}
         self.received_JR_guis = []
@@ -343,56 +635,48 @@ class SensorNode(wsn.Node):
         self.net_id_available_dict = {}
         self.awaiting_ack = False
         self.ch_nominee = None
-        self.ch_nomination_blacklist = []
+        self.ch_nomination_blacklist = set()  # Addr
         self.tx_range_circle_id = None  # Track TX range circle for removal
         self.join_request_times = []
         self.max_pending_join_distance = 0
         self.failed = False
-        # Energy model (8) - TX current initialized here
-        self.tx_current_mA = TX_CURRENTS_MA.get(NODE_DEFAULT_TX_POWER, 17.4)
-        # Energy metrics tracking
-        self.tx_energy_consumed = 0.0  # Total TX energy consumed (J)
-        self.rx_energy_consumed = 0.0  # Total RX energy consumed (J)
-        self.tx_packet_count = 0       # Number of packets transmitted
-        self.rx_packet_count = 0       # Number of packets received
-        ALL_NODES.append(self)
+        # Energy model (8) - INITIAL_ENERGY_J, TX costs of the default power and energy metrics
+        self.ctx.energy.attach(self, self.params.NODE_DEFAULT_TX_POWER)
+        self.ctx.nodes.append(self)
+        if self.sim.profiler is not None:
+            # Forwarding runs inside receive and timer events, time it on its own too
+            self.sim.profiler.instrument(self, "route_and_forward_package")
 
     ###################
     def run(self):
         """Schedule wakeup."""
         self.set_timer('TIMER_ARRIVAL', self.arrival)
         # Schedule one-time role optimization check to trim unneeded CH/Router overlap
-        self.set_timer('TIMER_ROLE_OPTIMIZE', ROLE_OPTIMIZE_TIME)
+        self.set_timer('TIMER_ROLE_OPTIMIZE', self.params.ROLE_OPTIMIZE_TIME)
 
     ###################
     def set_address(self, addr):
         """Set node address and update global mapping."""
-        global ADDR_TO_NODE
 
         if hasattr(self, 'addr') and self.addr is not None:
-            old_key = (self.addr.net_addr, self.addr.node_addr)
-            ADDR_TO_NODE.pop(old_key, None)
+            self.ctx.addr_to_node.pop(self.addr, None)
 
         self.addr = addr
 
         if addr is not None:
-            key = (addr.net_addr, addr.node_addr)
-            ADDR_TO_NODE[key] = self
+            self.ctx.addr_to_node[addr] = self
 
     ###################
     def set_ch_address(self, ch_addr):
         """Set cluster head address and update global mapping."""
-        global ADDR_TO_NODE
 
         if hasattr(self, 'ch_addr') and self.ch_addr is not None:
-            old_key = (self.ch_addr.net_addr, self.ch_addr.node_addr)
-            ADDR_TO_NODE.pop(old_key, None)
+            self.ctx.addr_to_node.pop(self.ch_addr, None)
 
         self.ch_addr = ch_addr
 
         if ch_addr is not None:
-            key = (ch_addr.net_addr, ch_addr.node_addr)
-            ADDR_TO_NODE[key] = self
+            self.ctx.addr_to_node[ch_addr] = self
 
     ###################
     def register(self):
@@ -405,74 +689,76 @@ class SensorNode(wsn.Node):
         if is_first_registration:
             self._has_registered_before = True
 
-        global NODES_REGISTERED
-        NODES_REGISTERED += 1
-        if NODES_REGISTERED == len(ALL_NODES) - 1:
-            log_all_nodes_registered()
+        self.ctx.nodes_registered += 1
+        if self.ctx.nodes_registered == len(self.ctx.nodes) - 1:
+            log_all_nodes_registered(self.ctx)
 
-        log_registration_time(self.id, self.wake_up_time,
+        log_registration_time(self.ctx, self.id, self.wake_up_time,
                               self.registered_time, diff)
         # Only count first registration in join_times (to avoid counting re-joins after demotion/recovery)
         if is_first_registration:
             self.sim.join_times.append(diff)
 
+    ###################
+    @property
+    def power(self):
+        """Remaining energy (J) of the node now, with the idle / sleep drain since it was last touched."""
+        return self.ctx.energy.level(self)
+
+    ###################
+    @power.setter
+    def power(self, value):
+        self.ctx.energy.set_level(self, value)
+
+    ###################
+    def sleep(self):
+        """Make node sleep and draw sleep current."""
+        super().sleep()
+        self.ctx.energy.set_sleeping(self, True)
+
+    ###################
+    def wake_up(self):
+        """Wake node up and draw idle current."""
+        super().wake_up()
+        self.ctx.energy.set_sleeping(self, False)
+
     ###################
     def assign_tx_power(self, power_level=None):
-        """Pick a TX power level and update tx_range + tx_current."""
+        """Pick a TX power level and update tx_range + TX energy costs."""
         # Example: CH selects minimum power level (0/1/2) needed to cover farthest child, reducing energy consumption
-        global TX_RANGES, TX_POWER_LEVELS
 
         if power_level is not None:
             self.tx_power = power_level
         elif self.role == Roles.ROUTER:
             # Routers always run at highest power to bridge clusters.
-            self.tx_power = POWER_LEVELS_ASC[-1] if POWER_LEVELS_ASC else NODE_DEFAULT_TX_POWER
+            self.tx_power = self.params.POWER_LEVELS_ASC[-1] if self.params.POWER_LEVELS_ASC else self.params.NODE_DEFAULT_TX_POWER
         elif self.role in (Roles.CLUSTER_HEAD, Roles.ROOT):
             # CH/ROOT choose minimal power that covers farthest relevant neighbor.
             max_dist = self._max_cluster_distance()
-            self.tx_power = _min_power_for_distance(
-                max_dist) if max_dist > 0 else NODE_DEFAULT_TX_POWER
+            self.tx_power = _min_power_for_distance(self.params,
+                max_dist) if max_dist > 0 else self.params.NODE_DEFAULT_TX_POWER
         else:
             # Leaf/unregistered nodes stay at default; clusters manage coverage.
-            self.tx_power = NODE_DEFAULT_TX_POWER
+            self.tx_power = self.params.NODE_DEFAULT_TX_POWER
 
-        range_val = TX_RANGES.get(self.tx_power, config.NODE_TX_RANGE)
-        self.tx_range = range_val * config.SCALE
+        range_val = self.params.TX_RANGES.get(self.tx_power, self.params.NODE_TX_RANGE)
+        self.tx_range = range_val * self.params.SCALE
 
-        # Set TX current (mA) for energy model (8)
-        self.tx_current_mA = TX_CURRENTS_MA.get(self.tx_power, 17.4)
+        # Precomputed TX energy by packet size of this power level (8)
+        self.tx_costs = self.ctx.energy.tx_table(self.tx_power)
 
     ###################
     def _consume_tx_energy(self, n_bytes=None):
         """Subtract TX energy for one packet from self.power (8)."""
-        # Example: Calculates CC2420 TX energy (V*I*8*(N+6)/R + overhead) and decrements node's power, may trigger death
-        if not hasattr(self, "power"):
-            return  # safety
-
-        # Choose packet length (PSDU). If not given, use config default.
-        if n_bytes is None:
-            n_bytes = ENERGY_PSDU_BYTES
-
-        I_mA = getattr(self, "tx_current_mA", None)
-        if I_mA is None:
-            I_mA = 17.4  # fallback: worst-case current
-
-        V = VOLTAGE
-        R = DATARATE
-
-        # Etx = (V * I * 8*(N+6)) / R  (I in Amps)  + overhead
-        I_A = I_mA / 1000.0
-        bits = 8 * (n_bytes + 6)
-        base_E = V * I_A * (bits / R)
-        overhead = TX_TURNAROUND_ENERGY_J
-        dE = base_E + overhead
-
-        # Track energy metrics
-        self.tx_energy_consumed += dE
-        self.tx_packet_count += 1
-
-        self.power -= dE
-        if self.power <= MIN_ENERGY_J:
+        # Example: Looks up CC2420 TX energy (V*I*8*(N+6)/R + overhead) of the power level and packet size, may trigger death
+        # Packet length (PSDU) defaults to ENERGY_PSDU_BYTES
+        if self.ctx.energy.consume_tx(self, n_bytes):
+            self._die_of_energy()
+
+    ###################
+    def on_energy_depleted(self):
+        """Called by the energy model when the idle / sleep drain takes the node to MIN_ENERGY_J."""
+        if self.id != self.ctx.root_id:
             self._die_of_energy()
 
     ###################
@@ -480,16 +766,16 @@ class SensorNode(wsn.Node):
         """Turn node off permanently due to energy depletion (8)."""
         # Example: When power <= MIN_ENERGY_J, node turns dark gray(disappears), disconnects children, triggers network reorganization
         # Root node cannot die from energy depletion - it's critical for network
-        if self.id == ROOT_ID:
+        if self.id == self.ctx.root_id:
             self.log(
                 "Root node energy depleted, but root cannot die. Energy set to minimum.")
-            self.power = MIN_ENERGY_J  # Keep at minimum but alive
+            self.power = self.params.MIN_ENERGY_J  # Keep at minimum but alive
             return
 
         if getattr(self, "failed", False):
             return  # already dead/killed
 
-        self.failed = True
+        self.set_failed(True)
         self.sleep()
         self.kill_all_timers()
         # Remove TX range circle (diameter) if visible (e.g., for CLUSTER_HEADs)
@@ -502,7 +788,7 @@ class SensorNode(wsn.Node):
 
         # Log this as a failure event
         try:
-            log_failure_event(self.now, self.id, "ENERGY_DEAD")
+            log_failure_event(self.ctx, self.now, self.id, "ENERGY_DEAD")
         except Exception:
             pass
 
@@ -515,12 +801,7 @@ class SensorNode(wsn.Node):
             self.erase_parent()
 
         # Find all nodes that have this node as their parent
-        children_to_disconnect = []
-        for node in ALL_NODES:
-            if (hasattr(node, 'parent_gui') and
-                node.parent_gui == self.id and
-                    not getattr(node, "failed", False)):
-                children_to_disconnect.append(node)
+        children_to_disconnect = [node for node in self.ctx.children_of(self.id) if not node.failed]
 
         # Disconnect each child and make them rejoin
         for child in children_to_disconnect:
@@ -529,12 +810,12 @@ class SensorNode(wsn.Node):
             # Erase parent arrow (green arrow pointing from dead parent to child)
             child.erase_parent()
             # Clear parent relationship
-            child.parent_gui = None
+            child.set_parent(None)
             child.ch_addr = None
             # Become unregistered to trigger rejoin process
             child.become_unregistered()
             # Restart join request timer
-            child.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL)
+            child.set_timer('TIMER_JOIN_REQUEST', self.params.JOIN_REQUEST_INTERVAL)
 
         if children_to_disconnect:
             self.log(
@@ -564,98 +845,136 @@ class SensorNode(wsn.Node):
         # Example: set_role(Roles.CLUSTER_HEAD) transitions node from REGISTERED to CH, updates GUI color, logs change
         old_role = getattr(self, "role", None)
         if old_role is not None:
-            ROLE_COUNTS[old_role] -= 1
-            if ROLE_COUNTS[old_role] <= 0:
-                ROLE_COUNTS.pop(old_role, None)
-        ROLE_COUNTS[new_role] += 1
+            self.ctx.role_counts[old_role] -= 1
+            if self.ctx.role_counts[old_role] <= 0:
+                self.ctx.role_counts.pop(old_role, None)
+            if old_role in REGISTERED_ROLES:
+                self.ctx.registered_count -= 1
+        self.ctx.role_counts[new_role] += 1
+        if new_role in REGISTERED_ROLES:
+            self.ctx.registered_count += 1
         self.role = new_role
 
         # Log role transitions (skip initial None -> UNDISCOVERED)
         if old_role is not None and old_role != new_role:
             try:
-                with open("role_changes.csv", "a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        getattr(self, "now", ""),
-                        self.id,
-                        _role_name(old_role),
-                        _role_name(new_role),
-                    ])
+                self.sim.trace.write("role_changes.csv", [
+                    getattr(self, "now", ""),
+                    self.id,
+                    _role_name(old_role),
+                    _role_name(new_role),
+                ])
             except Exception:
                 # Don't break the sim if logging fails
                 pass
+            self.reset_heart_beat()
 
         if recolor:
+            # Headless runs skip drawing calls entirely
+            visual = self.sim.visual
             if new_role == Roles.UNDISCOVERED:
-                self.scene.nodecolor(self.id, 1, 1, 1)
+                if visual:
+                    self.scene.nodecolor(self.id, 1, 1, 1)
             elif new_role == Roles.UNREGISTERED:
-                self.scene.nodecolor(self.id, 1, 1, 0)
+                if visual:
+                    self.scene.nodecolor(self.id, 1, 1, 0)
             elif new_role == Roles.REGISTERED:
-                self.scene.nodecolor(self.id, 0, 1, 0)
+                if visual:
+                    self.scene.nodecolor(self.id, 0, 1, 0)
             elif new_role == Roles.CLUSTER_HEAD:
-                self.scene.nodecolor(self.id, 0, 0, 1)
-                if ALLOW_TX_POWER_CHOICE:
+                if visual:
+                    self.scene.nodecolor(self.id, 0, 0, 1)
+                if self.params.ALLOW_TX_POWER_CHOICE:
                     self.assign_tx_power()
                 else:
-                    self.assign_tx_power(NODE_DEFAULT_TX_POWER)
+                    self.assign_tx_power(self.params.NODE_DEFAULT_TX_POWER)
                 self.draw_tx_range()
             elif new_role == Roles.ROUTER:
                 # Slightly different color so you can distinguish routers
-                self.scene.nodecolor(self.id, 1, 0, 1)
-                if ALLOW_TX_POWER_CHOICE:
+                if visual:
+                    self.scene.nodecolor(self.id, 1, 0, 1)
+                if self.params.ALLOW_TX_POWER_CHOICE:
                     self.assign_tx_power()
                 else:
-                    self.assign_tx_power(NODE_DEFAULT_TX_POWER)
+                    self.assign_tx_power(self.params.NODE_DEFAULT_TX_POWER)
                 # Remove TX range circle if it exists (from previous CLUSTER_HEAD role)
                 self.remove_tx_range()
             elif new_role == Roles.ROOT:
-                self.scene.nodecolor(self.id, 0, 0, 0)
-                self.assign_tx_power(NODE_DEFAULT_TX_POWER)
+                if visual:
+                    self.scene.nodecolor(self.id, 0, 0, 0)
+                self.assign_tx_power(self.params.NODE_DEFAULT_TX_POWER)
                 # Draw TX range circle in cyan for root
                 self.draw_tx_range()
                 # Root drives CSV exports
                 self.set_timer('TIMER_EXPORT_CH_CSV',
-                               config.EXPORT_CH_CSV_INTERVAL)
+                               self.params.EXPORT_CH_CSV_INTERVAL)
                 self.set_timer('TIMER_EXPORT_NEIGHBOR_CSV',
-                               config.EXPORT_NEIGHBOR_CSV_INTERVAL)
+                               self.params.EXPORT_NEIGHBOR_CSV_INTERVAL)
 
         # Guard: CH/Router must hang off CH/ROOT (never REGISTERED). If not, force rejoin.
         if new_role in (Roles.CLUSTER_HEAD, Roles.ROUTER):
             self._ensure_valid_backbone_parent()
 
+    ###################
+    def set_parent(self, gui):
+        """Set parent node id and keep the parent -> children index of the run."""
+        children = self.ctx.children
+        if self.parent_gui is not None:
+            siblings = children[self.parent_gui]
+            siblings.discard(self.id)
+            if not siblings:
+                del children[self.parent_gui]
+        if gui != self.parent_gui:
+            self.reset_heart_beat()
+        self.parent_gui = gui
+        if gui is not None:
+            children.setdefault(gui, set()).add(self.id)
+
+    ###################
+    def set_failed(self, failed):
+        """Marks node as failed (killed or energy dead) or alive again and keeps the dead node tally."""
+        if failed != self.failed:
+            self.ctx.dead_count += 1 if failed else -1
+        self.failed = failed
+
     ###################
     def become_unregistered(self):
         if self.role != Roles.UNDISCOVERED:
             self.kill_all_timers()
             self.log('I became UNREGISTERED')
-        self.scene.nodecolor(self.id, 1, 1, 0)
+        if self.sim.visual:
+            self.scene.nodecolor(self.id, 1, 1, 0)
         # Ensure any TX range visuals from CH/ROOT are removed when stepping down.
         self.remove_tx_range()
         self.erase_parent()
         self.addr = None
         self.ch_addr = None
-        self.parent_gui = None
+        self.set_parent(None)
         self.root_addr = None
         self.set_role(Roles.UNREGISTERED)
         self.c_probe = 0
         self.th_probe = 10
         self.hop_count = 99999
-        self.neighbors_table = {}
+        # Versions go on, so what neighbors acknowledged of the old table stays right
+        self.neighbors_table = NeighborTable(version=self.neighbors_table.version)
+        self.share_received = {}
         self.candidate_parents_table = []
-        self.child_networks_table = {}
-        self.members_table = []
+        self.join_retries = 0
+        self.child_networks_table = ChildNetworksTable()
+        self.members_table = {}  # Addr -> gui of members that sent JOIN_ACK
         self.received_JR_guis = []
         self.send_probe()
-        self.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL)
+        self.set_timer('TIMER_JOIN_REQUEST', self.params.JOIN_REQUEST_INTERVAL)
         # If we had children, force them to rejoin since we are no longer a valid parent.
         self._disconnect_children_on_unregistered()
 
     ###################
     def _disconnect_children_on_unregistered(self):
         """When we become UNREGISTERED, disconnect any children so they rejoin elsewhere."""
-        for node in ALL_NODES:
-            if (getattr(node, "parent_gui", None) == self.id
-                    and not getattr(node, "failed", False)
+        # Only our subtree is touched; each child disconnects its own children in turn.
+        for node in self.ctx.children_of(self.id):
+            if (node.parent_gui == self.id
+                    and not node.failed
                     and node is not self):
                 node.become_unregistered()
 
@@ -663,6 +982,8 @@ class SensorNode(wsn.Node):
     def draw_tx_range(self):
         """Override to track circle ID so we can remove it later."""
         # Example: Draws blue dashed circle for CH or cyan dashed circle for ROOT, stores circle ID for later removal
+        if not self.sim.visual:
+            return
         # Remove existing circle if any
         if self.tx_range_circle_id is not None:
             self.scene.delshape(self.tx_range_circle_id)
@@ -697,14 +1018,11 @@ class SensorNode(wsn.Node):
         for gui, neigh in self.neighbors_table.items():
             src = neigh['source']   # Addr
             # Skip if in blacklist
-            if (src.net_addr, src.node_addr) in self.ch_nomination_blacklist:
+            if src in self.ch_nomination_blacklist:
                 continue
 
-            for member in self.members_table:
-                if member == src:
-                    distance = neigh.get('distance', 0)
-                    candidates[(src.net_addr, src.node_addr)] = distance
-                    break
+            if src in self.members_table:
+                candidates[src] = neigh.get('distance', 0)
 
         if candidates:
             best_src = max(candidates, key=candidates.get)
@@ -712,34 +1030,34 @@ class SensorNode(wsn.Node):
             self.log(best_src)
             self.ch_nominee = best_src
             self.awaiting_ack = True
-            self.send({
-                'dest': wsn.Addr(best_src[0], best_src[1]),
-                'type': 'CH_NOMINATION',
-                'source': self.addr,
-                'addr': self.ch_addr,
-                'avail_dict': self.node_available_dict,
-            })
+            self.send(wsn.Packet(
+                dest=best_src,
+                type='CH_NOMINATION',
+                source=self.addr,
+                addr=self.ch_addr,
+                avail_dict=self.node_available_dict,
+            ))
 
     ###################
     def send_ch_nom_ack(self, pck):
         self.log("SENDING NOM ACK")
         self.send(
-            {'dest': pck['source'], 'type': 'CH_NOMINATION_ACK', 'source': self.addr})
+            wsn.Packet(dest=pck['source'], type='CH_NOMINATION_ACK', source=self.addr))
 
     ###################
     def bump_tx_power(self):
         """Increase TX power one level if possible; return True on change."""
-        if not POWER_LEVELS_ASC:
+        if not self.params.POWER_LEVELS_ASC:
             return False
         try:
-            current_idx = POWER_LEVELS_ASC.index(self.tx_power)
+            current_idx = self.params.POWER_LEVELS_ASC.index(self.tx_power)
         except ValueError:
             current_idx = -1
 
-        if current_idx >= len(POWER_LEVELS_ASC) - 1:
+        if current_idx >= len(self.params.POWER_LEVELS_ASC) - 1:
             return False
 
-        self.assign_tx_power(POWER_LEVELS_ASC[current_idx + 1])
+        self.assign_tx_power(self.params.POWER_LEVELS_ASC[current_idx + 1])
         if self.role == Roles.CLUSTER_HEAD:
             self.draw_tx_range()
         return True
@@ -756,15 +1074,15 @@ class SensorNode(wsn.Node):
         now = getattr(self, "now", 0)
         self.join_request_times.append(now)
         self.join_request_times = [
-            t for t in self.join_request_times if now - t <= JOIN_REQ_EXPAND_WINDOW]
+            t for t in self.join_request_times if now - t <= self.params.JOIN_REQ_EXPAND_WINDOW]
 
-        if len(self.join_request_times) >= JOIN_REQ_EXPAND_THRESHOLD:
+        if len(self.join_request_times) >= self.params.JOIN_REQ_EXPAND_THRESHOLD:
             expanded = self.bump_tx_power()
             # Reset counter after an expansion attempt to avoid runaway growth
             self.join_request_times = []
             if expanded:
                 self.log(
-                    f"Increasing TX power after {JOIN_REQ_EXPAND_THRESHOLD} join requests.")
+                    f"Increasing TX power after {self.params.JOIN_REQ_EXPAND_THRESHOLD} join requests.")
 
     def _max_cluster_distance(self):
         """
@@ -793,16 +1111,15 @@ class SensorNode(wsn.Node):
                     max_dist = max(max_dist, neigh['distance'])
 
         # Consider members_table addresses by matching to neighbor entries for distance
-        for member_addr in self.members_table:
+        # (first neighbor entry with a distance for each member)
+        if self.members_table:
+            seen = set()
             for neigh in self.neighbors_table.values():
                 neigh_addr = neigh.get('addr') or neigh.get('source')
-                try:
-                    same = neigh_addr.is_equal(member_addr)
-                except Exception:
-                    same = neigh_addr == member_addr
-                if same and neigh.get('distance') is not None:
+                if (neigh_addr in self.members_table and neigh_addr not in seen
+                        and neigh.get('distance') is not None):
+                    seen.add(neigh_addr)
                     max_dist = max(max_dist, neigh['distance'])
-                    break
 
         return max_dist
 
@@ -829,7 +1146,7 @@ class SensorNode(wsn.Node):
         """
         if self.role not in (Roles.CLUSTER_HEAD, Roles.ROUTER):
             return
-        if self.id == ROOT_ID:
+        if self.id == self.ctx.root_id:
             return
 
         parent_role = self._parent_role()
@@ -850,13 +1167,13 @@ class SensorNode(wsn.Node):
         self.remove_tx_range()
         self.ch_addr = None
         self.node_available_dict = {}
-        self.child_networks_table = {}
-        self.members_table = []
-        self.assign_tx_power(NODE_DEFAULT_TX_POWER)
+        self.child_networks_table = ChildNetworksTable()
+        self.members_table = {}  # Addr -> gui of members that sent JOIN_ACK
+        self.assign_tx_power(self.params.NODE_DEFAULT_TX_POWER)
         self.set_role(Roles.REGISTERED)
         # Ensure continued heartbeats and notify neighbors of new role
         self.send_heart_beat()
-        self.set_timer('TIMER_HEART_BEAT', HEART_BEAT_INTERVAL)
+        self.start_heart_beat()
 
     def optimize_role_choice(self):
         """
@@ -879,22 +1196,27 @@ class SensorNode(wsn.Node):
             return
 
         # Re-schedule to keep checking as topology changes
-        self.set_timer('TIMER_ROLE_OPTIMIZE', ROLE_OPTIMIZE_TIME)
+        self.set_timer('TIMER_ROLE_OPTIMIZE', self.params.ROLE_OPTIMIZE_TIME)
 
     ###################
     def update_neighbor(self, pck):
         """Update neighbor table from HEART_BEAT packet."""
         # Example: Updates neighbor distance/role from HEART_BEAT, enforces topology constraints (no leaf→router, no router→router)
-        pck = pck.copy()
-        pck['arrival_time'] = self.now
+        # Every receiver gets its own Packet from Node.send(), so it can be kept in the table as is
+        pck['arrival_time'] = self.receive_time
 
-        if pck['gui'] in NODE_POS and self.id in NODE_POS:
-            x1, y1 = NODE_POS[self.id]
-            x2, y2 = NODE_POS[pck['gui']]
+        if pck['gui'] in self.ctx.node_pos and self.id in self.ctx.node_pos:
+            x1, y1 = self.ctx.node_pos[self.id]
+            x2, y2 = self.ctx.node_pos[pck['gui']]
             pck['distance'] = math.hypot(x1 - x2, y1 - y2)
 
+        old_entry = self.neighbors_table.get(pck['gui'])
         pck['neighbor_hop_count'] = 1
         self.neighbors_table[pck['gui']] = pck
+        if self.params.HEART_BEAT_TRICKLE:
+            self.heard_heart_beat(old_entry, pck)
+        if self.params.PROBE_REPLY_SUPPRESS and self.role in REGISTERED_ROLES:
+            self.overhear_probe_reply(pck)
 
         # Constraint: REGISTERED nodes cannot attach to routers - only CLUSTER_HEAD or ROOT
         # Routers cannot attach to other routers - only CLUSTER_HEAD or ROOT
@@ -903,18 +1225,18 @@ class SensorNode(wsn.Node):
 
         if self.role in (Roles.REGISTERED, Roles.UNREGISTERED):
             # Leaf nodes must point to CH/ROOT, routers allowed only if fallback enabled.
-            if neighbor_role == Roles.ROUTER and not ALLOW_ROUTER_PARENT_FALLBACK:
+            if neighbor_role == Roles.ROUTER and not self.params.ALLOW_ROUTER_PARENT_FALLBACK:
                 can_be_parent = False
             # If our current parent just became a router and fallback is disabled, drop it and re-join.
             if (self.parent_gui == pck['gui'] and neighbor_role == Roles.ROUTER
-                    and not ALLOW_ROUTER_PARENT_FALLBACK):
+                    and not self.params.ALLOW_ROUTER_PARENT_FALLBACK):
                 self.log(
                     f"Dropping router parent {self.parent_gui}; rejoining.")
                 self.erase_parent()
-                self.parent_gui = None
+                self.set_parent(None)
                 self.ch_addr = None
                 self.set_role(Roles.UNREGISTERED)
-                self.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL)
+                self.set_timer('TIMER_JOIN_REQUEST', self.params.JOIN_REQUEST_INTERVAL)
                 can_be_parent = False
         elif self.role == Roles.ROUTER:
             # Routers can only attach to CLUSTER_HEAD or ROOT, not other routers
@@ -925,10 +1247,10 @@ class SensorNode(wsn.Node):
                 self.log(
                     f"Dropping router parent {self.parent_gui}; rejoining.")
                 self.erase_parent()
-                self.parent_gui = None
+                self.set_parent(None)
                 self.ch_addr = None
                 self.set_role(Roles.UNREGISTERED)
-                self.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL)
+                self.set_timer('TIMER_JOIN_REQUEST', self.params.JOIN_REQUEST_INTERVAL)
                 can_be_parent = False
 
         if can_be_parent and (pck['gui'] not in self.child_networks_table.keys() or pck['addr'] not in self.members_table):
@@ -947,6 +1269,7 @@ class SensorNode(wsn.Node):
                     self.candidate_parents_table.append(pck)
             else:
                 self.candidate_parents_table.append(pck)
+                self.new_candidate_heard()
 
     ###################
     def select_and_join(self):
@@ -978,7 +1301,7 @@ class SensorNode(wsn.Node):
                 continue
 
             if neighbor_role == Roles.ROUTER:
-                if ALLOW_ROUTER_PARENT_FALLBACK:
+                if self.params.ALLOW_ROUTER_PARENT_FALLBACK:
                     router_candidates.append(gui)
                 continue
 
@@ -992,7 +1315,7 @@ class SensorNode(wsn.Node):
             for gui, packet in self.neighbors_table.items():
                 neighbor_role = packet.get('role')
                 hop = packet.get('neighbor_hop_count', 1)
-                if neighbor_role in (Roles.CLUSTER_HEAD, Roles.ROOT) and hop <= MESH_HOP_N + 1:
+                if neighbor_role in (Roles.CLUSTER_HEAD, Roles.ROOT) and hop <= self.params.MESH_HOP_N + 1:
                     if packet.get('root_reachable'):
                         mesh_candidates_root.append(gui)
                     else:
@@ -1019,17 +1342,51 @@ class SensorNode(wsn.Node):
             selected_addr = self.neighbors_table[min_hop_gui].get(
                 'next_hop', self.neighbors_table[min_hop_gui]['source'])
             self.send_join_request(selected_addr)
-            self.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL)
+            self.set_timer('TIMER_JOIN_REQUEST', self.join_retry_delay(self.params.JOIN_REQUEST_INTERVAL))
         else:
             # No usable candidate; refresh neighbor discovery and retry sooner.
             self.send_probe()
-            self.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL / 2)
+            self.set_timer('TIMER_JOIN_REQUEST', self.join_retry_delay(self.params.JOIN_REQUEST_INTERVAL / 2))
+
+    ###################
+    def join_retry_delay(self, delay):
+        """Delay of the next join retry: delay grown JOIN_RETRY_BACKOFF times per retry since the
+        last new candidate parent, at most JOIN_RETRY_MAX_INTERVAL, then jittered by
+        +-JOIN_RETRY_JITTER of it so orphans of one failure do not retry in step.
+
+           Args:
+               delay (double): Retry delay without backoff.
+
+           Returns:
+               double: Retry delay.
+        """
+        backoff = self.params.JOIN_RETRY_BACKOFF
+        jitter = self.params.JOIN_RETRY_JITTER
+        if backoff != 1:
+            delay *= backoff ** self.join_retries
+            if delay >= self.params.JOIN_RETRY_MAX_INTERVAL:
+                delay = self.params.JOIN_RETRY_MAX_INTERVAL
+            else:
+                self.join_retries += 1
+        if jitter:
+            delay *= 1 + self.sim.random.uniform(-jitter, jitter)
+        return delay
+
+    ###################
+    def new_candidate_heard(self):
+        """Resets the join backoff. An orphan that backed off retries soon with the new candidate."""
+        backed_off = self.join_retries
+        self.join_retries = 0
+        if backed_off and self.role == Roles.UNREGISTERED:
+            timer = self.timers.get('TIMER_JOIN_REQUEST')
+            if timer is not None and timer.active:
+                self.set_timer('TIMER_JOIN_REQUEST', self.join_retry_delay(self.params.JOIN_REQUEST_INTERVAL / 2))
 
     ###################
     def send_probe(self):
         """Broadcast PROBE to discover neighbors."""
         # Example: UNREGISTERED node broadcasts PROBE, neighbors respond with HEART_BEAT containing their role/distance
-        self.send({'dest': wsn.BROADCAST_ADDR, 'type': 'PROBE'})
+        self.send(wsn.Packet(dest=wsn.BROADCAST_ADDR, type='PROBE'))
 
     ###################
     def send_heart_beat(self):
@@ -1037,27 +1394,101 @@ class SensorNode(wsn.Node):
         # Example: CH/ROOT broadcasts HEART_BEAT with mesh_table, neighbors update distance/role, triggers neighbor discovery
         # Re-evaluate TX power before advertising (helps shrink overlap when cluster contracts)
         if self.role in (Roles.CLUSTER_HEAD, Roles.ROOT):
-            prev_power = getattr(self, "tx_power", NODE_DEFAULT_TX_POWER)
+            prev_power = getattr(self, "tx_power", self.params.NODE_DEFAULT_TX_POWER)
             self.assign_tx_power()
             if self.role == Roles.CLUSTER_HEAD and self.tx_power != prev_power:
                 self.draw_tx_range()
-        self.send({
-            'dest': wsn.BROADCAST_ADDR,
-            'type': 'HEART_BEAT',
-            'source': self.ch_addr if self.ch_addr is not None else self.addr,
-            'gui': self.id,
-            'role': self.role,
-            'addr': self.addr,
-            'ch_addr': self.ch_addr,
-            'hop_count': self.hop_count,
+        self.ctx.heart_beats_sent += 1
+        self.send(wsn.Packet(
+            dest=wsn.BROADCAST_ADDR,
+            type='HEART_BEAT',
+            source=self.ch_addr if self.ch_addr is not None else self.addr,
+            gui=self.id,
+            role=self.role,
+            addr=self.addr,
+            ch_addr=self.ch_addr,
+            hop_count=self.hop_count,
             # Advertise root reachability so orphans prefer backbone-connected parents
-            'root_reachable': self.hop_count < 99999,
-            'root_hops': self.hop_count,
-        })
+            root_reachable=self.hop_count < 99999,
+            root_hops=self.hop_count,
+        ))
+
+    ###################
+    def start_heart_beat(self):
+        """Starts periodic HEART_BEATs, every HEART_BEAT_INTERVAL or, with HEART_BEAT_TRICKLE, in
+        Trickle intervals starting at HEART_BEAT_INTERVAL."""
+        if self.params.HEART_BEAT_TRICKLE:
+            self.hb_interval = self.params.HEART_BEAT_INTERVAL
+            self._start_heart_beat_interval()
+        else:
+            self.set_timer('TIMER_HEART_BEAT', self.params.HEART_BEAT_INTERVAL)
+
+    ###################
+    def _start_heart_beat_interval(self):
+        """Starts a Trickle interval of hb_interval, its beat is at a random time in the second half."""
+        self.hb_heard = 0
+        self.set_timer('TIMER_HEART_BEAT', self.sim.random.uniform(self.hb_interval / 2, self.hb_interval))
+        self.set_timer('TIMER_HEART_BEAT_END', self.hb_interval)
+
+    ###################
+    def reset_heart_beat(self):
+        """Trickle inconsistency (role or parent change, new or changed neighbor, PROBE or JOIN_REQUEST
+        heard): back to the shortest interval, if the node beats and is not there yet."""
+        if not self.params.HEART_BEAT_TRICKLE or self.hb_interval <= self.params.HEART_BEAT_INTERVAL:
+            return
+        end = self.timers.get('TIMER_HEART_BEAT_END')
+        if end is not None and end.active:
+            self.hb_interval = self.params.HEART_BEAT_INTERVAL
+            self._start_heart_beat_interval()
+
+    ###################
+    def heard_heart_beat(self, old_entry, pck):
+        """Trickle: counts a HEART_BEAT of a known 1-hop neighbor whose state did not change,
+        anything else is an inconsistency."""
+        if (old_entry is not None and old_entry['neighbor_hop_count'] == 1
+                and all(old_entry.get(key) == pck.get(key) for key in HEART_BEAT_STATE)):
+            self.hb_heard += 1
+        else:
+            self.reset_heart_beat()
+
+    ###################
+    def reply_to_probe(self):
+        """Answers a PROBE with a HEART_BEAT, at most once per PROBE_REPLY_MIN_INTERVAL. With
+        PROBE_REPLY_DELAY the reply waits a random time up to it, and one pending reply answers
+        every PROBE heard meanwhile."""
+        params = self.params
+        if (self.last_probe_reply is not None
+                and self.now - self.last_probe_reply < params.PROBE_REPLY_MIN_INTERVAL):
+            self.ctx.probe_replies_limited += 1
+            return
+        if not params.PROBE_REPLY_DELAY:
+            self._send_probe_reply()
+            return
+        timer = self.timers.get('TIMER_PROBE_REPLY')
+        if timer is None or not timer.active:
+            self.probe_reply_heard = 0
+            # Timers need at least 0.00001
+            self.set_timer('TIMER_PROBE_REPLY', self.sim.random.uniform(0.00001, params.PROBE_REPLY_DELAY))
+
+    ###################
+    def _send_probe_reply(self):
+        """Sends a PROBE reply HEART_BEAT now."""
+        self.last_probe_reply = self.now
+        self.ctx.probe_replies += 1
+        self.send_heart_beat()
+
+    ###################
+    def overhear_probe_reply(self, pck):
+        """Counts a HEART_BEAT heard while a PROBE reply waits if its sender is an equal or better
+        parent: root reachable with the same or a lower hop_count."""
+        timer = self.timers.get('TIMER_PROBE_REPLY')
+        if (timer is not None and timer.active and pck.get('root_reachable')
+                and pck.get('hop_count', 99999) <= self.hop_count):
+            self.probe_reply_heard += 1
 
     ###################
     def send_join_request(self, dest):
-        self.send({'dest': dest, 'type': 'JOIN_REQUEST', 'gui': self.id})
+        self.send(wsn.Packet(dest=dest, type='JOIN_REQUEST', gui=self.id))
 
     ###################
     def send_join_reply(self, gui, addr):
@@ -1069,17 +1500,17 @@ class SensorNode(wsn.Node):
             self.log("Warning: Cannot send JOIN_REPLY - no valid source address")
             return
 
-        self.send({
-            'dest': wsn.BROADCAST_ADDR,
-            'type': 'JOIN_REPLY',
-            'source': source_addr,
-            'gui': self.id,
-            'dest_gui': gui,
-            'addr': addr,
-            'root_addr': self.root_addr,
-            'tx_power': getattr(self, "tx_power", NODE_DEFAULT_TX_POWER),
-            'hop_count': self.hop_count + 1,
-        })
+        self.send(wsn.Packet(
+            dest=wsn.BROADCAST_ADDR,
+            type='JOIN_REPLY',
+            source=source_addr,
+            gui=self.id,
+            dest_gui=gui,
+            addr=addr,
+            root_addr=self.root_addr,
+            tx_power=getattr(self, "tx_power", self.params.NODE_DEFAULT_TX_POWER),
+            hop_count=self.hop_count + 1,
+        ))
 
     ###################
     def send_join_ack(self, dest):
@@ -1098,8 +1529,8 @@ class SensorNode(wsn.Node):
                 self.log("Warning: Cannot send JOIN_ACK - no valid source address")
                 return
 
-        self.send({'dest': dest, 'type': 'JOIN_ACK',
-                  'source': source_addr, 'gui': self.id})
+        self.send(wsn.Packet(dest=dest, type='JOIN_ACK',
+                             source=source_addr, gui=self.id))
 
     ###################
     def route_and_forward_package(self, pck):
@@ -1118,41 +1549,36 @@ class SensorNode(wsn.Node):
                         'ch_addr') or parent_entry.get('addr')
                 path_type = "TREE"
 
-        # Direct or child cluster routing
-        if self.ch_addr is not None and pck.get('dest') is not None:
-            if pck['dest'].net_addr == self.ch_addr.net_addr:
-                pck['next_hop'] = pck['dest']
+        dest = pck.get('dest')
+        if dest is not None and self.ctx.check_tallies:
+            self._check_routing_index(dest)
+
+        # Direct or child cluster routing, child owning the net from the reverse index
+        if self.ch_addr is not None and dest is not None:
+            if dest.net_addr == self.ch_addr.net_addr:
+                pck['next_hop'] = dest
                 path_type = "TREE"
             else:
-                for child_gui, child_networks in self.child_networks_table.items():
-                    if pck['dest'].net_addr in child_networks:
-                        pck['next_hop'] = self.neighbors_table[child_gui]['addr']
-                        path_type = "TREE"
-                        break
-        elif self.role == Roles.ROUTER and pck.get('dest') is not None:
-            for child_gui, child_networks in self.child_networks_table.items():
-                if pck['dest'].net_addr in child_networks:
+                child_gui = self.child_networks_table.owner(dest.net_addr)
+                if child_gui is not None:
                     pck['next_hop'] = self.neighbors_table[child_gui]['addr']
                     path_type = "TREE"
-                    break
+        elif self.role == Roles.ROUTER and dest is not None:
+            child_gui = self.child_networks_table.owner(dest.net_addr)
+            if child_gui is not None:
+                pck['next_hop'] = self.neighbors_table[child_gui]['addr']
+                path_type = "TREE"
 
         # Try direct / mesh based on neighbors_table
         # Restrictions: REGISTERED cannot directly talk to ROUTER, ROUTER cannot directly talk to ROUTER or REGISTERED
-        dest = pck.get('dest')
         neighbor_match = None
         member_match = None
 
         if dest is not None:
-            neighbor_match = next(
-                (entry for entry in self.neighbors_table.values()
-                 if entry['addr'] == dest),
-                None
-            )
-            if not neighbor_match:
-                member_match = next(
-                    (entry for entry in self.members_table if entry == dest),
-                    None
-                )
+            # Neighbor entry by address from the table index
+            neighbor_match = self.neighbors_table.find_addr(dest)
+            if neighbor_match is None and dest in self.members_table:
+                member_match = dest
 
         match = neighbor_match or member_match
         if match:
@@ -1161,15 +1587,9 @@ class SensorNode(wsn.Node):
             if neighbor_match:
                 neighbor_role = neighbor_match.get('role')
             else:
-                # member_match is an address - look up the role from neighbors_table
-                # Find the neighbor entry by matching the address
-                neighbor_entry = next(
-                    (entry for entry in self.neighbors_table.values()
-                     if entry.get('addr') == member_match),
-                    None
-                )
-                neighbor_role = neighbor_entry.get(
-                    'role') if neighbor_entry else None
+                # No neighbor entry has a member's address (it would have matched above),
+                # so its role is unknown
+                neighbor_role = None
 
             # Check restrictions for direct/mesh communication
             can_communicate_directly = True
@@ -1200,22 +1620,35 @@ class SensorNode(wsn.Node):
         log_packet_route(pck, self, next_hop_str, path_type)
         self.send(pck)
 
+    ###################
+    def _check_routing_index(self, dest):
+        """Checks the routing table indexes against scans of the tables (CHECK_TALLIES).
+
+           Raises:
+               AssertionError: If an index lookup differs from the scan.
+        """
+        scan = next((entry for entry in self.neighbors_table.values() if entry['addr'] is dest), None)
+        owner = next((gui for gui, networks in self.child_networks_table.items()
+                      if dest.net_addr in networks), None)
+        if scan is not self.neighbors_table.find_addr(dest) or owner != self.child_networks_table.owner(dest.net_addr):
+            raise AssertionError(f"Routing index of node {self.id} out of sync at time {self.now} for {dest}")
+
     ###################
     def send_network_request(self):
-        self.route_and_forward_package({
-            'dest': self.root_addr,
-            'type': 'NETWORK_REQUEST',
-            'source': self.addr,
-        })
+        self.route_and_forward_package(wsn.Packet(
+            dest=self.root_addr,
+            type='NETWORK_REQUEST',
+            source=self.addr,
+        ))
 
     ###################
     def send_network_reply(self, dest, addr):
-        self.route_and_forward_package({
-            'dest': dest,
-            'type': 'NETWORK_REPLY',
-            'source': self.addr,
-            'addr': addr,
-        })
+        self.route_and_forward_package(wsn.Packet(
+            dest=dest,
+            type='NETWORK_REPLY',
+            source=self.addr,
+            addr=addr,
+        ))
 
     ###################
     def send_network_update(self):
@@ -1234,51 +1667,111 @@ class SensorNode(wsn.Node):
             return
 
         dest = dest_entry.get('ch_addr') or dest_entry.get('source')
-        self.send({
-            'dest': dest,
-            'type': 'NETWORK_UPDATE',
-            'source': self.addr,
-            'gui': self.id,
-            'child_networks': child_networks,
-        })
+        self.send(wsn.Packet(
+            dest=dest,
+            type='NETWORK_UPDATE',
+            source=self.addr,
+            gui=self.id,
+            child_networks=child_networks,
+        ))
 
     ###################
     def send_sensor_data(self):
         """Send a random SENSOR_DATA packet to one of our neighbors."""
         if self.neighbors_table:
-            rand_key = random.choice(list(self.neighbors_table.keys()))
-            self.route_and_forward_package({
-                'dest': self.neighbors_table[rand_key]['addr'],
-                'type': 'SENSOR_DATA',
-                'source': self.addr,
-                'gui': self.id,
-                'sensor_value': random.uniform(0, 100),
-            })
+            rand_key = self.sim.random.choice(list(self.neighbors_table.keys()))
+            self.route_and_forward_package(wsn.Packet(
+                dest=self.neighbors_table[rand_key]['addr'],
+                type='SENSOR_DATA',
+                source=self.addr,
+                gui=self.id,
+                sensor_value=self.sim.random.uniform(0, 100),
+            ))
 
     ###################
     def send_table_share(self):
-        """Share neighbor table within MESH_HOP_N hops with 1-hop neighbors."""
+        """Share neighbor table within MESH_HOP_N hops with 1-hop neighbors.
+
+        With TABLE_SHARE_DELTA a neighbor only gets the entries changed since the version it
+        acknowledged, and every TABLE_SHARE_FULL_EVERY-th share is a full table again. A share
+        carries at most MAX_MESH_EXPORT entries, the closest hops first.
+        """
         # Example: Sends MESH_TABLE_SHARE packet to neighbors, enabling multi-hop mesh routing discovery
         # Skip if we don't have a valid source address
         if self.addr is None:
             return
 
-        mesh_neighbors = {}
-        for neighbor, packet in self.neighbors_table.items():
-            if packet['neighbor_hop_count'] <= MESH_HOP_N:
-                mesh_neighbors[neighbor] = packet
+        table = self.neighbors_table
+        mesh_neighbors = [(neighbor, packet, table.versions[neighbor])
+                          for neighbor, packet in table.items()
+                          if packet['neighbor_hop_count'] <= self.params.MESH_HOP_N]
+        self.share_count += 1
+        full_every = self.params.TABLE_SHARE_FULL_EVERY
+        full = not self.params.TABLE_SHARE_DELTA or (full_every and self.share_count % full_every == 0)
+        shares = {}  # base version -> (entries, version), neighbors that acknowledged the same get the same
 
-        for neighbor in self.neighbors_table.values():
+        for gui, neighbor in table.items():
             # Only send to 1-hop neighbors with valid source addresses
             if (neighbor['neighbor_hop_count'] == 1 and
                     neighbor.get('source') is not None):
-                self.send({
-                    'dest': neighbor['source'],
-                    'type': 'TABLE_SHARE',
-                    'source': self.addr,
-                    'gui': self.id,
-                    'neighbors': mesh_neighbors,
-                })
+                base = 0 if full else self.share_acked.get(gui, 0)
+                share = shares.get(base)
+                if share is None:
+                    share = shares[base] = self._table_share_entries(mesh_neighbors, base)
+                self.ctx.table_share_entries += len(share[0])
+                self.ctx.table_share_full_entries += len(mesh_neighbors)
+                self.send(wsn.Packet(
+                    dest=neighbor['source'],
+                    type='TABLE_SHARE',
+                    source=self.addr,
+                    gui=self.id,
+                    neighbors=share[0],
+                    base=base,
+                    version=share[1],
+                    ack=self.share_received.get(gui, 0),
+                ))
+
+    ###################
+    def _table_share_entries(self, mesh_neighbors, base):
+        """Entries of a TABLE_SHARE to a neighbor that acknowledged version base.
+
+           Args:
+               mesh_neighbors (List of Tuple): (gui, entry, version) of the shared entries, in table order.
+               base (int): Version the receiver has, 0 for the full table.
+
+           Returns:
+               Tuple: Entries by gui in table order, and the version the receiver has after them.
+        """
+        changed = [row for row in mesh_neighbors if row[2] > base]
+        version = self.neighbors_table.version
+        limit = self.params.MAX_MESH_EXPORT
+        if len(changed) > limit:
+            ranked = sorted(changed, key=lambda row: (row[1]['neighbor_hop_count'], row[2]))
+            # Versions up to the oldest entry left out are complete, the rest is sent again later
+            version = min(row[2] for row in ranked[limit:]) - 1
+            kept = {row[0] for row in ranked[:limit]}
+            changed = [row for row in changed if row[0] in kept]
+        return {gui: packet for gui, packet, _ in changed}, version
+
+    ###################
+    def receive_table_share(self, pck):
+        """Adds the unknown entries of a TABLE_SHARE as mesh neighbors and keeps the versions
+        acknowledged in both directions."""
+        sender = pck['gui']
+        self.share_acked[sender] = pck['ack']
+        if self.role != Roles.ROOT:
+            for neighbor, packet in pck['neighbors'].items():
+                if neighbor not in self.neighbors_table and neighbor != self.id:
+                    cpy = packet.copy()
+                    cpy['neighbor_hop_count'] += 1
+                    cpy['next_hop'] = pck['source']
+                    self.neighbors_table[neighbor] = cpy
+                    if cpy['neighbor_hop_count'] > self.params.MESH_HOP_N + 1:
+                        raise Exception("Something went wrong")
+        # A delta from above what we have (our table was reset since) is not acknowledged, so the
+        # sender goes back to the full table
+        if pck['base'] <= self.share_received.get(sender, 0):
+            self.share_received[sender] = pck['version']
 
     ###################
     def maybe_log_packet_delivery(self, pck):
@@ -1294,7 +1787,8 @@ class SensorNode(wsn.Node):
                 is_final_dest = True
 
         if is_final_dest and 'creation_time' in pck:
-            delay = self.now - pck['creation_time']
+            received_at = self.receive_time
+            delay = received_at - pck['creation_time']
             path = list(pck.get('path', []))
             if not path or path[-1] != self.id:
                 path.append(self.id)
@@ -1305,7 +1799,7 @@ class SensorNode(wsn.Node):
                 "source_gui": pck.get("source_gui"),
                 "dest_gui": pck.get("dest_gui"),
                 "created_at": pck.get("creation_time"),
-                "received_at": self.now,
+                "received_at": received_at,
                 "delay": delay,
                 "path": path,
             })
@@ -1314,27 +1808,19 @@ class SensorNode(wsn.Node):
     def on_receive(self, pck):
         """Handle all packet types."""
         # Example: Processes HEART_BEAT, JOIN_REQUEST, DATA packets; consumes RX energy; may trigger role changes
-        # Per-packet RX energy (8) - aligned with TX formula
-        N = ENERGY_PSDU_BYTES
-        I_A = RX_CURRENT / 1000.0
-        bits = 8 * (N + 6)
-        base_E = VOLTAGE * I_A * (bits / DATARATE)
-        rx_overhead = RX_TURNAROUND_ENERGY_J
-        dE = base_E + rx_overhead
-
-        # Track energy metrics
-        self.rx_energy_consumed += dE
-        self.rx_packet_count += 1
-
-        self.power -= dE
+        # Per-packet RX energy (8) - aligned with TX formula, precomputed by the energy model
         # Root node cannot die from energy depletion
-        if self.power <= MIN_ENERGY_J and self.id != ROOT_ID:
+        if self.ctx.energy.consume_rx(self) and self.id != self.ctx.root_id:
             self._die_of_energy()
             # Let this packet finish processing, future ones are dropped
 
         # Log delivery if this is the final destination
         self.maybe_log_packet_delivery(pck)
 
+        # Trickle: a node looking for a parent nearby is an inconsistency
+        if pck['type'] in ('PROBE', 'JOIN_REQUEST'):
+            self.reset_heart_beat()
+
         # ROOT / CLUSTER_HEAD
         if self.role in (Roles.ROOT, Roles.CLUSTER_HEAD):
             dest = pck.get('dest')
@@ -1356,21 +1842,21 @@ class SensorNode(wsn.Node):
                 self.update_neighbor(pck)
 
             if pck['type'] == 'PROBE':
-                self.send_heart_beat()
+                self.reply_to_probe()
 
             if pck['type'] == 'JOIN_REQUEST':
                 # Track join interest; expand power if many requests arrive in a burst.
                 self.record_join_request_and_maybe_expand()
                 # Ensure we can actually reach the requester; bump power just enough.
-                if self.id in NODE_POS and pck['gui'] in NODE_POS:
+                if self.id in self.ctx.node_pos and pck['gui'] in self.ctx.node_pos:
                     dist = math.hypot(
-                        NODE_POS[self.id][0] - NODE_POS[pck['gui']][0],
-                        NODE_POS[self.id][1] - NODE_POS[pck['gui']][1],
+                        self.ctx.node_pos[self.id][0] - self.ctx.node_pos[pck['gui']][0],
+                        self.ctx.node_pos[self.id][1] - self.ctx.node_pos[pck['gui']][1],
                     )
                     self.max_pending_join_distance = max(
                         self.max_pending_join_distance, dist)
                     if dist > getattr(self, "tx_range", 0):
-                        desired_power = _min_power_for_distance(dist)
+                        desired_power = _min_power_for_distance(self.params, dist)
                         if desired_power != getattr(self, "tx_power", None):
                             self.assign_tx_power(desired_power)
                             if self.role == Roles.CLUSTER_HEAD:
@@ -1399,7 +1885,7 @@ class SensorNode(wsn.Node):
                 self.send_network_reply(pck['source'], new_addr)
 
             if pck['type'] == 'JOIN_ACK':
-                self.members_table.append(pck['source'])
+                self.members_table[pck['source']] = pck['gui']
                 if self.role == Roles.CLUSTER_HEAD:
                     if self.ch_transfer_target is not None and self.transfer_engaged is None:
                         target_addr = None
@@ -1418,8 +1904,7 @@ class SensorNode(wsn.Node):
 
             if self.role == Roles.CLUSTER_HEAD and pck['type'] == 'CH_NOMINATION_ACK':
                 if getattr(self, 'awaiting_ack', False) and getattr(self, 'ch_nominee', None):
-                    if (pck['source'].net_addr == self.ch_nominee[0] and
-                            pck['source'].node_addr == self.ch_nominee[1]):
+                    if pck['source'] == self.ch_nominee:
                         self.log("CH nomination ACK received; becoming router")
                         self.become_router()
                         self.awaiting_ack = False
@@ -1430,15 +1915,8 @@ class SensorNode(wsn.Node):
                 if self.role != Roles.ROOT:
                     self.send_network_update()
 
-            if pck['type'] == 'TABLE_SHARE' and self.role != Roles.ROOT:
-                for neighbor, packet in pck['neighbors'].items():
-                    if neighbor not in self.neighbors_table and neighbor != self.id:
-                        cpy = packet.copy()
-                        cpy['neighbor_hop_count'] += 1
-                        cpy['next_hop'] = pck['source']
-                        self.neighbors_table[neighbor] = cpy
-                        if cpy['neighbor_hop_count'] > MESH_HOP_N + 1:
-                            raise Exception("Something went wrong")
+            if pck['type'] == 'TABLE_SHARE':
+                self.receive_table_share(pck)
 
             if pck['type'] == 'SENSOR_DATA':
                 pass
@@ -1464,7 +1942,7 @@ class SensorNode(wsn.Node):
                 self.update_neighbor(pck)
 
             if pck['type'] == 'PROBE':
-                self.send_heart_beat()
+                self.reply_to_probe()
 
             if pck['type'] == 'JOIN_REQUEST':
                 self.received_JR_guis.append(pck['gui'])
@@ -1472,27 +1950,19 @@ class SensorNode(wsn.Node):
                 self.send_network_request()
 
             if pck['type'] == 'TABLE_SHARE':
-                for neighbor, packet in pck['neighbors'].items():
-                    if neighbor not in self.neighbors_table and neighbor != self.id:
-                        cpy = packet.copy()
-                        cpy['neighbor_hop_count'] += 1
-                        cpy['next_hop'] = pck['source']
-                        self.neighbors_table[neighbor] = cpy
-                        if cpy['neighbor_hop_count'] > MESH_HOP_N + 1:
-                            raise Exception("Something went wrong")
+                self.receive_table_share(pck)
 
             if pck['type'] == 'NETWORK_REPLY':
                 self.set_role(Roles.CLUSTER_HEAD)
-                check_all_nodes_registered()
+                check_all_nodes_registered(self.ctx)
                 try:
-                    write_clusterhead_distances_csv(
-                        "clusterhead_distances.csv")
+                    write_clusterhead_distances_csv(self.ctx)
                 except Exception as e:
                     self.log(f"CH CSV export error: {e}")
                 self.set_ch_address(pck['addr'])
                 self.send_network_update()
                 self.node_available_dict = {
-                    i: None for i in range(1, NUM_OF_CHILDREN + 1)}
+                    i: None for i in range(1, self.params.NUM_OF_CHILDREN + 1)}
 
                 self.send_heart_beat()
                 for gui in self.received_JR_guis:
@@ -1534,17 +2004,10 @@ class SensorNode(wsn.Node):
                 self.update_neighbor(pck)
 
             if pck['type'] == 'PROBE':
-                self.send_heart_beat()
+                self.reply_to_probe()
 
             if pck['type'] == 'TABLE_SHARE':
-                for neighbor, packet in pck['neighbors'].items():
-                    if neighbor not in self.neighbors_table and neighbor != self.id:
-                        cpy = packet.copy()
-                        cpy['neighbor_hop_count'] += 1
-                        cpy['next_hop'] = pck['source']
-                        self.neighbors_table[neighbor] = cpy
-                        if cpy['neighbor_hop_count'] > MESH_HOP_N + 1:
-                            raise Exception("Something went wrong")
+                self.receive_table_share(pck)
 
             if pck['type'] == 'NETWORK_UPDATE':
                 self.child_networks_table[pck['gui']] = pck['child_networks']
@@ -1558,7 +2021,7 @@ class SensorNode(wsn.Node):
 
                 # Find an available ID from the TOP (254 down) to minimize collision with CH's low IDs
                 avail_node_id = None
-                for i in range(NUM_OF_CHILDREN, 0, -1):
+                for i in range(self.params.NUM_OF_CHILDREN, 0, -1):
                     if self.node_available_dict.get(i) is None:
                         avail_node_id = i
                         break
@@ -1595,13 +2058,13 @@ class SensorNode(wsn.Node):
                 sender_entry = self.neighbors_table.get(sender_gui)
                 sender_role = sender_entry.get(
                     'role') if sender_entry else None
-                if sender_role == Roles.ROUTER and not ALLOW_ROUTER_PARENT_FALLBACK:
+                if sender_role == Roles.ROUTER and not self.params.ALLOW_ROUTER_PARENT_FALLBACK:
                     return
 
                 joined_via_router = sender_role == Roles.ROUTER
 
                 self.set_address(pck['addr'])
-                self.parent_gui = pck['gui']
+                self.set_parent(pck['gui'])
                 self.root_addr = pck['root_addr']
                 self.hop_count = pck['hop_count']
                 # Adopt the cluster's TX power advertised by CH/ROOT
@@ -1613,11 +2076,12 @@ class SensorNode(wsn.Node):
                     self.assign_tx_power()
                 self.draw_parent()
                 self.kill_timer('TIMER_JOIN_REQUEST')
+                self.join_retries = 0
                 self.send_heart_beat()
-                self.set_timer('TIMER_HEART_BEAT', HEART_BEAT_INTERVAL)
+                self.start_heart_beat()
                 # Only schedule sensor data timer if enabled
-                if ENABLE_DATA_PACKETS:
-                    self.set_timer('TIMER_SENSOR', DATA_INTERVAL)
+                if self.params.ENABLE_DATA_PACKETS:
+                    self.set_timer('TIMER_SENSOR', self.params.DATA_INTERVAL)
                 self.send_join_ack(pck['source'])
 
                 if self.ch_addr is not None:
@@ -1626,8 +2090,8 @@ class SensorNode(wsn.Node):
                 else:
                     self.set_role(Roles.REGISTERED)
                     self.register()
-                    check_all_nodes_registered()
-                    self.set_timer('TIMER_TABLE_SHARE', TABLE_SHARE_INTERVAL)
+                    check_all_nodes_registered(self.ctx)
+                    self.set_timer('TIMER_TABLE_SHARE', self.params.TABLE_SHARE_INTERVAL)
                     # If we had to attach via a router, immediately request our own net and promote to CH when granted.
                     if joined_via_router and self.root_addr is not None:
                         self.send_network_request()
@@ -1638,7 +2102,7 @@ class SensorNode(wsn.Node):
                 self.set_ch_address(pck['addr'])
                 self.send_network_update()
                 self.node_available_dict = {
-                    i: None for i in range(1, NUM_OF_CHILDREN + 1)}
+                    i: None for i in range(1, self.params.NUM_OF_CHILDREN + 1)}
 
     ###################
     def on_timer_fired(self, name, *args, **kwargs):
@@ -1664,23 +2128,33 @@ class SensorNode(wsn.Node):
                     self.root_addr = self.addr
                     self.hop_count = 0
                     self.net_id_available_dict = {
-                        i: None for i in range(1, NUM_OF_CLUSTERS)}
+                        i: None for i in range(1, self.params.NUM_OF_CLUSTERS)}
                     self.node_available_dict = {
-                        i: None for i in range(1, NUM_OF_CHILDREN + 1)}
-                    self.set_timer('TIMER_HEART_BEAT', HEART_BEAT_INTERVAL)
+                        i: None for i in range(1, self.params.NUM_OF_CHILDREN + 1)}
+                    self.start_heart_beat()
                 else:
                     self.c_probe = 0
                     self.set_timer('TIMER_PROBE', 30)
 
         elif name == 'TIMER_HEART_BEAT':
-            self.send_heart_beat()
-            self.set_timer('TIMER_HEART_BEAT', HEART_BEAT_INTERVAL)
+            if not self.params.HEART_BEAT_TRICKLE:
+                self.send_heart_beat()
+                self.set_timer('TIMER_HEART_BEAT', self.params.HEART_BEAT_INTERVAL)
+            elif not self.params.HEART_BEAT_REDUNDANCY or self.hb_heard < self.params.HEART_BEAT_REDUNDANCY:
+                self.send_heart_beat()
+            else:
+                self.ctx.heart_beats_suppressed += 1
+
+        elif name == 'TIMER_HEART_BEAT_END':
+            # Trickle: neighbors stayed consistent for a whole interval, beat half as often
+            self.hb_interval = min(self.hb_interval * 2, self.params.HEART_BEAT_MAX_INTERVAL)
+            self._start_heart_beat_interval()
 
         elif name == 'TIMER_JOIN_REQUEST':
             # If we have no candidates, actively probe and retry sooner instead of idling.
             if len(self.candidate_parents_table) == 0:
                 self.send_probe()
-                self.set_timer('TIMER_JOIN_REQUEST', JOIN_REQUEST_INTERVAL / 2)
+                self.set_timer('TIMER_JOIN_REQUEST', self.join_retry_delay(self.params.JOIN_REQUEST_INTERVAL / 2))
             else:
                 self.select_and_join()
         elif name == 'TIMER_ROLE_OPTIMIZE':
@@ -1688,72 +2162,78 @@ class SensorNode(wsn.Node):
 
         elif name == 'TIMER_TABLE_SHARE':
             self.send_table_share()
-            self.set_timer('TIMER_TABLE_SHARE', TABLE_SHARE_INTERVAL)
+            self.set_timer('TIMER_TABLE_SHARE', self.params.TABLE_SHARE_INTERVAL)
+
+        elif name == 'TIMER_PROBE_REPLY':
+            if self.params.PROBE_REPLY_SUPPRESS and self.probe_reply_heard >= self.params.PROBE_REPLY_SUPPRESS:
+                # Enough equal or better parents answered the PROBE already
+                self.ctx.probe_replies_suppressed += 1
+            else:
+                self._send_probe_reply()
 
         elif name == 'TIMER_SENSOR':
             self.send_sensor_data()
-            self.set_timer('TIMER_SENSOR', DATA_INTERVAL)
+            self.set_timer('TIMER_SENSOR', self.params.DATA_INTERVAL)
 
         elif name == 'TIMER_EXPORT_CH_CSV':
             if self.role == Roles.ROOT:
-                write_clusterhead_distances_csv("clusterhead_distances.csv")
+                write_clusterhead_distances_csv(self.ctx)
                 self.set_timer('TIMER_EXPORT_CH_CSV',
-                               config.EXPORT_CH_CSV_INTERVAL)
+                               self.params.EXPORT_CH_CSV_INTERVAL)
 
         elif name == 'TIMER_EXPORT_NEIGHBOR_CSV':
             if self.role == Roles.ROOT:
-                write_neighbor_distances_csv("neighbor_distances.csv")
+                write_neighbor_distances_csv(self.ctx)
                 self.set_timer('TIMER_EXPORT_NEIGHBOR_CSV',
-                               config.EXPORT_NEIGHBOR_CSV_INTERVAL)
-
-
-ROOT_ID = random.randrange(config.SIM_NODE_COUNT)  # 0..count-1
+                               self.params.EXPORT_NEIGHBOR_CSV_INTERVAL)
 
 
-def write_node_distances_csv(path="node_distances.csv"):
+def write_node_distances_csv(ctx, path="node_distances.csv"):
     """Write pairwise node-to-node Euclidean distances as an edge list."""
-    ids = sorted(NODE_POS.keys())
-    with open(path, "w", newline="") as f:
+    node_pos = ctx.node_pos
+    ids = sorted(node_pos.keys())
+    with open(ctx.path(path), "w", newline="") as f:
         w = csv.writer(f)
         w.writerow(["source_id", "target_id", "distance"])
         for i, sid in enumerate(ids):
-            x1, y1 = NODE_POS[sid]
+            x1, y1 = node_pos[sid]
             for tid in ids[i + 1:]:
-                x2, y2 = NODE_POS[tid]
+                x2, y2 = node_pos[tid]
                 dist = math.hypot(x1 - x2, y1 - y2)
                 w.writerow([sid, tid, f"{dist:.6f}"])
 
 
-def write_node_distance_matrix_csv(path="node_distance_matrix.csv"):
-    ids = sorted(NODE_POS.keys())
-    with open(path, "w", newline="") as f:
+def write_node_distance_matrix_csv(ctx, path="node_distance_matrix.csv"):
+    node_pos = ctx.node_pos
+    ids = sorted(node_pos.keys())
+    with open(ctx.path(path), "w", newline="") as f:
         w = csv.writer(f)
         w.writerow(["node_id"] + ids)
         for sid in ids:
-            x1, y1 = NODE_POS[sid]
+            x1, y1 = node_pos[sid]
             row = [sid]
             for tid in ids:
-                x2, y2 = NODE_POS[tid]
+                x2, y2 = node_pos[tid]
                 dist = math.hypot(x1 - x2, y1 - y2)
                 row.append(f"{dist:.6f}")
             w.writerow(row)
 
 
-def write_clusterhead_distances_csv(path="clusterhead_distances.csv"):
+def write_clusterhead_distances_csv(ctx, path="clusterhead_distances.csv"):
     """Write pairwise distances between current cluster heads."""
     clusterheads = []
-    for node in sim.nodes:
-        if hasattr(node, "role") and node.role == Roles.CLUSTER_HEAD and node.id in NODE_POS:
-            x, y = NODE_POS[node.id]
+    for node in ctx.sim.nodes:
+        if hasattr(node, "role") and node.role == Roles.CLUSTER_HEAD and node.id in ctx.node_pos:
+            x, y = ctx.node_pos[node.id]
             clusterheads.append((node.id, x, y))
 
     if len(clusterheads) < 2:
-        with open(path, "w", newline="") as f:
+        with open(ctx.path(path), "w", newline="") as f:
             csv.writer(f).writerow(
                 ["clusterhead_1", "clusterhead_2", "distance"])
         return
 
-    with open(path, "w", newline="") as f:
+    with open(ctx.path(path), "w", newline="") as f:
         w = csv.writer(f)
         w.writerow(["clusterhead_1", "clusterhead_2", "distance"])
         for i, (id1, x1, y1) in enumerate(clusterheads):
@@ -1762,18 +2242,19 @@ def write_clusterhead_distances_csv(path="clusterhead_distances.csv"):
                 w.writerow([id1, id2, f"{dist:.6f}"])
 
 
-def write_neighbor_distances_csv(path="neighbor_distances.csv", dedupe_undirected=True):
+def write_neighbor_distances_csv(ctx, path="neighbor_distances.csv", dedupe_undirected=True):
     """
     Export neighbor distances per node.
-    Each row is (node -> neighbor) with distance from NODE_POS.
+    Each row is (node -> neighbor) with distance from ctx.node_pos.
     """
-    if not NODE_POS:
+    node_pos = ctx.node_pos
+    if not node_pos:
         raise RuntimeError(
-            "NODE_POS is missing; record positions during create_network().")
+            "node_pos is missing; record positions during create_network().")
 
     seen_pairs = set()
 
-    with open(path, "w", newline="") as f:
+    with open(ctx.path(path), "w", newline="") as f:
         w = csv.writer(f)
         w.writerow([
             "node_id",
@@ -1784,11 +2265,11 @@ def write_neighbor_distances_csv(path="neighbor_distances.csv", dedupe_undirecte
             "arrival_time",
         ])
 
-        for node in sim.nodes:
+        for node in ctx.sim.nodes:
             if not hasattr(node, "neighbors_table"):
                 continue
 
-            x1, y1 = NODE_POS.get(node.id, (None, None))
+            x1, y1 = node_pos.get(node.id, (None, None))
             if x1 is None:
                 continue
 
@@ -1799,7 +2280,7 @@ def write_neighbor_distances_csv(path="neighbor_distances.csv", dedupe_undirecte
                         continue
                     seen_pairs.add(key)
 
-                x2, y2 = NODE_POS.get(n_gui, (None, None))
+                x2, y2 = node_pos.get(n_gui, (None, None))
                 if x2 is None:
                     continue
 
@@ -1815,13 +2296,14 @@ def write_neighbor_distances_csv(path="neighbor_distances.csv", dedupe_undirecte
                 w.writerow([node.id, n_gui, f"{dist:.6f}", n_role, hop, at])
 
 
-def write_energy_metrics_csv(path="energy_metrics.csv"):
+def write_energy_metrics_csv(ctx, path="energy_metrics.csv"):
     """Export energy metrics for all nodes."""
-    if not ALL_NODES:
-        print(f"⚠️  Warning: ALL_NODES is empty, cannot write energy metrics")
+    if not ctx.nodes:
+        print(f"⚠️  Warning: no nodes, cannot write energy metrics")
         return
 
-    with open(path, "w", newline="") as f:
+    initial_energy = ctx.params.INITIAL_ENERGY_J
+    with open(ctx.path(path), "w", newline="") as f:
         w = csv.writer(f)
         w.writerow([
             "node_id",
@@ -1837,14 +2319,16 @@ def write_energy_metrics_csv(path="energy_metrics.csv"):
             "avg_energy_per_tx_packet_j",
             "avg_energy_per_rx_packet_j",
             "energy_efficiency_j_per_packet",
+            "idle_energy_consumed_j",
         ])
 
-        for node in ALL_NODES:
-            initial_energy = INITIAL_ENERGY_J
-            final_energy = getattr(node, "power", INITIAL_ENERGY_J)
+        for node in ctx.nodes:
+            final_energy = getattr(node, "power", initial_energy)
             tx_energy = getattr(node, "tx_energy_consumed", 0.0)
             rx_energy = getattr(node, "rx_energy_consumed", 0.0)
-            total_energy = tx_energy + rx_energy
+            idle_energy = getattr(node, "idle_energy_consumed", 0.0)
+            packet_energy = tx_energy + rx_energy
+            total_energy = packet_energy + idle_energy
             tx_count = getattr(node, "tx_packet_count", 0)
             rx_count = getattr(node, "rx_packet_count", 0)
             total_count = tx_count + rx_count
@@ -1852,7 +2336,7 @@ def write_energy_metrics_csv(path="energy_metrics.csv"):
             # Calculate averages
             avg_tx = tx_energy / tx_count if tx_count > 0 else 0.0
             avg_rx = rx_energy / rx_count if rx_count > 0 else 0.0
-            efficiency = total_energy / total_count if total_count > 0 else 0.0
+            efficiency = packet_energy / total_count if total_count > 0 else 0.0
 
             role_name = _role_name(getattr(node, "role", None))
 
@@ -1870,150 +2354,129 @@ def write_energy_metrics_csv(path="energy_metrics.csv"):
                 f"{avg_tx:.9f}",
                 f"{avg_rx:.9f}",
                 f"{efficiency:.9f}",
+                f"{idle_energy:.6f}",
             ])
 
 
 ###########################################################
-def create_network(node_class, number_of_nodes=100):
-    """Creates given number of nodes at random positions with random arrival times."""
+def create_network(ctx, node_class, number_of_nodes=100):
+    """Creates given number of nodes with the configured placement and random arrival times."""
     # Example: Creates 100 SensorNode instances in a grid pattern with random jitter
-    edge = math.ceil(math.sqrt(number_of_nodes))
-    for i in range(number_of_nodes):
-        x = i / edge
-        y = i % edge
-        px = 300 + config.SCALE * x * config.SIM_NODE_PLACING_CELL_SIZE + \
-            random.uniform(-1 * config.SIM_NODE_PLACING_CELL_SIZE / 3,
-                           config.SIM_NODE_PLACING_CELL_SIZE / 3)
-        py = 200 + config.SCALE * y * config.SIM_NODE_PLACING_CELL_SIZE + \
-            random.uniform(-1 * config.SIM_NODE_PLACING_CELL_SIZE / 3,
-                           config.SIM_NODE_PLACING_CELL_SIZE / 3)
-        node = sim.add_node(node_class, (px, py))
-        NODE_POS[node.id] = (px, py)
-        default_range = TX_RANGES.get(
-            NODE_DEFAULT_TX_POWER, config.NODE_TX_RANGE)
-        node.tx_range = default_range * config.SCALE
+    params, sim = ctx.params, ctx.sim
+    method = getattr(params, "SIM_NODE_PLACEMENT", "GRID_JITTER")
+    seed = sim.random.getrandbits(32)
+    if method == "RANDOM_UNIFORM":
+        positions = placement.random_uniform(
+            number_of_nodes, params.SIM_TERRAIN_SIZE, rng=seed)
+    elif method == "POISSON_DISK":
+        positions = placement.poisson_disk(
+            number_of_nodes, params.SIM_TERRAIN_SIZE, params.SIM_NODE_MIN_DISTANCE, rng=seed)
+    else:
+        positions = placement.grid_jitter(
+            number_of_nodes, params.SIM_NODE_PLACING_CELL_SIZE,
+            origin=(300, 200), scale=params.SCALE, rng=seed)
+
+    default_range = params.TX_RANGES.get(
+        params.NODE_DEFAULT_TX_POWER, params.NODE_TX_RANGE)
+    for node in sim.add_nodes(node_class, positions):
+        ctx.node_pos[node.id] = node.pos
+        node.tx_range = default_range * params.SCALE
         node.logging = True
-        node.arrival = random.uniform(0, config.NODE_ARRIVAL_MAX)
-        if node.id == ROOT_ID:
+        node.arrival = sim.random.uniform(0, params.NODE_ARRIVAL_MAX)
+        if node.id == ctx.root_id:
             node.arrival = 0.1
 
 
-sim = wsn.Simulator(
-    duration=config.SIM_DURATION,
-    timescale=config.SIM_TIME_SCALE,
-    visual=config.SIM_VISUALIZATION,
-    terrain_size=config.SIM_TERRAIN_SIZE,
-    title=config.SIM_TITLE,
-)
-
-# Create network and pre-compute static distance CSVs
-create_network(SensorNode, config.SIM_NODE_COUNT)
-write_node_distances_csv("node_distances.csv")
-write_node_distance_matrix_csv("node_distance_matrix.csv")
-
-# Initialize all CSV files (clear and write headers) before simulation
-init_csv_files()
-
 # --- Failure & Recovery Simulation ---
-RECOVERY_START_TIME = None
-RECOVERY_DURATION = None
-MAX_ORPHAN_COUNT = 0
-
-
-def log_failure_event(time, node_id, event_type):
+def log_failure_event(ctx, time, node_id, event_type):
     """Log failure/recovery events to CSV and track network lifetime (8)."""
-    global RECOVERY_DURATION, MAX_ORPHAN_COUNT, NETWORK_DEATH_TIME
+    orphan_count = ctx.orphan_count()
 
-    orphan_count = len([n for n in ALL_NODES
-                       if getattr(n, "role", None) not in
-                       {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}])
-
-    if orphan_count > MAX_ORPHAN_COUNT:
-        MAX_ORPHAN_COUNT = orphan_count
+    if orphan_count > ctx.max_orphan_count:
+        ctx.max_orphan_count = orphan_count
 
     # Check if recovery is complete (0 orphans)
-    if RECOVERY_START_TIME is not None and RECOVERY_DURATION is None:
+    if ctx.recovery_start_time is not None and ctx.recovery_duration is None:
         if orphan_count == 0:
-            RECOVERY_DURATION = time - RECOVERY_START_TIME
+            ctx.recovery_duration = time - ctx.recovery_start_time
             print(
-                f"✅ RECOVERY COMPLETE at time {time:.2f}. Duration: {RECOVERY_DURATION:.2f} sim seconds")
+                f"✅ RECOVERY COMPLETE at time {time:.2f}. Duration: {ctx.recovery_duration:.2f} sim seconds")
 
     # Network lifetime tracking (8): check if network death threshold is reached
-    if NETWORK_DEATH_TIME is None:
-        dead_nodes = [n for n in ALL_NODES if getattr(n, "failed", False)]
-        total_nodes = len(ALL_NODES)
+    if ctx.network_death_time is None:
+        dead_count = ctx.dead_count
+        total_nodes = len(ctx.nodes)
         if total_nodes > 0:
-            death_ratio = len(dead_nodes) / total_nodes
+            death_ratio = dead_count / total_nodes
             # Check if root is dead or threshold percentage is reached
-            root_dead = any(n.id == ROOT_ID and n.failed for n in ALL_NODES)
-            if root_dead or death_ratio >= NETWORK_DEATH_THRESHOLD:
-                NETWORK_DEATH_TIME = time
+            if ctx.root_failed() or death_ratio >= ctx.params.NETWORK_DEATH_THRESHOLD:
+                ctx.network_death_time = time
                 print(
-                    f"\n💀 NETWORK DEATH at time {time:.2f} ({len(dead_nodes)}/{total_nodes} nodes dead, {death_ratio*100:.1f}%)")
+                    f"\n💀 NETWORK DEATH at time {time:.2f} ({dead_count}/{total_nodes} nodes dead, {death_ratio*100:.1f}%)")
 
-    with open("failures.csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([time, node_id, event_type, orphan_count])
+    ctx.sim.trace.write("failures.csv", [time, node_id, event_type, orphan_count])
 
 
-def kill_random_node():
-    """Kill random non-root node(s) based on NUM_NODES_TO_KILL config."""
-    num_to_kill = getattr(config, "NUM_NODES_TO_KILL", 1)
-    candidates = [n for n in ALL_NODES if n.id != ROOT_ID and not n.failed]
+def kill_random_node(ctx):
+    """Kill random non-root node(s) based on NUM_NODES_TO_KILL config, or the FAILURE_NODE_IDS ones."""
+    sim = ctx.sim
+    num_to_kill = getattr(ctx.params, "NUM_NODES_TO_KILL", 1)
+    candidates = [n for n in ctx.nodes if n.id != ctx.root_id and not n.failed]
 
     if not candidates:
         print(f"\n⚠️  No nodes available to kill at time {sim.now}")
         return
 
-    # Limit number to kill to available candidates
-    num_to_kill = min(num_to_kill, len(candidates))
+    node_ids = getattr(ctx.params, "FAILURE_NODE_IDS", None)
+    if node_ids is not None:
+        # Chosen victims, e.g. per branch of a forked failure study
+        wanted = set(node_ids)
+        victims = [n for n in candidates if n.id in wanted]
+    else:
+        # Limit number to kill to available candidates
+        num_to_kill = min(num_to_kill, len(candidates))
 
-    # Randomly select nodes to kill
-    victims = random.sample(candidates, num_to_kill)
+        # Randomly select nodes to kill
+        victims = sim.random.sample(candidates, num_to_kill)
 
     print(
         f"\n💀 KILLING {len(victims)} node(s) at time {sim.now}: {[v.id for v in victims]}")
 
     for victim in victims:
-        victim.failed = True
+        victim.set_failed(True)
         victim.sleep()
         victim.kill_all_timers()
         victim.scene.nodecolor(victim.id, 0.3, 0.3, 0.3)  # Grey
 
         # Log the event
-        log_failure_event(sim.now, victim.id, "KILLED")
+        log_failure_event(ctx, sim.now, victim.id, "KILLED")
 
         # Schedule recovery for each victim
-        recovery_delay = config.RECOVERY_TIME - config.FAILURE_TIME
-        sim.delayed_exec(recovery_delay, recover_node, victim)
+        recovery_delay = ctx.params.RECOVERY_TIME - ctx.params.FAILURE_TIME
+        sim.delayed_exec(recovery_delay, recover_node, ctx, victim)
 
 
-def recover_node(node):
+def recover_node(ctx, node):
     """Recover a previously killed node."""
-    global RECOVERY_START_TIME
+    sim = ctx.sim
     print(f"\n🚑 RECOVERING Node #{node.id} at time {sim.now}")
-    node.failed = False
+    node.set_failed(False)
     node.wake_up()  # CRITICAL: Must wake up to receive packets!
-    RECOVERY_START_TIME = sim.now
+    ctx.recovery_start_time = sim.now
     node.scene.nodecolor(node.id, 1, 1, 0)  # Yellow (Unregistered)
     node.become_unregistered()
 
     # Log the event
-    log_failure_event(sim.now, node.id, "RECOVERED")
-
+    log_failure_event(ctx, sim.now, node.id, "RECOVERED")
 
-# Initialize failures log
-with open("failures.csv", "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["time", "node_id", "event_type", "orphan_count"])
 
-
-def sample_power_levels():
+def sample_power_levels(ctx):
     """Sample all nodes' power levels and log to CSV."""
+    sim = ctx.sim
     alive_powers = []
     dead_count = 0
 
-    for node in ALL_NODES:
+    for node in ctx.nodes:
         power = getattr(node, "power", None)
         failed = getattr(node, "failed", False)
 
@@ -2034,218 +2497,170 @@ def sample_power_levels():
     alive_count = len(alive_powers)
 
     # Write to CSV
-    with open("power_over_time.csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            sim.now,
-            f"{avg_power:.6f}",
-            f"{min_power:.6f}",
-            f"{max_power:.6f}",
-            alive_count,
-            dead_count
-        ])
+    sim.trace.write("power_over_time.csv", [
+        sim.now,
+        f"{avg_power:.6f}",
+        f"{min_power:.6f}",
+        f"{max_power:.6f}",
+        alive_count,
+        dead_count
+    ])
 
     # Schedule next sample
-    if sim.now + config.POWER_SAMPLING_INTERVAL < sim.duration:
-        sim.delayed_exec(config.POWER_SAMPLING_INTERVAL, sample_power_levels)
-
-
-# Schedule the failure event
-sim.delayed_exec(config.FAILURE_TIME, kill_random_node)
-
-# Schedule initial power sampling (start with small delay, then every interval)
-# Use 0.1 instead of 0 because SimPy requires delay > 0
-sim.delayed_exec(0.1, sample_power_levels)
-
-# Run simulation
-start_time = time.time()
-sim.run()
-end_time = time.time()
-runtime = end_time - start_time
-
-# Export logged packets
-log_all_packets(sim.packet_log)
-
-# Check convergence and log final topology
-converged = log_all_nodes_registered()
-
-print("\n" + "=" * 60)
-print("Simulation Finished Finally!!!!")
-print("=" * 60)
-print(f"⏱️  Runtime: {runtime:.2f} seconds ({runtime/60:.2f} minutes)")
-print("=" * 60)
-
-# Prominent convergence status
-print("\n" + "=" * 60)
-if converged:
-    # should be impossible for this when energy enabled
-    print("✅✅✅  Network Convergence stats: SUCCESS  ✅✅✅")
-    print(f"   All {len(ALL_NODES)} nodes are registered!")
-else:
-    print(" Network Convergence stats: ")
-    unregistered = [n.id for n in ALL_NODES
-                    if getattr(n, "role", None) not in
-                    {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}]
-    print(f"   {len(unregistered)} nodes are unregistered by end of sim:")
-    print(
-        f"   Node IDs: {unregistered[:20]}{'...' if len(unregistered) > 20 else ''}")
-print("=" * 60)
-
-# --- Network Statistics ---
-print("\n--- Network Statistics ---")
-
-# Join time statistics
-if sim.join_times:
-    avg_join = sum(sim.join_times) / len(sim.join_times)
-    min_join = min(sim.join_times)
-    max_join = max(sim.join_times)
-    print(f"Join Times: {len(sim.join_times)} nodes joined")
-    print(f"  Average: {avg_join:.4f} sim seconds")
-    print(f"  Min: {min_join:.4f} sim seconds")
-    print(f"  Max: {max_join:.4f} sim seconds")
-else:
-    print("No join times recorded.")
-
-# Packet delivery statistics
-if sim.packet_log:
-    total_packets = len(sim.packet_log)
-    avg_delay = sum(p['delay'] for p in sim.packet_log) / total_packets
-    min_delay = min(p['delay'] for p in sim.packet_log)
-    max_delay = max(p['delay'] for p in sim.packet_log)
+    interval = ctx.params.POWER_SAMPLING_INTERVAL
+    if sim.now + interval < sim.duration:
+        sim.delayed_exec(interval, sample_power_levels, ctx)
 
-    type_counts = {}
-    for p in sim.packet_log:
-        ptype = p['type']
-        type_counts[ptype] = type_counts.get(ptype, 0) + 1
-
-    print(f"\nPacket Delivery: {total_packets} packets delivered")
-    print(f"  Average delay: {avg_delay:.4f} sim seconds")
-    print(f"  Min delay: {min_delay:.4f} sim seconds")
-    print(f"  Max delay: {max_delay:.4f} sim seconds")
-    print(f"  By type: {type_counts}")
-else:
-    print("\nNo packets delivered (packet log is empty).")
-
-# Packet Loss Statistics
-print("\n--- Packet Loss Statistics ---")
-attempts = getattr(sim, "total_tx_attempts", 0)
-dropped = getattr(sim, "total_tx_dropped", 0)
-if attempts > 0:
-    loss_pct = dropped / attempts * 100.0
-    configured_pct = config.PACKET_LOSS_RATIO * 100.0
-    print(f"  TX attempts: {attempts}")
-    print(f"  Dropped by channel: {dropped}")
-    print(f"  Realized loss: {loss_pct:.2f}% "
-          f"(configured: {configured_pct:.2f}%)")
-
-    # Save packet loss stats for graph generation
-    try:
-        with open("packet_loss_stats.csv", "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(
-                ["configured_loss_pct", "realized_loss_pct", "attempts", "dropped"])
-            writer.writerow([configured_pct, loss_pct, attempts, dropped])
-    except Exception:
-        pass
-else:
-    print("  No transmissions recorded (no attempts).")
-
-# Failure Recovery Statistics
-print("\n--- Failure Recovery Statistics ---")
-# Final check for recovery completion if recovery started but wasn't marked complete
-if RECOVERY_START_TIME is not None and RECOVERY_DURATION is None:
-    orphan_count = len([n for n in ALL_NODES
-                       if getattr(n, "role", None) not in
-                       {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}])
-    if orphan_count == 0:
-        RECOVERY_DURATION = sim.now - RECOVERY_START_TIME
-        print(f"✅ RECOVERY COMPLETE (detected at end of simulation)")
-    else:
-        print(
-            f"⚠️  Recovery started but not completed: {orphan_count} nodes still unregistered")
 
-if RECOVERY_DURATION is not None:
-    print(f"⏱️  Time to Recover: {RECOVERY_DURATION:.2f} sim seconds")
-elif RECOVERY_START_TIME is not None:
-    print(
-        f"⏱️  Time to Recover: (recovery started at {RECOVERY_START_TIME:.2f}, ended at {sim.now:.2f})")
-    orphan_count = len([n for n in ALL_NODES
-                       if getattr(n, "role", None) not in
-                       {Roles.REGISTERED, Roles.CLUSTER_HEAD, Roles.ROOT, Roles.ROUTER}])
-    print(f"   {orphan_count} nodes still unregistered at end of simulation")
-else:
-    print("⏱️  Time to Recover: N/A (Recovery not started - no node was killed/recovered)")
-print(f"⚠️  Max Orphan Count: {MAX_ORPHAN_COUNT}")
-
-# Network Lifetime Statistics (8) - Maximize Network Life Metric
-print("\n" + "=" * 60)
-print("--- Network Lifetime (Maximize Network Life) ---")
-print("=" * 60)
-if NETWORK_DEATH_TIME is not None:
-    dead_nodes = [n for n in ALL_NODES if getattr(n, "failed", False)]
-    death_ratio = len(dead_nodes) / len(ALL_NODES) if ALL_NODES else 0
-    print(f"⏱️  NETWORK LIFETIME: {NETWORK_DEATH_TIME:.2f} sim seconds")
-    print(f"   (Time until network death threshold reached)")
-    print(
-        f"   💀 Death threshold: {NETWORK_DEATH_THRESHOLD*100:.0f}% nodes dead OR root dead")
-    print(
-        f"   Dead nodes at death time: {len(dead_nodes)}/{len(ALL_NODES)} ({death_ratio*100:.1f}%)")
-    print(f"   Simulation duration: {config.SIM_DURATION} sim seconds")
-    if NETWORK_DEATH_TIME < config.SIM_DURATION:
-        print(
-            f"   ✅ Network survived {NETWORK_DEATH_TIME/config.SIM_DURATION*100:.1f}% of simulation duration")
-    else:
-        print(f"   ⚠️  Network died at end of simulation")
-else:
-    dead_nodes = [n for n in ALL_NODES if getattr(n, "failed", False)]
-    if dead_nodes:
-        death_ratio = len(dead_nodes) / len(ALL_NODES) if ALL_NODES else 0
-        print(
-            f"✅ Network lifetime: FULL SIMULATION DURATION ({config.SIM_DURATION} sim seconds)")
-        print(f"   Network death threshold NOT reached during simulation")
-        print(
-            f"   Dead nodes at end: {len(dead_nodes)}/{len(ALL_NODES)} ({death_ratio*100:.1f}%)")
-        print(
-            f"   ⚠️  Note: {death_ratio*100:.1f}% nodes dead, but 💀 threshold ({NETWORK_DEATH_THRESHOLD*100:.0f}%) not reached")
-    else:
-        print(
-            f"✅ Network lifetime: FULL SIMULATION DURATION ({config.SIM_DURATION} sim seconds)")
-        print(f"   All nodes survived the entire simulation!")
-        print(f"   Perfect network lifetime: 100% survival rate")
-print("=" * 60)
-
-# Energy Metrics Statistics (8)
-print("\n--- Energy Metrics ---")
-try:
-    # Calculate aggregate statistics
-    total_tx_energy = sum(getattr(n, "tx_energy_consumed", 0.0)
-                          for n in ALL_NODES)
-    total_rx_energy = sum(getattr(n, "rx_energy_consumed", 0.0)
-                          for n in ALL_NODES)
-    total_energy_consumed = total_tx_energy + total_rx_energy
-    total_tx_packets = sum(getattr(n, "tx_packet_count", 0) for n in ALL_NODES)
-    total_rx_packets = sum(getattr(n, "rx_packet_count", 0) for n in ALL_NODES)
-    total_packets = total_tx_packets + total_rx_packets
-
-    # Per-node averages
-    alive_nodes = [n for n in ALL_NODES if not getattr(n, "failed", False)]
+###########################################################
+class RunResult:
+    """Metrics of a finished run, the numbers print_report() shows. Times are in sim seconds,
+    energies in J. Statistics of empty samples are None.
+
+       Attributes:
+           overrides (Dict): Config overrides of the run.
+           output_dir (string): Directory of the CSV files of the run.
+           runtime (double): Wall time of sim.run() in seconds.
+           event_count (int): Number of scheduled simulation events.
+           sim_time (double): Simulation time at the end of the run.
+           duration (double): Configured SIM_DURATION.
+           node_count (int): Number of nodes.
+           root_id (int): Id of the root node.
+           converged (bool): True if all nodes are registered / CH / ROOT / ROUTER at the end.
+           unregistered (List of int): Ids of nodes that are not.
+           join_count, join_avg, join_min, join_max: First-registration join time statistics.
+           packets_delivered (int): Number of logged packet deliveries.
+           delay_avg, delay_min, delay_max: Delivery delay statistics.
+           delivered_by_type (Dict of string to int): Deliveries per packet type.
+           tx_attempts (int): Transmission attempts.
+           tx_dropped (int): Transmissions dropped by the channel.
+           configured_loss_pct (double): PACKET_LOSS_RATIO in percent.
+           realized_loss_pct (double): Dropped / attempts in percent.
+           table_share_bytes (int): Neighbor entry bytes sent in TABLE_SHARE packets.
+           table_share_full_bytes (int): Bytes the same packets would have had as full tables.
+           heart_beats_sent (int): HEART_BEAT packets sent.
+           heart_beats_suppressed (int): HEART_BEATs suppressed by Trickle.
+           probe_replies (int): HEART_BEATs sent as PROBE replies.
+           probe_replies_suppressed (int): PROBE replies cancelled by overheard equal or better ones.
+           probe_replies_limited (int): PROBEs left unanswered by the reply rate limit.
+           recovery_start_time (double): Time of the last node recovery.
+           recovery_duration (double): Time from recovery start to no orphans.
+           recovery_at_end (bool): True if recovery completion was only detected at the end.
+           orphans_at_end (int): Unregistered nodes at the end.
+           max_orphan_count (int): Max unregistered nodes seen at failure events.
+           network_death_time (double): Time the network death threshold was reached.
+           network_death_threshold (double): Configured NETWORK_DEATH_THRESHOLD.
+           dead_nodes (int): Failed nodes at the end.
+           total_tx_energy, total_rx_energy (double): Network TX and RX energy.
+           total_idle_energy (double): Network idle and sleep energy.
+           total_tx_packets, total_rx_packets (int): Network TX and RX packet counts.
+           avg_remaining_energy, avg_consumed_energy (double): Per alive node averages.
+           energy_by_role (Dict of string to Dict): count, total_tx, total_rx, total_remaining per role name.
+           role_counts (Dict of string to int): Final number of nodes per role name.
+           profile (List of Dicts): Profiler.rows() of the run if SIM_PROFILE is set, else None.
+    """
+
+    ############################
+    def __init__(self, **metrics):
+        self.__dict__.update(metrics)
+
+    ############################
+    def to_dict(self):
+        """Returns metrics as a dict."""
+        return dict(self.__dict__)
+
+
+###########################################################
+def _collect_result(ctx, runtime, converged):
+    """Computes the RunResult of a finished run."""
+    sim, nodes = ctx.sim, ctx.nodes
+    m = {
+        "overrides": dict(ctx.params.overrides),
+        "output_dir": ctx.output_dir,
+        "runtime": runtime,
+        "event_count": sim.event_count,
+        "sim_time": sim.now,
+        "duration": ctx.params.SIM_DURATION,
+        "node_count": len(nodes),
+        "root_id": ctx.root_id,
+        "converged": converged,
+        "unregistered": [n.id for n in nodes if getattr(n, "role", None) not in REGISTERED_ROLES],
+        "profile": None,
+    }
+
+    # Join time statistics
+    joins = sim.join_times
+    m["join_count"] = len(joins)
+    m["join_avg"] = sum(joins) / len(joins) if joins else None
+    m["join_min"] = min(joins) if joins else None
+    m["join_max"] = max(joins) if joins else None
+
+    # Packet delivery statistics
+    log = sim.packet_log
+    m["packets_delivered"] = len(log)
+    m["delay_avg"] = sum(p['delay'] for p in log) / len(log) if log else None
+    m["delay_min"] = min(p['delay'] for p in log) if log else None
+    m["delay_max"] = max(p['delay'] for p in log) if log else None
+    type_counts = {}
+    for p in log:
+        type_counts[p['type']] = type_counts.get(p['type'], 0) + 1
+    m["delivered_by_type"] = type_counts
+
+    # Packet loss statistics
+    attempts = getattr(sim, "total_tx_attempts", 0)
+    dropped = getattr(sim, "total_tx_dropped", 0)
+    m["tx_attempts"] = attempts
+    m["tx_dropped"] = dropped
+    m["configured_loss_pct"] = ctx.params.PACKET_LOSS_RATIO * 100.0
+    m["realized_loss_pct"] = dropped / attempts * 100.0 if attempts > 0 else None
+
+    # TABLE_SHARE exchange, bytes of the neighbor entries only
+    m["table_share_bytes"] = ctx.table_share_entries * ctx.params.TABLE_SHARE_ENTRY_BYTES
+    m["table_share_full_bytes"] = ctx.table_share_full_entries * ctx.params.TABLE_SHARE_ENTRY_BYTES
+    m["heart_beats_sent"] = ctx.heart_beats_sent
+    m["heart_beats_suppressed"] = ctx.heart_beats_suppressed
+    m["probe_replies"] = ctx.probe_replies
+    m["probe_replies_suppressed"] = ctx.probe_replies_suppressed
+    m["probe_replies_limited"] = ctx.probe_replies_limited
+
+    # Failure recovery statistics, final check if recovery started but wasn't marked complete
+    orphan_count = len(m["unregistered"])
+    m["recovery_at_end"] = False
+    if ctx.recovery_start_time is not None and ctx.recovery_duration is None and orphan_count == 0:
+        ctx.recovery_duration = sim.now - ctx.recovery_start_time
+        m["recovery_at_end"] = True
+    m["recovery_start_time"] = ctx.recovery_start_time
+    m["recovery_duration"] = ctx.recovery_duration
+    m["orphans_at_end"] = orphan_count
+    m["max_orphan_count"] = ctx.max_orphan_count
+
+    # Network lifetime (8)
+    m["network_death_time"] = ctx.network_death_time
+    m["network_death_threshold"] = ctx.params.NETWORK_DEATH_THRESHOLD
+    m["dead_nodes"] = len([n for n in nodes if getattr(n, "failed", False)])
+
+    # Energy metrics (8)
+    m["total_tx_energy"] = sum(getattr(n, "tx_energy_consumed", 0.0) for n in nodes)
+    m["total_rx_energy"] = sum(getattr(n, "rx_energy_consumed", 0.0) for n in nodes)
+    m["total_idle_energy"] = sum(getattr(n, "idle_energy_consumed", 0.0) for n in nodes)
+    m["total_tx_packets"] = sum(getattr(n, "tx_packet_count", 0) for n in nodes)
+    m["total_rx_packets"] = sum(getattr(n, "rx_packet_count", 0) for n in nodes)
+    alive_nodes = [n for n in nodes if not getattr(n, "failed", False)]
     if alive_nodes:
-        avg_remaining_energy = sum(getattr(n, "power", 0.0)
-                                   for n in alive_nodes) / len(alive_nodes)
-        avg_consumed_energy = sum(
+        m["avg_remaining_energy"] = sum(getattr(n, "power", 0.0)
+                                        for n in alive_nodes) / len(alive_nodes)
+        m["avg_consumed_energy"] = sum(
             getattr(n, "tx_energy_consumed", 0.0) +
-            getattr(n, "rx_energy_consumed", 0.0)
+            getattr(n, "rx_energy_consumed", 0.0) +
+            getattr(n, "idle_energy_consumed", 0.0)
             for n in alive_nodes
         ) / len(alive_nodes)
     else:
-        avg_remaining_energy = 0.0
-        avg_consumed_energy = 0.0
-
-    # Energy by role
+        m["avg_remaining_energy"] = 0.0
+        m["avg_consumed_energy"] = 0.0
     energy_by_role = {}
-    for node in ALL_NODES:
-        role = getattr(node, "role", None)
-        role_name = _role_name(role)
+    for node in nodes:
+        role_name = _role_name(getattr(node, "role", None))
         if role_name not in energy_by_role:
             energy_by_role[role_name] = {
                 "count": 0,
@@ -2260,85 +2675,387 @@ try:
             node, "rx_energy_consumed", 0.0)
         energy_by_role[role_name]["total_remaining"] += getattr(
             node, "power", 0.0)
+    m["energy_by_role"] = energy_by_role
 
-    print(f"📊 Total Network Energy Consumption: {total_energy_consumed:.6f} J")
-    print(
-        f"   TX Energy: {total_tx_energy:.6f} J ({total_tx_energy/total_energy_consumed*100:.1f}%)")
-    print(
-        f"   RX Energy: {total_rx_energy:.6f} J ({total_rx_energy/total_energy_consumed*100:.1f}%)")
-    print(f"\n📦 Total Packets: {total_packets}")
-    print(f"   TX Packets: {total_tx_packets}")
-    print(f"   RX Packets: {total_rx_packets}")
-    print(f"\n⚡ Average Energy per Packet: {total_energy_consumed/total_packets:.9f} J" if total_packets >
-          0 else "\n⚡ Average Energy per Packet: N/A (no packets)")
-    print(f"   Average TX Energy per Packet: {total_tx_energy/total_tx_packets:.9f} J" if total_tx_packets >
-          0 else "   Average TX Energy per Packet: N/A")
-    print(f"   Average RX Energy per Packet: {total_rx_energy/total_rx_packets:.9f} J" if total_rx_packets >
-          0 else "   Average RX Energy per Packet: N/A")
-    print(
-        f"\n🔋 Average Remaining Energy (alive nodes): {avg_remaining_energy:.6f} J")
-    print(
-        f"🔋 Average Consumed Energy (alive nodes): {avg_consumed_energy:.6f} J")
-
-    if energy_by_role:
-        print(f"\n📈 Energy Consumption by Role:")
-        for role_name, stats in sorted(energy_by_role.items()):
-            count = stats["count"]
-            avg_tx = stats["total_tx"] / count if count > 0 else 0.0
-            avg_rx = stats["total_rx"] / count if count > 0 else 0.0
-            avg_remaining = stats["total_remaining"] / \
-                count if count > 0 else 0.0
-            print(f"   {role_name}: {count} nodes")
-            print(f"      Avg TX Energy: {avg_tx:.6f} J")
-            print(f"      Avg RX Energy: {avg_rx:.6f} J")
-            print(f"      Avg Remaining: {avg_remaining:.6f} J")
-
-    # Export to CSV
+    m["role_counts"] = {role.name: count for role, count in ctx.role_counts.items()}
+    return RunResult(**m)
+
+
+###########################################################
+def setup_run(params=None, output_dir="."):
+    """Creates the simulator, nodes, trace files and scheduled failure and sampling events of a run.
+
+       Args:
+           params (Dict or RunParams): Config overrides (config.py names to values). None runs config.py as is.
+           output_dir (string): Directory for the CSV files of the run. It is created if missing.
+
+       Returns:
+           RunContext: State of the run, ready for ctx.sim.run().
+    """
+    if not isinstance(params, RunParams):
+        params = RunParams(params)
+    os.makedirs(output_dir, exist_ok=True)
+    ctx = RunContext(params, output_dir)
+
+    sim = wsn.Simulator(
+        duration=params.SIM_DURATION,
+        timescale=params.SIM_TIME_SCALE,
+        seed=params.SEED,
+        visual=params.SIM_VISUALIZATION,
+        terrain_size=params.SIM_TERRAIN_SIZE,
+        title=params.SIM_TITLE,
+        params=params,
+        output_dir=output_dir,
+    )
+    sim.ctx = ctx
+    ctx.sim = sim
+    ctx.energy = energy.EnergyModel(params, sim)
+    # Same random stream as before: root id, placement seed, arrivals, then the protocol
+    ctx.root_id = sim.random.randrange(params.SIM_NODE_COUNT)  # 0..count-1
+
+    # Create network and pre-compute static distance CSVs
+    create_network(ctx, SensorNode, params.SIM_NODE_COUNT)
+    # All-pairs distance CSVs grow with N^2, skip them for large networks
+    if params.SIM_NODE_COUNT <= getattr(params, "DISTANCE_CSV_MAX_NODES", 2000):
+        write_node_distances_csv(ctx)
+        write_node_distance_matrix_csv(ctx)
+
+    # Initialize all CSV files (clear and write headers) before simulation
+    init_csv_files(ctx)
+    sim.trace.open("failures.csv", ["time", "node_id", "event_type", "orphan_count"])
+
+    # Schedule the failure event
+    sim.delayed_exec(params.FAILURE_TIME, kill_random_node, ctx)
+
+    # Schedule initial power sampling (start with small delay, then every interval)
+    # Use 0.1 instead of 0 because SimPy requires delay > 0
+    sim.delayed_exec(0.1, sample_power_levels, ctx)
+    return ctx
+
+
+###########################################################
+def finish_run(ctx, runtime):
+    """Writes the end of run files of a finished run, closes its trace files and collects its metrics.
+
+       Args:
+           ctx (RunContext): State of the run.
+           runtime (double): Wall time of sim.run() in seconds.
+
+       Returns:
+           RunResult: Metrics of the run.
+    """
+    sim, params = ctx.sim, ctx.params
+    prof = sim.profiler
     try:
-        write_energy_metrics_csv("energy_metrics.csv")
-        print(f"\n📁 Energy metrics exported to: energy_metrics.csv")
-    except Exception as csv_error:
-        print(f"⚠️  Error writing energy_metrics.csv: {csv_error}")
-        import traceback
-        traceback.print_exc()
+        # Export logged packets
+        _export(prof, log_all_packets, ctx, sim.packet_log)
+        if getattr(params, "TRACE_EXPORT_CSV", False):
+            _export(prof, export_columnar_traces, ctx)
+
+        # Check convergence and log final topology
+        converged = _export(prof, log_all_nodes_registered, ctx)
+        result = _collect_result(ctx, runtime, converged)
+        _export(prof, write_energy_metrics_csv, ctx)
+
+        # Save packet loss stats for graph generation
+        if result.tx_attempts > 0:
+            with open(ctx.path("packet_loss_stats.csv"), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(
+                    ["configured_loss_pct", "realized_loss_pct", "attempts", "dropped"])
+                writer.writerow([result.configured_loss_pct, result.realized_loss_pct,
+                                 result.tx_attempts, result.tx_dropped])
+
+        # Optionally save final snapshot if visualization was enabled
+        if getattr(params, "SNAPSHOT_AT_END", False) and sim.visual and hasattr(sim, 'tkplot'):
+            save_snapshot(ctx)
+    finally:
+        if prof is not None:
+            prof.measure(("export", "trace close"), sim.trace.close, (), {})
+        else:
+            sim.trace.close()
+    if prof is not None:
+        result.profile = prof.rows()
+        prof.write_csv(ctx.path(getattr(params, "PROFILE_FILE", "event_profile.csv")),
+                       ctx.path(getattr(params, "PROFILE_HIST_FILE", "event_profile_hist.csv")))
+    return result
+
+
+def _export(prof, func, *args):
+    """Calls an end of run export, timed as an 'export' kind if the run is profiled."""
+    if prof is None:
+        return func(*args)
+    return prof.measure(("export", func.__name__), func, args, {})
+
 
-except Exception as e:
-    print(f"⚠️  Error calculating energy metrics: {e}")
-    import traceback
-    traceback.print_exc()
-
-# Role distribution
-print("\n--- Final Role Distribution  ---")
-for role, count in ROLE_COUNTS.items():
-    print(f"  {role.name}: {count}")
-
-# Convergence verification guide
-print("\n--- convergence verification helper files ---")
-print("The following files can help verify convergence:")
-print("   1. topology.csv - Listing all nodes and their final roles")
-print("   2. registration_log.csv - Gives registration times for each node")
-print("   3. Terminal output above - Gives convergence status")
-print("\n roles expected for convergence to an extent:")
-print("   - ROOT: 1 node")
-print("   - CLUSTER_HEAD: Multiple nodes (network clusters)")
-print("   - REGISTERED: Leaf nodes (most nodes)")
-print("   - ROUTER: Bridge nodes (if any)")
-print("   - UNREGISTERED/UNDISCOVERED: Help me join the network")
-
-# Optionally save final snapshot if visualization was enabled
-SNAPSHOT_AT_END = getattr(config, "SNAPSHOT_AT_END", False)
-if SNAPSHOT_AT_END and sim.visual and hasattr(sim, 'tkplot'):
+###########################################################
+def run_simulation(params=None, output_dir="."):
+    """Runs the data collection tree scenario once. All state of the run is kept in a RunContext,
+    so runs can follow each other (or run in parallel in threads or worker processes) in one
+    interpreter without affecting each other. Only progress messages are printed, see print_report().
+
+       Args:
+           params (Dict or RunParams): Config overrides (config.py names to values). None runs config.py as is.
+           output_dir (string): Directory for the CSV files of the run. It is created if missing.
+
+       Returns:
+           RunResult: Metrics of the run.
+    """
+    ctx = setup_run(params, output_dir)
+    start_time = time.time()
     try:
-        canvas = sim.tkplot.canvas
+        ctx.sim.run()
+    except BaseException:
+        ctx.sim.trace.close()
+        raise
+    return finish_run(ctx, time.time() - start_time)
+
+
+###########################################################
+def resume_simulation(checkpoint):
+    """Continues a run from a checkpoint written with CHECKPOINT_INTERVAL set. The run appends to
+    the trace files in its output directory and its metrics and CSV files are the same as those of
+    an uninterrupted run. Relative output directories are resolved against the current directory.
+
+       Args:
+           checkpoint (string): Checkpoint file.
+
+       Returns:
+           RunResult: Metrics of the run. runtime only covers the resumed part.
+    """
+    sim = wsn.load_checkpoint(checkpoint)
+    print(f"Resuming run from {checkpoint} at time {sim.now:.2f}")
+    start_time = time.time()
+    try:
+        sim.resume()
+    except BaseException:
+        sim.trace.close()
+        raise
+    return finish_run(sim.ctx, time.time() - start_time)
+
+
+def save_snapshot(ctx, filename="final_snapshot.eps"):
+    """Save the Tk canvas of a visual run as PostScript."""
+    try:
+        canvas = ctx.sim.tkplot.canvas
         # Update canvas to ensure everything is drawn
         canvas.update()
         # Save as PostScript (built-in Tkinter method)
-        filename = "final_snapshot.eps"
-        canvas.postscript(file=filename, colormode='color')
+        canvas.postscript(file=ctx.path(filename), colormode='color')
         print(f"\n📸 Final snapshot saved to {filename}")
         print("   (Convert to PNG: convert final_snapshot.eps final_snapshot.png)")
         print("   Or use: ps2pdf final_snapshot.eps final_snapshot.pdf")
     except Exception as e:
         print(f"\n⚠️  Could not save snapshot: {e}")
 
-print("=" * 60 + "\n")
+
+###########################################################
+def print_report(result):
+    """Print the end of run report of a RunResult."""
+    r = result
+    print("\n" + "=" * 60)
+    print("Simulation Finished Finally!!!!")
+    print("=" * 60)
+    print(f"⏱️  Runtime: {r.runtime:.2f} seconds ({r.runtime/60:.2f} minutes)")
+    print("=" * 60)
+
+    # Prominent convergence status
+    print("\n" + "=" * 60)
+    if r.converged:
+        # should be impossible for this when energy enabled
+        print("✅✅✅  Network Convergence stats: SUCCESS  ✅✅✅")
+        print(f"   All {r.node_count} nodes are registered!")
+    else:
+        print(" Network Convergence stats: ")
+        unregistered = r.unregistered
+        print(f"   {len(unregistered)} nodes are unregistered by end of sim:")
+        print(
+            f"   Node IDs: {unregistered[:20]}{'...' if len(unregistered) > 20 else ''}")
+    print("=" * 60)
+
+    # --- Network Statistics ---
+    print("\n--- Network Statistics ---")
+
+    # Join time statistics
+    if r.join_count:
+        print(f"Join Times: {r.join_count} nodes joined")
+        print(f"  Average: {r.join_avg:.4f} sim seconds")
+        print(f"  Min: {r.join_min:.4f} sim seconds")
+        print(f"  Max: {r.join_max:.4f} sim seconds")
+    else:
+        print("No join times recorded.")
+
+    # Packet delivery statistics
+    if r.packets_delivered:
+        print(f"\nPacket Delivery: {r.packets_delivered} packets delivered")
+        print(f"  Average delay: {r.delay_avg:.4f} sim seconds")
+        print(f"  Min delay: {r.delay_min:.4f} sim seconds")
+        print(f"  Max delay: {r.delay_max:.4f} sim seconds")
+        print(f"  By type: {r.delivered_by_type}")
+    else:
+        print("\nNo packets delivered (packet log is empty).")
+
+    # Packet Loss Statistics
+    print("\n--- Packet Loss Statistics ---")
+    if r.tx_attempts > 0:
+        print(f"  TX attempts: {r.tx_attempts}")
+        print(f"  Dropped by channel: {r.tx_dropped}")
+        print(f"  Realized loss: {r.realized_loss_pct:.2f}% "
+              f"(configured: {r.configured_loss_pct:.2f}%)")
+    else:
+        print("  No transmissions recorded (no attempts).")
+    if r.table_share_full_bytes > 0:
+        saved = 100.0 - r.table_share_bytes * 100.0 / r.table_share_full_bytes
+        print(f"  TABLE_SHARE entries: {r.table_share_bytes} bytes "
+              f"(full tables: {r.table_share_full_bytes} bytes, {saved:.1f}% saved)")
+    print(f"  HEART_BEATs sent: {r.heart_beats_sent}"
+          + (f" ({r.heart_beats_suppressed} suppressed by Trickle)" if r.heart_beats_suppressed else ""))
+    print(f"  PROBE replies sent: {r.probe_replies}"
+          + (f" ({r.probe_replies_suppressed} suppressed, {r.probe_replies_limited} rate limited)"
+             if r.probe_replies_suppressed or r.probe_replies_limited else ""))
+
+    # Failure Recovery Statistics
+    print("\n--- Failure Recovery Statistics ---")
+    if r.recovery_at_end:
+        print(f"✅ RECOVERY COMPLETE (detected at end of simulation)")
+    elif r.recovery_start_time is not None and r.recovery_duration is None:
+        print(
+            f"⚠️  Recovery started but not completed: {r.orphans_at_end} nodes still unregistered")
+
+    if r.recovery_duration is not None:
+        print(f"⏱️  Time to Recover: {r.recovery_duration:.2f} sim seconds")
+    elif r.recovery_start_time is not None:
+        print(
+            f"⏱️  Time to Recover: (recovery started at {r.recovery_start_time:.2f}, ended at {r.sim_time:.2f})")
+        print(f"   {r.orphans_at_end} nodes still unregistered at end of simulation")
+    else:
+        print("⏱️  Time to Recover: N/A (Recovery not started - no node was killed/recovered)")
+    print(f"⚠️  Max Orphan Count: {r.max_orphan_count}")
+
+    # Network Lifetime Statistics (8) - Maximize Network Life Metric
+    print("\n" + "=" * 60)
+    print("--- Network Lifetime (Maximize Network Life) ---")
+    print("=" * 60)
+    death_ratio = r.dead_nodes / r.node_count if r.node_count else 0
+    if r.network_death_time is not None:
+        print(f"⏱️  NETWORK LIFETIME: {r.network_death_time:.2f} sim seconds")
+        print(f"   (Time until network death threshold reached)")
+        print(
+            f"   💀 Death threshold: {r.network_death_threshold*100:.0f}% nodes dead OR root dead")
+        print(
+            f"   Dead nodes at death time: {r.dead_nodes}/{r.node_count} ({death_ratio*100:.1f}%)")
+        print(f"   Simulation duration: {r.duration} sim seconds")
+        if r.network_death_time < r.duration:
+            print(
+                f"   ✅ Network survived {r.network_death_time/r.duration*100:.1f}% of simulation duration")
+        else:
+            print(f"   ⚠️  Network died at end of simulation")
+    else:
+        if r.dead_nodes:
+            print(
+                f"✅ Network lifetime: FULL SIMULATION DURATION ({r.duration} sim seconds)")
+            print(f"   Network death threshold NOT reached during simulation")
+            print(
+                f"   Dead nodes at end: {r.dead_nodes}/{r.node_count} ({death_ratio*100:.1f}%)")
+            print(
+                f"   ⚠️  Note: {death_ratio*100:.1f}% nodes dead, but 💀 threshold ({r.network_death_threshold*100:.0f}%) not reached")
+        else:
+            print(
+                f"✅ Network lifetime: FULL SIMULATION DURATION ({r.duration} sim seconds)")
+            print(f"   All nodes survived the entire simulation!")
+            print(f"   Perfect network lifetime: 100% survival rate")
+    print("=" * 60)
+
+    # Energy Metrics Statistics (8)
+    print("\n--- Energy Metrics ---")
+    try:
+        total_tx_energy = r.total_tx_energy
+        total_rx_energy = r.total_rx_energy
+        total_idle_energy = getattr(r, "total_idle_energy", 0.0)
+        total_packet_energy = total_tx_energy + total_rx_energy
+        total_energy_consumed = total_packet_energy + total_idle_energy
+        total_tx_packets = r.total_tx_packets
+        total_rx_packets = r.total_rx_packets
+        total_packets = total_tx_packets + total_rx_packets
+
+        print(f"📊 Total Network Energy Consumption: {total_energy_consumed:.6f} J")
+        print(
+            f"   TX Energy: {total_tx_energy:.6f} J ({total_tx_energy/total_energy_consumed*100:.1f}%)")
+        print(
+            f"   RX Energy: {total_rx_energy:.6f} J ({total_rx_energy/total_energy_consumed*100:.1f}%)")
+        if total_idle_energy:
+            print(
+                f"   Idle Energy: {total_idle_energy:.6f} J ({total_idle_energy/total_energy_consumed*100:.1f}%)")
+        print(f"\n📦 Total Packets: {total_packets}")
+        print(f"   TX Packets: {total_tx_packets}")
+        print(f"   RX Packets: {total_rx_packets}")
+        print(f"\n⚡ Average Energy per Packet: {total_packet_energy/total_packets:.9f} J" if total_packets >
+              0 else "\n⚡ Average Energy per Packet: N/A (no packets)")
+        print(f"   Average TX Energy per Packet: {total_tx_energy/total_tx_packets:.9f} J" if total_tx_packets >
+              0 else "   Average TX Energy per Packet: N/A")
+        print(f"   Average RX Energy per Packet: {total_rx_energy/total_rx_packets:.9f} J" if total_rx_packets >
+              0 else "   Average RX Energy per Packet: N/A")
+        print(
+            f"\n🔋 Average Remaining Energy (alive nodes): {r.avg_remaining_energy:.6f} J")
+        print(
+            f"🔋 Average Consumed Energy (alive nodes): {r.avg_consumed_energy:.6f} J")
+
+        if r.energy_by_role:
+            print(f"\n📈 Energy Consumption by Role:")
+            for role_name, stats in sorted(r.energy_by_role.items()):
+                count = stats["count"]
+                avg_tx = stats["total_tx"] / count if count > 0 else 0.0
+                avg_rx = stats["total_rx"] / count if count > 0 else 0.0
+                avg_remaining = stats["total_remaining"] / \
+                    count if count > 0 else 0.0
+                print(f"   {role_name}: {count} nodes")
+                print(f"      Avg TX Energy: {avg_tx:.6f} J")
+                print(f"      Avg RX Energy: {avg_rx:.6f} J")
+                print(f"      Avg Remaining: {avg_remaining:.6f} J")
+
+        print(f"\n📁 Energy metrics exported to: energy_metrics.csv")
+
+    except Exception as e:
+        print(f"⚠️  Error calculating energy metrics: {e}")
+        import traceback
+        traceback.print_exc()
+
+    # Role distribution
+    print("\n--- Final Role Distribution  ---")
+    for role_name, count in r.role_counts.items():
+        print(f"  {role_name}: {count}")
+
+    # Convergence verification guide
+    print("\n--- convergence verification helper files ---")
+    print("The following files can help verify convergence:")
+    print("   1. topology.csv - Listing all nodes and their final roles")
+    print("   2. registration_log.csv - Gives registration times for each node")
+    print("   3. Terminal output above - Gives convergence status")
+    print("\n roles expected for convergence to an extent:")
+    print("   - ROOT: 1 node")
+    print("   - CLUSTER_HEAD: Multiple nodes (network clusters)")
+    print("   - REGISTERED: Leaf nodes (most nodes)")
+    print("   - ROUTER: Bridge nodes (if any)")
+    print("   - UNREGISTERED/UNDISCOVERED: Help me join the network")
+    print("=" * 60 + "\n")
+
+    # Event profile (SIM_PROFILE)
+    if getattr(r, "profile", None):
+        print("--- Event Profile (wall time, heaviest first) ---")
+        print(profiler.format_table(r.profile, limit=30))
+        print("=" * 60 + "\n")
+
+
+###########################################################
+def main(argv=None):
+    """Runs the scenario with config.py values, or resumes a run from a checkpoint, and prints its report."""
+    parser = argparse.ArgumentParser(description="Data collection tree simulation.")
+    parser.add_argument("--resume", metavar="CHECKPOINT", help="continue a run from a checkpoint file")
+    args = parser.parse_args(argv)
+    print_report(resume_simulation(args.resume) if args.resume else run_simulation())
+
+
+if __name__ == "__main__":
+    # Run through the importable module, so checkpoints refer to data_collection_tree instead of __main__
+    import data_collection_tree
+    data_collection_tree.main()
@@ -4,7 +4,7 @@ import sys
 # insert at 1, 0 is the script path (or '' in REPL)
 sys.path.insert(1, '.')
 from source import wsnlab_vis as wsn
-import math
+from source import placement
 from source import config
 
 Roles = Enum('Roles', 'UNDISCOVERED UNREGISTERED ROOT REGISTERED CLUSTER_HEAD')
@@ -83,13 +83,9 @@ def create_network(node_class, number_of_nodes=100):
     Returns:
 
     """
-    edge = math.ceil(math.sqrt(number_of_nodes))
-    for i in range(number_of_nodes):
-        x = i / edge
-        y = i % edge
-        px = 50 + x * config.SIM_NODE_PLACING_CELL_SIZE + random.uniform(-1 * config.SIM_NODE_PLACING_CELL_SIZE / 3, config.SIM_NODE_PLACING_CELL_SIZE / 3)
-        py = 50 + y * config.SIM_NODE_PLACING_CELL_SIZE + random.uniform(-1 * config.SIM_NODE_PLACING_CELL_SIZE / 3, config.SIM_NODE_PLACING_CELL_SIZE / 3)
-        node = sim.add_node(node_class, (px, py))
+    positions = placement.grid_jitter(number_of_nodes, config.SIM_NODE_PLACING_CELL_SIZE,
+                                      origin=(50, 50), rng=random.getrandbits(32))
+    for node in sim.add_nodes(node_class, positions):
         node.tx_range = config.NODE_TX_RANGE
         node.logging = True
         node.arrival = random.uniform(0, config.NODE_ARRIVAL_MAX)
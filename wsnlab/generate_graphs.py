@@ -13,6 +13,8 @@ from collections import defaultdict
 import os
 import sys
 
+from source.trace import load_columns
+
 # Set style for better-looking graphs
 plt.style.use('seaborn-v0_8-darkgrid')
 plt.rcParams['figure.figsize'] = (12, 8)
@@ -30,6 +32,15 @@ def read_csv(filename):
             data.append(row)
     return data
 
+def load_columnar(name):
+    """Load a columnar trace table written with TRACE_FORMAT 'npy' (name.cols directory of .npy
+    files, memory-mapped, or compressed name.npz). Return dict of array name -> array, or None if
+    the table does not exist. See source/trace.py for the array layout."""
+    for path in (name + ".cols", name + ".npz"):
+        if os.path.exists(path):
+            return load_columns(path)['arrays']
+    return None
+
 def graph_1_join_times():
     """Graph 1: Time to join the network (histogram and CDF)."""
     data = read_csv("registration_log.csv")
@@ -80,29 +91,38 @@ def graph_1_join_times():
 
 def graph_2_packet_delay():
     """Graph 2: End-to-end packet delay and path length."""
-    data = read_csv("packet_log.csv")
-    if not data:
-        return
-    
     delays = []
     hop_counts = []
-    
-    for row in data:
-        if row.get('delay'):
-            try:
-                delay = float(row['delay'])
-                delays.append(delay)
-                
-                # Calculate hop count from path
-                path = row.get('path', '')
-                if path:
-                    # Path format might be comma-separated or list-like
-                    path_list = path.strip('[]').split(',')
-                    hop_count = len([p for p in path_list if p.strip()]) - 1
-                    if hop_count >= 0:
-                        hop_counts.append((hop_count, delay))
-            except (ValueError, TypeError):
-                continue
+
+    columns = load_columnar("packet_log")
+    if columns is not None:
+        # Hop count is path length - 1, path lengths come from the offsets
+        delay = np.asarray(columns['delay'])
+        hops = np.diff(columns['path_offsets']) - 1
+        valid = ~np.isnan(delay)
+        delays = delay[valid].tolist()
+        hop_counts = [(h, d) for h, d in zip(hops[valid].tolist(), delays) if h >= 0]
+    else:
+        data = read_csv("packet_log.csv")
+        if not data:
+            return
+
+        for row in data:
+            if row.get('delay'):
+                try:
+                    delay = float(row['delay'])
+                    delays.append(delay)
+
+                    # Calculate hop count from path
+                    path = row.get('path', '')
+                    if path:
+                        # Path format might be "a -> b", comma-separated or list-like
+                        path_list = path.strip('[]').replace('->', ',').split(',')
+                        hop_count = len([p for p in path_list if p.strip()]) - 1
+                        if hop_count >= 0:
+                            hop_counts.append((hop_count, delay))
+                except (ValueError, TypeError):
+                    continue
     
     if not delays:
         print("⚠️  No valid delay data found in packet_log.csv")
@@ -397,8 +417,9 @@ def graph_4_energy_consumption():
 
 def graph_6_power_over_time():
     """Graph 6: Average node power over time."""
-    data = read_csv("power_over_time.csv")
-    if not data:
+    columns = load_columnar("power_over_time")
+    data = read_csv("power_over_time.csv") if columns is None else None
+    if columns is None and not data:
         print("⚠️  No power_over_time.csv found. Skipping power over time graph.")
         # Create placeholder
         fig, ax = plt.subplots(figsize=(12, 6))
@@ -410,12 +431,20 @@ def graph_6_power_over_time():
         plt.close()
         return
     
-    times = [float(row['time']) for row in data if row.get('time')]
-    avg_powers = [float(row['avg_power_j']) for row in data if row.get('avg_power_j')]
-    min_powers = [float(row['min_power_j']) for row in data if row.get('min_power_j')]
-    max_powers = [float(row['max_power_j']) for row in data if row.get('max_power_j')]
-    alive_nodes = [int(row['alive_nodes']) for row in data if row.get('alive_nodes')]
-    dead_nodes = [int(row['dead_nodes']) for row in data if row.get('dead_nodes')]
+    if columns is not None:
+        times = columns['time'].tolist()
+        avg_powers = columns['avg_power_j'].tolist()
+        min_powers = columns['min_power_j'].tolist()
+        max_powers = columns['max_power_j'].tolist()
+        alive_nodes = columns['alive_nodes'].tolist()
+        dead_nodes = columns['dead_nodes'].tolist()
+    else:
+        times = [float(row['time']) for row in data if row.get('time')]
+        avg_powers = [float(row['avg_power_j']) for row in data if row.get('avg_power_j')]
+        min_powers = [float(row['min_power_j']) for row in data if row.get('min_power_j')]
+        max_powers = [float(row['max_power_j']) for row in data if row.get('max_power_j')]
+        alive_nodes = [int(row['alive_nodes']) for row in data if row.get('alive_nodes')]
+        dead_nodes = [int(row['dead_nodes']) for row in data if row.get('dead_nodes')]
     
     if not times or not avg_powers:
         print("⚠️  No power data found in power_over_time.csv")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo replications of the data collection tree scenario.
+
+Runs N replications of data_collection_tree.run_simulation() with seeds base_seed .. base_seed+N-1
+on a ProcessPoolExecutor. Every replication writes its CSV files and printed output into its own
+directory (<out>/seed_<seed>/) and sends a compact summary record back to the parent. The parent
+appends each record to <out>/replications.csv as it arrives and at the end writes
+<out>/summary.csv with mean, standard deviation and 95% confidence interval of every metric.
+
+Usage (from wsnlab directory):
+    python replicate.py -n 64 [--workers W] [--seed S] [--out DIR] [--set NAME=VALUE ...]
+"""
+
+import argparse
+import ast
+import contextlib
+import csv
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import data_collection_tree
+
+# Metrics of a RunResult kept in summary records, in column order
+METRICS = [
+    "converged",
+    "join_count",
+    "join_avg",
+    "join_max",
+    "packets_delivered",
+    "delay_avg",
+    "delay_max",
+    "realized_loss_pct",
+    "recovery_duration",
+    "max_orphan_count",
+    "network_death_time",
+    "dead_nodes",
+    "total_energy_j",
+    "avg_remaining_energy",
+    "event_count",
+    "runtime",
+]
+
+# Two-sided 95% Student t critical values by degrees of freedom, 1.96 above the table
+_T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+        9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120,
+        17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064,
+        25: 2.060, 26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042, 40: 2.021, 60: 2.000,
+        120: 1.980}
+
+
+def summarize(result):
+    """Compact summary record of a RunResult: the METRICS values (None if not reached)."""
+    record = {name: getattr(result, name, None) for name in METRICS}
+    record["converged"] = int(result.converged)
+    record["total_energy_j"] = (result.total_tx_energy + result.total_rx_energy
+                                + getattr(result, "total_idle_energy", 0.0))
+    return record
+
+
+def run_replication(seed, overrides, output_dir):
+    """Worker: runs one replication into output_dir and returns its summary record.
+
+    Printed progress goes to output_dir/run.log, so replications do not interleave output."""
+    params = dict(overrides, SEED=seed, SIM_VISUALIZATION=False)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "run.log"), "w") as log, contextlib.redirect_stdout(log):
+        result = data_collection_tree.run_simulation(params, output_dir)
+        data_collection_tree.print_report(result)
+    record = {"seed": seed}
+    record.update(summarize(result))
+    return record
+
+
+def t_critical(df):
+    """Two-sided 95% Student t critical value for df degrees of freedom."""
+    if df in _T95:
+        return _T95[df]
+    larger = [d for d in _T95 if d > df]
+    return _T95[min(larger)] if larger else 1.96
+
+
+def aggregate(records, metrics=METRICS):
+    """Mean, sample standard deviation and 95% t confidence interval of each metric.
+
+    Records where a metric is None (e.g. no network death) are left out of that metric.
+    Returns a list of dicts with metric, n, mean, std, ci_low, ci_high, min and max."""
+    rows = []
+    for name in metrics:
+        values = [r[name] for r in records if r.get(name) is not None]
+        n = len(values)
+        row = {"metric": name, "n": n, "mean": None, "std": None,
+               "ci_low": None, "ci_high": None, "min": None, "max": None}
+        if n:
+            mean = sum(values) / n
+            std = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1)) if n > 1 else 0.0
+            half = t_critical(n - 1) * std / math.sqrt(n) if n > 1 else 0.0
+            row.update(mean=mean, std=std, ci_low=mean - half, ci_high=mean + half,
+                       min=min(values), max=max(values))
+        rows.append(row)
+    return rows
+
+
+def write_summary_csv(rows, path):
+    """Write aggregate() rows as CSV."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["metric", "n", "mean", "std", "ci_low", "ci_high", "min", "max"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_replications(n, workers=None, overrides=None, output_dir="replications", base_seed=1,
+                     progress=True):
+    """Runs n replications in parallel and writes replications.csv and summary.csv.
+
+    Args:
+        n (int): Number of replications. Seeds are base_seed .. base_seed + n - 1.
+        workers (int): Worker processes. None uses every core.
+        overrides (Dict): Config overrides shared by all replications.
+        output_dir (string): Directory of the tables and of the per-seed directories.
+        base_seed (int): Seed of the first replication.
+        progress (bool): If True, print a line per finished replication.
+
+    Returns:
+        Tuple(List of Dicts, List of Dicts): Summary records sorted by seed and aggregate() rows.
+    """
+    overrides = dict(overrides or {})
+    workers = min(workers or os.cpu_count() or 1, n)
+    os.makedirs(output_dir, exist_ok=True)
+    records = []
+    start = time.time()
+    with open(os.path.join(output_dir, "replications.csv"), "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=["seed"] + METRICS)
+        writer.writeheader()
+        futures = [pool.submit(run_replication, seed, overrides,
+                               os.path.join(output_dir, f"seed_{seed}"))
+                   for seed in range(base_seed, base_seed + n)]
+        # Records are written in completion order as they stream in
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            writer.writerow(record)
+            f.flush()
+            if progress:
+                print(f"[{len(records)}/{n}] seed {record['seed']} done "
+                      f"({record['runtime']:.1f} s, {time.time() - start:.1f} s elapsed)")
+    records.sort(key=lambda r: r["seed"])
+    rows = aggregate(records)
+    write_summary_csv(rows, os.path.join(output_dir, "summary.csv"))
+    return records, rows
+
+
+def parse_overrides(items):
+    """Parse NAME=VALUE strings; values are Python literals, anything else is a string."""
+    overrides = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        try:
+            overrides[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name] = value
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--replications", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the first replication")
+    parser.add_argument("--out", default="replications", help="output directory")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help="config override, e.g. --set SIM_NODE_COUNT=200")
+    args = parser.parse_args()
+
+    _, rows = run_replications(args.replications, args.workers, parse_overrides(args.overrides),
+                               args.out, args.seed)
+    print(f"\n{'metric':>22} {'n':>4} {'mean':>12} {'95% CI':>27}")
+    for row in rows:
+        if row["n"]:
+            print(f"{row['metric']:>22} {row['n']:>4} {row['mean']:>12.4f} "
+                  f"[{row['ci_low']:>12.4f}, {row['ci_high']:>12.4f}]")
+        else:
+            print(f"{row['metric']:>22} {row['n']:>4} {'-':>12}")
+    print(f"\n📁 Tables written to {os.path.join(args.out, 'replications.csv')} and "
+          f"{os.path.join(args.out, 'summary.csv')}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
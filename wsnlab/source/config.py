@@ -7,6 +7,17 @@ random.seed(12345)  # deterministic seed for reproducible runs
 
 
 JOIN_REQUEST_TIME_INTERVAL = 10  # or 12, etc.
+# Orphan join / probe retries: the retry delay grows JOIN_RETRY_BACKOFF times per retry (1 = fixed)
+# up to JOIN_RETRY_MAX_INTERVAL and is jittered by +-JOIN_RETRY_JITTER; a new candidate parent resets it
+JOIN_RETRY_BACKOFF = 1.0
+JOIN_RETRY_MAX_INTERVAL = 320
+JOIN_RETRY_JITTER = 0.0
+# PROBE replies: a HEART_BEAT answering a PROBE waits a random time up to PROBE_REPLY_DELAY (0 = at
+# once) and is cancelled if PROBE_REPLY_SUPPRESS root reachable HEART_BEATs with the same or a lower
+# hop_count are heard meanwhile (0 = never); a node replies at most once per PROBE_REPLY_MIN_INTERVAL
+PROBE_REPLY_DELAY = 0.0
+PROBE_REPLY_SUPPRESS = 0
+PROBE_REPLY_MIN_INTERVAL = 0.0
 # ROLE_OPTIMIZE_TIME = 2000
 # node properties
 NODE_TX_RANGES = {
@@ -28,6 +39,7 @@ PACKET_LOSS_RATIO = 0.05   # 0.01% old value
 FAILURE_TIME = 500  # Time to kill node(s) #1000 old value
 RECOVERY_TIME = 550  # Time to recover node(s) #1500 old value
 NUM_NODES_TO_KILL = 3  # Number of nodes to kill (can be multiple)
+FAILURE_NODE_IDS = None  # ids of nodes to kill at FAILURE_TIME instead of NUM_NODES_TO_KILL random ones
 
 
 NUM_OF_CHILDREN = 25
@@ -36,24 +48,58 @@ NUM_OF_CHILDREN = 25
 SIM_NODE_COUNT = 100  # noce count in simulation
 # 60 okay with performance #50 is good with power  #80 works but overlap with ower # cell size to place one node
 SIM_NODE_PLACING_CELL_SIZE = 60
+SIM_NODE_PLACEMENT = 'GRID_JITTER'  # 'GRID_JITTER', 'RANDOM_UNIFORM', 'POISSON_DISK'
+SIM_NODE_MIN_DISTANCE = 30  # min distance between nodes for POISSON_DISK placement
 SIM_DURATION = 5000  # simulation Duration in seconds
 # 0 for max speed (headless/fast-forward), >0 for real-time factor
 SIM_TIME_SCALE = 0
+# 'simpy' runs every scheduled callback as a SimPy process, 'heap' calls callbacks directly from a heap (faster)
+SIM_KERNEL = 'simpy'
+# deliver each transmission to all receivers in one event instead of two events per receiver
+SIM_BROADCAST_FANOUT = False
+# write a checkpoint of the run every CHECKPOINT_INTERVAL sim seconds (0 for none, needs 'heap' kernel and no visualization)
+CHECKPOINT_INTERVAL = 0
+CHECKPOINT_FILE = 'checkpoint.pkl'  # checkpoint file in the output directory, resume with --resume
+# count events by kind and time their handlers, printed and written to PROFILE_FILE / PROFILE_HIST_FILE
+SIM_PROFILE = False
+PROFILE_FILE = 'event_profile.csv'
+PROFILE_HIST_FILE = 'event_profile_hist.csv'
 SIM_TERRAIN_SIZE = (1400, 1400)  # terrain size
 SIM_TITLE = 'Data Collection Tree'  # title of visualization window
 SIM_VISUALIZATION = True  # visualization active
 
 # optional performance toggles
 ENABLE_PACKET_ROUTE_LOGGING = True  # Disable for performance
+DISTANCE_CSV_MAX_NODES = 2000  # skip all-pairs node distance CSVs above this node count
+TRACE_FLUSH_SIZE = 1000  # rows buffered per trace CSV file before they are written
+TRACE_BACKGROUND = True  # write trace CSV rows on a background thread
+# 'csv', or 'npy' to write packet_log, packet_routes, role_changes and power_over_time as columnar
+# NumPy tables (<name>.cols/ directories of .npy files, or <name>.npz if TRACE_COMPRESS)
+TRACE_FORMAT = 'csv'
+TRACE_COMPRESS = False
+TRACE_EXPORT_CSV = False  # with TRACE_FORMAT 'npy', also export the columnar tables as CSV after the run
 # set True to keep mesh routing/heartbeat export, False to skip for speed
 ENABLE_MESH = True
 SCALE = 1  # scale factor for visualization
 
-# new limit for mesh export size to avoid huge heart‑beat packets
-MAX_MESH_EXPORT = 500  # max number of mesh entries included in a HEART_BEAT
+# new limit for mesh export size to avoid huge table share packets
+MAX_MESH_EXPORT = 500  # max number of mesh entries included in a TABLE_SHARE, closest hops first
+# TABLE_SHARE sends only the entries a neighbor has not acknowledged yet; False sends full tables
+TABLE_SHARE_DELTA = False
+TABLE_SHARE_FULL_EVERY = 10  # every n-th TABLE_SHARE of a node is a full table (0 = never)
+TABLE_SHARE_ENTRY_BYTES = 8  # size of one shared entry, for the byte count in the report
 
 # application properties
 HEARTH_BEAT_TIME_INTERVAL = 100
+# Trickle beaconing: the HEART_BEAT interval doubles up to HEART_BEAT_MAX_INTERVAL while neighbors
+# stay consistent, and role / parent changes, new or changed neighbors, PROBE and JOIN_REQUEST go
+# back to HEART_BEAT_TIME_INTERVAL
+HEART_BEAT_TRICKLE = False
+HEART_BEAT_MAX_INTERVAL = 1600
+# Trickle k: a beat is left out once k consistent ones were heard in the interval (0 = never).
+# A beat carries its sender's own state, so suppressed parents can be missed by nodes that only
+# hear them one way and orphans then flood PROBEs; use with care.
+HEART_BEAT_REDUNDANCY = 0
 REPAIRING_METHOD = 'FIND_ANOTHER_PARENT'  # 'ALL_ORPHAN', 'FIND_ANOTHER_PARENT'
 EXPORT_CH_CSV_INTERVAL = 10  # simulation time units;
 EXPORT_NEIGHBOR_CSV_INTERVAL = 10  # simulation time units;
@@ -83,6 +129,10 @@ TX_CURRENT_LEVELS_MA = {
 
 RX_CURRENT = 18.8        # mA
 
+# Draw between packets, integrated lazily when a node's energy is read (0 = not modeled, nonzero needs 'heap' kernel)
+IDLE_CURRENT_MA = 0.0    # awake node, e.g. CC2420 idle 0.426 mA
+SLEEP_CURRENT_MA = 0.0   # sleeping or killed node, e.g. CC2420 power down 0.02 mA
+
 # Energy thresholds
 # starting energy per node (pick value that lets nodes actually die during your sim)
 INITIAL_ENERGY_J = 2
@@ -96,3 +146,6 @@ RX_TURNAROUND_ENERGY_J = 10e-6   # symmetric assumption
 # Network lifetime threshold (percentage of nodes that must die before network is considered dead)
 # 0.05 is good to see amount of death nodes # 50% of nodes dead
 NETWORK_DEATH_THRESHOLD = 0.50
+
+# check the live role/orphan/dead node tallies against a scan of all nodes on every query (slow, for tests)
+CHECK_TALLIES = False
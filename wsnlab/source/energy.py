@@ -0,0 +1,213 @@
+"""CC2420 energy accounting of the data collection tree nodes (8).
+
+The energy of one packet, V * I * 8 * (N + 6) / R plus the turnaround overhead, only depends on
+the current of the TX power level (or the RX current) and the PSDU size N, so EnergyModel
+precomputes it for every power level and size once per run instead of on every packet.
+
+Idle (awake) and sleep currents drain a node between packets. The drain is not ticked: a node
+keeps its energy at the time it was last touched, and the drain since then is added when the
+energy is read or changed. When a node drains, its death time is predicted from its energy and
+current and scheduled as one event, which is moved when a packet or a sleep / wake up changes it.
+Moving needs a kernel that cancels events, so idle and sleep currents need the heap kernel.
+"""
+
+
+###########################################################
+def packet_energy(voltage, current_mA, n_bytes, datarate, overhead):
+    """Energy of one packet, Etx = (V * I * 8*(N+6)) / R + overhead (I in Amps).
+
+       Args:
+           voltage (double): Supply voltage (V).
+           current_mA (double): Radio current (mA).
+           n_bytes (int): PSDU size N (bytes).
+           datarate (double): Bit rate R (bps).
+           overhead (double): PLL / turnaround energy (J).
+
+       Returns:
+           double: Energy (J).
+    """
+    I_A = current_mA / 1000.0
+    bits = 8 * (n_bytes + 6)
+    return voltage * I_A * (bits / datarate) + overhead
+
+
+###########################################################
+class EnergyModel:
+    """Energy accounting of the nodes of one run. Nodes keep their state in attributes set by
+    attach(): energy (J at time energy_time), drain_w (W drawn between packets), death_at (predicted
+    death time or None), tx_costs (TX table of their power level), tx/rx/idle_energy_consumed and
+    tx/rx_packet_count. A node whose predicted death is reached gets on_energy_depleted() called.
+
+       Attributes:
+           params (RunParams): Config values of the run.
+           sim (Simulator): Simulator of the run.
+           min_energy (double): Energy (J) at or below which a node is dead.
+           idle_w (double): Power (W) an awake node draws between packets.
+           sleep_w (double): Power (W) a sleeping node draws.
+           max_bytes (int): Largest PSDU size of the tables (MTU).
+           tx_tables (Dict of int to List of double): TX energy (J) of a packet by power level and PSDU bytes.
+           rx_table (List of double): RX energy (J) of a packet by PSDU bytes.
+    """
+
+    DEFAULT_TX_CURRENT_MA = 17.4  # worst-case current of levels missing in TX_CURRENTS_MA
+
+    ############################
+    def __init__(self, params, sim):
+        """Constructor for EnergyModel class.
+
+           Args:
+               params (RunParams): Config values of the run.
+               sim (Simulator): Simulator of the run.
+
+           Returns:
+               EnergyModel: Created EnergyModel object.
+        """
+        self.params = params
+        self.sim = sim
+        self.min_energy = params.MIN_ENERGY_J
+        self.idle_w = params.VOLTAGE * getattr(params, "IDLE_CURRENT_MA", 0.0) / 1000.0
+        self.sleep_w = params.VOLTAGE * getattr(params, "SLEEP_CURRENT_MA", 0.0) / 1000.0
+        if (self.idle_w or self.sleep_w) and sim.kernel != 'heap':
+            raise ValueError('Idle and sleep currents need the heap kernel')
+        self.max_bytes = max(int(params.MTU_BITS) // 8, params.ENERGY_PSDU_BYTES)
+        self.tx_tables = {level: self._table(current, params.TX_TURNAROUND_ENERGY_J)
+                          for level, current in params.TX_CURRENTS_MA.items()}
+        self._default_tx_table = self._table(self.DEFAULT_TX_CURRENT_MA, params.TX_TURNAROUND_ENERGY_J)
+        self.rx_table = self._table(params.RX_CURRENT, params.RX_TURNAROUND_ENERGY_J)
+
+    ############################
+    def _table(self, current_mA, overhead):
+        """Packet energies of a current for PSDU sizes 0..max_bytes."""
+        p = self.params
+        return [packet_energy(p.VOLTAGE, current_mA, n, p.DATARATE, overhead)
+                for n in range(self.max_bytes + 1)]
+
+    ############################
+    def tx_table(self, level):
+        """TX energy table (by PSDU bytes) of a TX power level."""
+        return self.tx_tables.get(level, self._default_tx_table)
+
+    ############################
+    def attach(self, node, level):
+        """Gives a node INITIAL_ENERGY_J and empty energy metrics.
+
+           Args:
+               node (Node): Node to account.
+               level (int): TX power level of the node.
+
+           Returns:
+
+        """
+        node.energy = self.params.INITIAL_ENERGY_J
+        node.energy_time = self.sim.now
+        node.drain_w = self.sleep_w if node.is_sleep else self.idle_w
+        node.death_event = None
+        node.death_at = None
+        node.tx_costs = self.tx_table(level)
+        node.tx_energy_consumed = 0.0  # Total TX energy consumed (J)
+        node.rx_energy_consumed = 0.0  # Total RX energy consumed (J)
+        node.idle_energy_consumed = 0.0  # Total idle and sleep energy consumed (J)
+        node.tx_packet_count = 0       # Number of packets transmitted
+        node.rx_packet_count = 0       # Number of packets received
+        self._schedule_death(node)
+
+    ############################
+    def _accrue(self, node):
+        """Adds the drain of a node since it was last touched."""
+        now = self.sim.now
+        if node.drain_w:
+            dE = node.drain_w * (now - node.energy_time)
+            node.energy -= dE
+            node.idle_energy_consumed += dE
+        node.energy_time = now
+
+    ############################
+    def level(self, node):
+        """Energy (J) of a node now."""
+        self._accrue(node)
+        return node.energy
+
+    ############################
+    def set_level(self, node, energy):
+        """Sets energy (J) of a node now."""
+        self._accrue(node)
+        node.energy = energy
+        self._schedule_death(node)
+
+    ############################
+    def consume_tx(self, node, n_bytes=None):
+        """Charges a node for one transmitted packet.
+
+           Args:
+               node (Node): Sender.
+               n_bytes (int): PSDU size, at most max_bytes. None uses ENERGY_PSDU_BYTES.
+
+           Returns:
+               bool: True if the node is depleted (energy <= MIN_ENERGY_J).
+        """
+        if n_bytes is None:
+            n_bytes = self.params.ENERGY_PSDU_BYTES
+        dE = node.tx_costs[n_bytes]
+        node.tx_energy_consumed += dE
+        node.tx_packet_count += 1
+        return self._consume(node, dE)
+
+    ############################
+    def consume_rx(self, node, n_bytes=None):
+        """Charges a node for one received packet.
+
+           Args:
+               node (Node): Receiver.
+               n_bytes (int): PSDU size, at most max_bytes. None uses ENERGY_PSDU_BYTES.
+
+           Returns:
+               bool: True if the node is depleted (energy <= MIN_ENERGY_J).
+        """
+        if n_bytes is None:
+            n_bytes = self.params.ENERGY_PSDU_BYTES
+        dE = self.rx_table[n_bytes]
+        node.rx_energy_consumed += dE
+        node.rx_packet_count += 1
+        return self._consume(node, dE)
+
+    ############################
+    def _consume(self, node, dE):
+        """Subtracts dE from a node and moves its predicted death."""
+        if node.drain_w:
+            self._accrue(node)
+            node.energy -= dE
+            self._schedule_death(node)
+        else:
+            node.energy -= dE
+        return node.energy <= self.min_energy
+
+    ############################
+    def set_sleeping(self, node, sleeping):
+        """Switches the drain of a node between sleep and idle power."""
+        if not hasattr(node, "energy"):
+            return  # not attached yet
+        drain_w = self.sleep_w if sleeping else self.idle_w
+        if drain_w != node.drain_w:
+            self._accrue(node)
+            node.drain_w = drain_w
+            self._schedule_death(node)
+
+    ############################
+    def _schedule_death(self, node):
+        """Schedules the time the drain takes a node to MIN_ENERGY_J, if it drains and is above it."""
+        if node.death_event is not None:
+            self.sim.cancel(node.death_event)
+            node.death_event = node.death_at = None
+        if node.drain_w and node.energy > self.min_energy:
+            delay = (node.energy - self.min_energy) / node.drain_w
+            node.death_at = self.sim.now + delay
+            node.death_event = self.sim.delayed_exec(delay, self._death_due, node, node.death_at)
+
+    ############################
+    def _death_due(self, node, at):
+        """Predicted death of a node. A moved prediction is skipped by its time."""
+        if at != node.death_at:
+            return
+        node.death_event = node.death_at = None
+        self._accrue(node)
+        node.on_energy_depleted()
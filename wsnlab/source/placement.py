@@ -0,0 +1,123 @@
+"""Vectorized node placement generators. Each function returns an (N,2) NumPy array of positions
+that can be given to Simulator.add_nodes().
+"""
+
+import math
+import numpy as np
+
+
+###########################################################
+def grid_jitter(number_of_nodes, cell_size, origin=(0, 0), scale=1, rng=None):
+    """Grid layout of create_network(). Node i is placed at (i / edge, i % edge) cells from origin,
+    where edge is ceil(sqrt(number_of_nodes)), and moved by a random jitter of at most cell_size / 3.
+
+       Args:
+           number_of_nodes (int): Number of positions.
+           cell_size (double): Cell size to place one node.
+           origin (Tuple(double,double)): Position of the first cell.
+           scale (double): Scale factor of the grid (config.SCALE). Jitter is not scaled.
+           rng (Generator or int): NumPy random generator or seed.
+
+       Returns:
+           ndarray: (N,2) array of positions.
+    """
+    rng = np.random.default_rng(rng)
+    edge = math.ceil(math.sqrt(number_of_nodes))
+    i = np.arange(number_of_nodes)
+    pos = np.empty((number_of_nodes, 2))
+    pos[:, 0] = origin[0] + scale * (i / edge) * cell_size
+    pos[:, 1] = origin[1] + scale * (i % edge) * cell_size
+    pos += rng.uniform(-cell_size / 3, cell_size / 3, size=(number_of_nodes, 2))
+    return pos
+
+
+###########################################################
+def random_uniform(number_of_nodes, terrain_size, origin=(0, 0), rng=None):
+    """Places nodes uniformly at random on the terrain.
+
+       Args:
+           number_of_nodes (int): Number of positions.
+           terrain_size (Tuple(double,double)): Width and height of the area.
+           origin (Tuple(double,double)): Lower corner of the area.
+           rng (Generator or int): NumPy random generator or seed.
+
+       Returns:
+           ndarray: (N,2) array of positions.
+    """
+    rng = np.random.default_rng(rng)
+    return np.asarray(origin, dtype=float) + rng.uniform(0, 1, size=(number_of_nodes, 2)) * terrain_size
+
+
+###########################################################
+def poisson_disk(number_of_nodes, terrain_size, min_dist, origin=(0, 0), rng=None, batch_size=1024,
+                 max_batches=None):
+    """Places nodes at random on the terrain so that no two nodes are closer than min_dist.
+    Candidates are thrown in batches and checked against a background grid with cells of
+    min_dist / sqrt(2), so each cell holds at most one node.
+
+       Args:
+           number_of_nodes (int): Number of positions.
+           terrain_size (Tuple(double,double)): Width and height of the area.
+           min_dist (double): Min distance between any two nodes.
+           origin (Tuple(double,double)): Lower corner of the area.
+           rng (Generator or int): NumPy random generator or seed.
+           batch_size (int): Number of candidates thrown at once.
+           max_batches (int): Max number of batches to throw. Default depends on number_of_nodes.
+
+       Returns:
+           ndarray: (N,2) array of positions.
+
+       Raises:
+           ValueError: If number_of_nodes nodes can not be placed with min_dist on the terrain.
+    """
+    rng = np.random.default_rng(rng)
+    width, height = terrain_size
+    cell = min_dist / math.sqrt(2)
+    cols, rows = int(math.ceil(width / cell)), int(math.ceil(height / cell))
+    # cell -> index of placed node, padded by 2 cells so the 5x5 block around any cell is valid
+    occupied = np.full((cols + 4, rows + 4), -1, dtype=np.int64)
+    points = np.empty((number_of_nodes, 2))
+    count = 0
+    offsets = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if (dx, dy) != (0, 0)]
+    if max_batches is None:
+        max_batches = 100 + 50 * number_of_nodes // batch_size
+
+    for _ in range(max_batches):
+        if count == number_of_nodes:
+            break
+        cand = rng.uniform(0, 1, size=(batch_size, 2)) * (width, height)
+        cx = np.minimum((cand[:, 0] // cell).astype(np.int64), cols - 1) + 2
+        cy = np.minimum((cand[:, 1] // cell).astype(np.int64), rows - 1) + 2
+
+        # reject candidates in an occupied cell or too close to a placed node
+        ok = occupied[cx, cy] < 0
+        for dx, dy in offsets:
+            other = occupied[cx + dx, cy + dy]
+            near = other >= 0
+            d2 = ((points[other[near]] - cand[near]) ** 2).sum(axis=1)
+            ok[np.flatnonzero(near)[d2 < min_dist * min_dist]] = False
+
+        # resolve conflicts inside the batch: the earlier candidate wins
+        idx = np.flatnonzero(ok)
+        if len(idx) == 0:
+            continue
+        batch = np.full(occupied.shape, -1, dtype=np.int64)
+        _, first = np.unique(cx[idx] * occupied.shape[1] + cy[idx], return_index=True)
+        idx = np.sort(idx[first])
+        batch[cx[idx], cy[idx]] = idx
+        keep = np.ones(len(idx), dtype=bool)
+        for dx, dy in offsets:
+            other = batch[cx[idx] + dx, cy[idx] + dy]
+            near = (other >= 0) & (other < idx)
+            d2 = ((cand[other[near]] - cand[idx[near]]) ** 2).sum(axis=1)
+            keep[np.flatnonzero(near)[d2 < min_dist * min_dist]] = False
+        idx = idx[keep][:number_of_nodes - count]
+
+        points[count:count + len(idx)] = cand[idx]
+        occupied[cx[idx], cy[idx]] = np.arange(count, count + len(idx))
+        count += len(idx)
+
+    if count < number_of_nodes:
+        raise ValueError('Could only place %d of %d nodes with min_dist %.2f on terrain %s'
+                         % (count, number_of_nodes, min_dist, terrain_size))
+    return points + origin
@@ -0,0 +1,252 @@
+"""Event profiler of a simulation. Counts scheduled and executed events by kind and keeps the wall
+time of their handlers (total and a log2 histogram) measured with time.perf_counter_ns().
+
+The kind of an event is the name of its callback and, when its first argument tells it, the timer
+name or packet type, e.g. 'on_timer_fired TIMER_HEART_BEAT' or 'on_receive TABLE_SHARE'. Methods
+called inside events, such as packet forwarding, can be timed too with instrument(). Their time is
+also part of the time of the event they run in. Time of the run that is not spent in any event is
+reported as 'scheduler'.
+
+The simulator only makes a Profiler when SIM_PROFILE is set. Otherwise no callback is wrapped and
+the kernel only checks for a missing profiler once per event.
+"""
+
+import csv
+from time import perf_counter_ns
+
+HIST_BUCKETS = 64  # bucket b holds handler times in [2**(b-1), 2**b) ns
+
+
+###########################################################
+def event_detail(args):
+    """Timer name or packet type of an event from its first argument, or ''.
+
+       Args:
+           args (Tuple): Arguments of the callback.
+
+       Returns:
+           string: Detail of the event kind.
+    """
+    if not args:
+        return ''
+    first = args[0]
+    if isinstance(first, str):
+        return first  # on_timer_fired(name)
+    get = getattr(first, 'get', None)
+    if get is not None:
+        return get('type') or ''  # packet
+    name = getattr(first, 'name', None)
+    return name if isinstance(name, str) else ''  # TimerHandle
+
+
+###########################################################
+class Timed:
+    """Callable that times every call of a function as an event kind of a Profiler. It replaces a
+    method on one object, see Profiler.instrument().
+
+       Attributes:
+           profiler (Profiler): Profiler to record to.
+           name (string): Name of the kind, the packet type of the first argument is added to it.
+           func (Function): Timed function.
+    """
+    __slots__ = ('profiler', 'name', 'func')
+
+    ############################
+    def __init__(self, profiler, name, func):
+        self.profiler = profiler
+        self.name = name
+        self.func = func
+
+    ############################
+    def __call__(self, *args, **kwargs):
+        return self.profiler.measure((self.name, event_detail(args)), self.func, args, kwargs)
+
+
+###########################################################
+class Profiler:
+    """Event counters and handler wall times of a simulation run.
+
+       Attributes:
+           stats (Dict of Tuple to List): [scheduled, executed, total ns, max ns, histogram] by
+            (callback name, detail) kind.
+           event_ns (int): Wall time spent in events.
+           run_ns (int): Wall time of the run, measured by the simulator.
+    """
+
+    ############################
+    def __init__(self):
+        """Constructor for Profiler class.
+
+           Args:
+
+           Returns:
+               Profiler: Created Profiler object.
+        """
+        self.stats = {}
+        self.event_ns = 0
+        self.run_ns = 0
+
+    ############################
+    def _entry(self, kind):
+        """Stats of a kind, created on first use."""
+        entry = self.stats.get(kind)
+        if entry is None:
+            entry = self.stats[kind] = [0, 0, 0, 0, [0] * HIST_BUCKETS]
+        return entry
+
+    ############################
+    def scheduled(self, func, args):
+        """Counts an event scheduled with delayed_exec()."""
+        self._entry((getattr(func, '__name__', type(func).__name__), event_detail(args)))[0] += 1
+
+    ############################
+    def call(self, func, args, kwargs):
+        """Runs the callback of an event and records its wall time.
+
+           Args:
+               func (Function): Callback.
+               args (Tuple): Its args.
+               kwargs (Dict): Its key word args.
+
+           Returns:
+               object: Return value of func.
+        """
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter_ns() - start
+            self.event_ns += elapsed
+            self._record(self._entry((getattr(func, '__name__', type(func).__name__), event_detail(args))),
+                         elapsed)
+
+    ############################
+    def measure(self, kind, func, args, kwargs):
+        """Runs a function inside an event and records its wall time under kind."""
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._record(self._entry(kind), perf_counter_ns() - start)
+
+    ############################
+    def _record(self, entry, elapsed):
+        """Adds one execution of elapsed ns to the stats of a kind."""
+        entry[1] += 1
+        entry[2] += elapsed
+        if elapsed > entry[3]:
+            entry[3] = elapsed
+        entry[4][min(elapsed.bit_length(), HIST_BUCKETS - 1)] += 1
+
+    ############################
+    def instrument(self, obj, method_name):
+        """Times every call of a method of one object, e.g. route_and_forward_package of a node.
+
+           Args:
+               obj (object): Object whose method is replaced by a Timed wrapper.
+               method_name (string): Name of the method, also used as the name of the kind.
+
+           Returns:
+
+        """
+        setattr(obj, method_name, Timed(self, method_name, getattr(obj, method_name)))
+
+    ############################
+    @staticmethod
+    def _percentile(hist, count, q, peak):
+        """Upper bound (ns) of the histogram bucket of the q quantile, at most the max time."""
+        rank = q * count
+        seen = 0
+        for bucket, n in enumerate(hist):
+            seen += n
+            if n and seen >= rank:
+                return min(1 << bucket, peak)
+        return 0
+
+    ############################
+    def rows(self):
+        """Table of the kinds sorted by total wall time, plus a 'scheduler' row for the run time
+        outside of events.
+
+           Args:
+
+           Returns:
+               List of Dicts: kind, scheduled, executed, total_ms, share_pct (of run time), mean_us,
+               p50_us, p90_us, p99_us and max_us of every kind.
+        """
+        run_ns = self.run_ns or self.event_ns or 1
+        rows = []
+        for (name, detail), (scheduled, executed, total, peak, hist) in self.stats.items():
+            rows.append({
+                "kind": f"{name} {detail}" if detail else name,
+                "scheduled": scheduled,
+                "executed": executed,
+                "total_ms": total / 1e6,
+                "share_pct": total * 100.0 / run_ns,
+                "mean_us": total / executed / 1e3 if executed else 0.0,
+                "p50_us": self._percentile(hist, executed, 0.5, peak) / 1e3,
+                "p90_us": self._percentile(hist, executed, 0.9, peak) / 1e3,
+                "p99_us": self._percentile(hist, executed, 0.99, peak) / 1e3,
+                "max_us": peak / 1e3,
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        if self.run_ns:
+            idle = max(self.run_ns - self.event_ns, 0)
+            rows.append({"kind": "scheduler", "scheduled": "", "executed": "", "total_ms": idle / 1e6,
+                         "share_pct": idle * 100.0 / run_ns, "mean_us": "", "p50_us": "", "p90_us": "",
+                         "p99_us": "", "max_us": ""})
+        return rows
+
+    ############################
+    def write_csv(self, path, hist_path=None):
+        """Writes rows() as a CSV table and, if hist_path is given, the histograms as
+        (kind, bucket upper bound ns, count) rows.
+
+           Args:
+               path (string): Table file.
+               hist_path (string): Histogram file, or None.
+
+           Returns:
+
+        """
+        rows = self.rows()
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["kind"])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: f"{v:.3f}" if isinstance(v, float) else v for k, v in row.items()})
+        if hist_path is None:
+            return
+        with open(hist_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "bucket_ns", "count"])
+            for (name, detail), entry in sorted(self.stats.items()):
+                for bucket, n in enumerate(entry[4]):
+                    if n:
+                        writer.writerow([f"{name} {detail}" if detail else name, 1 << bucket, n])
+
+
+###########################################################
+def format_table(rows, limit=None):
+    """Formats rows() of a Profiler as a text table.
+
+       Args:
+           rows (List of Dicts): Rows of Profiler.rows().
+           limit (int): Max number of rows, None for all. The scheduler row is always kept.
+
+       Returns:
+           string: Table.
+    """
+    shown = rows if limit is None or len(rows) <= limit else rows[:limit - 1] + rows[-1:]
+    width = max([len(row["kind"]) for row in shown] + [4])
+    lines = [f"{'kind':<{width}} {'scheduled':>10} {'executed':>10} {'total ms':>10} {'share':>6} "
+             f"{'mean us':>9} {'p50 us':>8} {'p99 us':>8} {'max us':>10}"]
+    for row in shown:
+        if row["kind"] == "scheduler":
+            lines.append(f"{row['kind']:<{width}} {'':>10} {'':>10} {row['total_ms']:>10.1f} "
+                         f"{row['share_pct']:>5.1f}%")
+            continue
+        lines.append(f"{row['kind']:<{width}} {row['scheduled']:>10} {row['executed']:>10} "
+                     f"{row['total_ms']:>10.1f} {row['share_pct']:>5.1f}% {row['mean_us']:>9.1f} "
+                     f"{row['p50_us']:>8.1f} {row['p99_us']:>8.1f} {row['max_us']:>10.1f}")
+    return "\n".join(lines)
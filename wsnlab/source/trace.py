@@ -0,0 +1,543 @@
+"""Buffered trace writer. Keeps one open sink per trace file, buffers rows in memory and writes
+them in batches on a background thread, so logging an event does not cost an open/close and a
+write syscall.
+
+Traces are written as CSV, or in columnar form when the writer format is 'npy': every column
+is a fixed-width NumPy array in its own .npy file under <name>.cols/ (or all columns in one
+compressed <name>.npz). String columns are stored as int32 codes plus a labels array and path
+columns (lists of node ids) as a flat int32 array plus int64 offsets. export_csv() converts a
+columnar table back to the CSV the 'csv' format would have written.
+
+TraceWriter.checkpoint() returns the size of every file, TraceWriter.resume() reopens the files
+cut back to those sizes, so a run restored from a checkpoint appends to its own trace files.
+"""
+
+import atexit
+import csv
+import json
+import os
+import queue
+import shutil
+import struct
+import threading
+
+import numpy as np
+
+# column kinds of columnar tables
+INT = 'int'  # int64, missing (None or '') is -1
+FLOAT = 'float'  # float64, missing is NaN
+STR = 'str'  # int32 code into labels, missing is ''
+PATH = 'path'  # list of node ids as flat int32 values and int64 offsets
+
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_HEADER_LEN = 118  # magic (8) + length (2) + header = 128 bytes
+
+
+###########################################################
+def columnar_path(path, compress=False):
+    """Returns columnar table path of a CSV trace file name.
+
+       Args:
+           path (string): CSV file path such as 'packet_log.csv'.
+           compress (bool): If True, path of compressed .npz file, otherwise of .cols directory.
+
+       Returns:
+           string: Columnar table path.
+    """
+    stem = path[:-4] if path.endswith('.csv') else path
+    return stem + ('.npz' if compress else '.cols')
+
+
+###########################################################
+class _NpyAppender:
+    """1-D .npy file that grows by appending arrays. The header has a fixed size, so it is rewritten
+    in place with the current length on flush() and the file is a valid .npy file after each flush.
+    """
+
+    ############################
+    def __init__(self, path, dtype, length=None):
+        """Creates the file, or reopens it cut back to length values if length is given."""
+        self.dtype = np.dtype(dtype)
+        if length is None:
+            self.length = 0
+            self.file = open(path, 'wb')
+            self._write_header()
+        else:
+            self.length = length
+            self.file = open(path, 'r+b')
+            self.file.truncate(len(_NPY_MAGIC) + 2 + _NPY_HEADER_LEN + length * self.dtype.itemsize)
+            self.flush()
+
+    ############################
+    def _write_header(self):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (self.dtype.str, self.length)
+        header = header.ljust(_NPY_HEADER_LEN - 1) + '\n'
+        self.file.write(_NPY_MAGIC + struct.pack('<H', _NPY_HEADER_LEN) + header.encode('latin1'))
+
+    ############################
+    def append(self, values):
+        arr = np.asarray(values, dtype=self.dtype)
+        arr.tofile(self.file)
+        self.length += len(arr)
+
+    ############################
+    def flush(self):
+        self.file.seek(0)
+        self._write_header()
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+
+    ############################
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+###########################################################
+class CsvSink:
+    """Writes rows to a CSV file.
+
+       Attributes:
+           path (string): File path.
+    """
+
+    ############################
+    def __init__(self, path, header, offset=None):
+        """Constructor for CsvSink class. Creates (or truncates) the file and writes its header.
+        If offset is given, the existing file is cut back to offset bytes and appended to instead.
+
+           Args:
+               path (string): File path.
+               header (List of strings): Column names.
+               offset (int): File size returned by checkpoint().
+
+           Returns:
+               CsvSink: Created CsvSink object.
+        """
+        self.path = path
+        self.header = list(header)
+        if offset is None:
+            self.file = open(path, 'w', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(header)
+        else:
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+            self.file = open(path, 'a', newline='')
+            self.writer = csv.writer(self.file)
+
+    ############################
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    ############################
+    def checkpoint(self):
+        """Returns what resuming the file needs. Should be called after flush()."""
+        return {'kind': 'csv', 'header': self.header, 'offset': self.file.tell()}
+
+    ############################
+    def flush(self):
+        self.file.flush()
+
+    ############################
+    def close(self):
+        self.file.close()
+
+
+###########################################################
+class ColumnarSink:
+    """Writes rows to a columnar table. Columns are appended to .npy files under path (a .cols
+    directory). If compress is True, they are kept in a parts directory next to path and put into
+    the compressed .npz file path on every flush.
+
+       Attributes:
+           path (string): Table path.
+           header (List of strings): Column names.
+           kinds (List of strings): Kind of each column (INT, FLOAT, STR or PATH).
+           formats (Dict of string to string): Format spec of FLOAT columns in CSV export, e.g. '.6f'.
+           compress (bool): If True, table is a compressed .npz file.
+    """
+
+    ############################
+    def __init__(self, path, header, kinds, formats=None, compress=False, resume=None):
+        """Constructor for ColumnarSink class.
+
+           Args:
+               path (string): Table path, see columnar_path().
+               header (List of strings): Column names.
+               kinds (List of strings): Kind of each column.
+               formats (Dict of string to string): Format spec of FLOAT columns in CSV export.
+               compress (bool): If True, table is a compressed .npz file.
+               resume (Dict): State returned by checkpoint(). If given, the existing columns are cut back
+                to the lengths in it and appended to instead of being created.
+
+           Returns:
+               ColumnarSink: Created ColumnarSink object.
+        """
+        self.path = path
+        self.header = list(header)
+        self.kinds = list(kinds)
+        self.formats = dict(formats or {})
+        self.compress = compress
+        self.dir = path + '.parts' if compress else path
+        if resume is None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir)
+        lengths = resume['lengths'] if resume is not None else [None] * len(self.header)
+        self.columns = []
+        self.labels = {}
+        for name, kind, length in zip(self.header, self.kinds, lengths):
+            if kind == PATH:
+                flat_length, offsets_length = length or (None, None)
+                offsets = _NpyAppender(os.path.join(self.dir, name + '_offsets.npy'), np.int64, offsets_length)
+                if offsets_length is None:
+                    offsets.append([0])
+                self.columns.append((_NpyAppender(os.path.join(self.dir, name + '.npy'), np.int32, flat_length),
+                                     offsets))
+            else:
+                dtype = {INT: np.int64, FLOAT: np.float64, STR: np.int32}[kind]
+                self.columns.append(_NpyAppender(os.path.join(self.dir, name + '.npy'), dtype, length))
+                if kind == STR:
+                    labels = resume['labels'][name] if resume is not None else []
+                    self.labels[name] = {label: code for code, label in enumerate(labels)}
+        self.meta = json.dumps({'header': self.header, 'kinds': self.kinds, 'formats': self.formats})
+        with open(os.path.join(self.dir, 'meta.json'), 'w') as f:
+            f.write(self.meta)
+
+    ############################
+    def write_rows(self, rows):
+        """Appends rows to the columns.
+
+           Args:
+               rows (List of Lists): Rows in header order.
+
+           Returns:
+        """
+        for i, (name, kind) in enumerate(zip(self.header, self.kinds)):
+            values = [row[i] for row in rows]
+            column = self.columns[i]
+            if kind == INT:
+                column.append([-1 if v is None or v == '' else v for v in values])
+            elif kind == FLOAT:
+                column.append([np.nan if v is None or v == '' else float(v) for v in values])
+            elif kind == STR:
+                codes = self.labels[name]
+                column.append([codes.setdefault('' if v is None else str(v), len(codes)) for v in values])
+            else:
+                flat, offsets = column
+                ids, ends = [], []
+                for v in values:
+                    ids.extend(v or ())
+                    ends.append(len(ids))
+                offsets.append(np.asarray(ends, dtype=np.int64) + flat.length)
+                flat.append(ids)
+
+    ############################
+    def flush(self):
+        """Makes the files on disk consistent with the rows written so far.
+
+           Args:
+
+           Returns:
+        """
+        for column in self.columns:
+            for appender in column if isinstance(column, tuple) else (column,):
+                appender.flush()
+        for name, codes in self.labels.items():
+            np.save(os.path.join(self.dir, name + '_labels.npy'), np.array(list(codes), dtype=str))
+        if self.compress:
+            arrays = {os.path.splitext(f)[0]: np.load(os.path.join(self.dir, f))
+                      for f in os.listdir(self.dir) if f.endswith('.npy')}
+            np.savez_compressed(self.path, __meta__=np.array(self.meta), **arrays)
+
+    ############################
+    def checkpoint(self):
+        """Returns what resuming the table needs. Should be called after flush()."""
+        lengths = [tuple(a.length for a in column) if isinstance(column, tuple) else column.length
+                   for column in self.columns]
+        return {'kind': 'npy', 'header': self.header, 'kinds': self.kinds, 'formats': self.formats,
+                'lengths': lengths, 'labels': {name: list(codes) for name, codes in self.labels.items()}}
+
+    ############################
+    def close(self):
+        self.flush()
+        for column in self.columns:
+            for appender in column if isinstance(column, tuple) else (column,):
+                appender.close()
+        if self.compress:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+
+###########################################################
+def load_columns(path, mmap=True):
+    """Loads a columnar table.
+
+       Args:
+           path (string): Table path (.cols directory or .npz file).
+           mmap (bool): If True, .npy columns are memory-mapped instead of read.
+
+       Returns:
+           Dict: 'meta' (header, kinds, formats) and 'arrays' (Dict of array name to array). A STR column
+            x has arrays x (codes) and x_labels, a PATH column x has arrays x (flat) and x_offsets.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        meta = json.loads(str(arrays.pop('__meta__')))
+    else:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {os.path.splitext(f)[0]: np.load(os.path.join(path, f), mmap_mode='r' if mmap else None)
+                  for f in os.listdir(path) if f.endswith('.npy')}
+    return {'meta': meta, 'arrays': arrays}
+
+
+###########################################################
+def export_csv(path, csv_path):
+    """Writes a columnar table as CSV, the same way the 'csv' trace format writes it.
+    Paths are joined with ' -> ' like in packet_log.csv. Integral values logged into FLOAT columns
+    are written as floats (550.0 instead of 550).
+
+       Args:
+           path (string): Table path (.cols directory or .npz file).
+           csv_path (string): CSV file path.
+
+       Returns:
+    """
+    table = load_columns(path)
+    meta, arrays = table['meta'], table['arrays']
+    columns = []
+    for name, kind in zip(meta['header'], meta['kinds']):
+        values = arrays[name]
+        if kind == INT:
+            columns.append(['' if v == -1 else v for v in values.tolist()])
+        elif kind == FLOAT:
+            fmt = meta['formats'].get(name)
+            columns.append(['' if v != v else (format(v, fmt) if fmt else v) for v in values.tolist()])
+        elif kind == STR:
+            labels = arrays[name + '_labels'].tolist()
+            columns.append([labels[c] for c in values.tolist()])
+        else:
+            flat = [str(v) for v in values.tolist()]
+            offsets = arrays[name + '_offsets'].tolist()
+            columns.append([' -> '.join(flat[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)])
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(meta['header'])
+        writer.writerows(zip(*columns))
+
+
+###########################################################
+class TraceWriter:
+    """Writes rows to trace files in batches.
+
+    Rows of a file are kept in a buffer until flush_size rows are collected. The full buffer is then
+    handed to the writer thread (or written at once if background is False). flush() writes all
+    buffered rows and waits until they are on disk. Rows are converted when they are written, so
+    they should only hold values that do not change afterwards (numbers, strings, Addr, tuples).
+
+       Attributes:
+           flush_size (int): Number of buffered rows of a file that triggers writing them.
+           background (bool): If True, rows are written on a background thread.
+           format (string): 'csv', or 'npy' to write files opened with column kinds as columnar tables.
+           compress (bool): If True, columnar tables are written as compressed .npz files.
+           directory (string): Directory the trace file paths are relative to.
+           sinks (Dict of string to CsvSink or ColumnarSink): Sink of each file by CSV file path.
+           buffers (Dict of string to List): Rows of each file waiting to be written.
+    """
+
+    ############################
+    def __init__(self, flush_size=1000, background=True, format='csv', compress=False, directory='.'):
+        """Constructor for TraceWriter class.
+
+           Args:
+               flush_size (int): Number of buffered rows of a file that triggers writing them.
+               background (bool): If True, rows are written on a background thread.
+               format (string): 'csv' or 'npy'.
+               compress (bool): If True, columnar tables are written as compressed .npz files.
+               directory (string): Directory the trace file paths are relative to.
+
+           Returns:
+               TraceWriter: Created TraceWriter object.
+        """
+        if format not in ('csv', 'npy'):
+            raise ValueError('Unknown trace format: %s' % format)
+        self.flush_size = max(1, flush_size)
+        self.background = background
+        self.format = format
+        self.compress = compress
+        self.directory = directory
+        self.sinks = {}
+        self.buffers = {}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        atexit.register(self.close)
+
+    ############################
+    def open(self, path, header, kinds=None, formats=None):
+        """Creates (or truncates) a trace file. A file opened before with the same path is flushed
+        and closed first. If format is 'npy' and kinds are given, the file is a columnar table at
+        columnar_path(path), otherwise a CSV file at path. Both are placed under directory.
+
+           Args:
+               path (string): CSV file path relative to directory. It is also the key of the file in write().
+               header (List of strings): Column names.
+               kinds (List of strings): Kind of each column for columnar tables.
+               formats (Dict of string to string): Format spec of FLOAT columns in CSV export.
+
+           Returns:
+        """
+        if path in self.sinks:
+            self.flush()
+            with self._lock:
+                self.sinks.pop(path).close()
+                self.buffers.pop(path, None)
+        file_path = os.path.join(self.directory, path)
+        columnar = self.format == 'npy' and kinds is not None
+        # columnar tables of an earlier run in another format would be loaded instead of the new file
+        shutil.rmtree(columnar_path(file_path, False), ignore_errors=True)
+        if not (columnar and self.compress) and os.path.exists(columnar_path(file_path, True)):
+            os.remove(columnar_path(file_path, True))
+        if columnar:
+            sink = ColumnarSink(columnar_path(file_path, self.compress), header, kinds, formats, self.compress)
+        else:
+            sink = CsvSink(file_path, header)
+        with self._lock:
+            self.sinks[path] = sink
+            self.buffers[path] = []
+
+    ############################
+    def checkpoint(self):
+        """Writes all buffered rows and returns the settings of the writer and the size of every file.
+
+           Args:
+
+           Returns:
+               Dict: State to give to resume().
+        """
+        self.flush()
+        with self._lock:
+            files = {path: sink.checkpoint() for path, sink in self.sinks.items()}
+        return {'flush_size': self.flush_size, 'background': self.background, 'format': self.format,
+                'compress': self.compress, 'directory': self.directory, 'files': files}
+
+    ############################
+    @classmethod
+    def resume(cls, state):
+        """Creates a writer from a checkpoint() state. Its files are cut back to their sizes at the
+        checkpoint (dropping rows written after it) and new rows are appended to them.
+
+           Args:
+               state (Dict): State returned by checkpoint().
+
+           Returns:
+               TraceWriter: Created TraceWriter object.
+        """
+        writer = cls(state['flush_size'], state['background'], state['format'], state['compress'],
+                     state['directory'])
+        for path, sink_state in state['files'].items():
+            file_path = os.path.join(writer.directory, path)
+            if sink_state['kind'] == 'npy':
+                sink = ColumnarSink(columnar_path(file_path, writer.compress), sink_state['header'],
+                                    sink_state['kinds'], sink_state['formats'], writer.compress, sink_state)
+            else:
+                sink = CsvSink(file_path, sink_state['header'], sink_state['offset'])
+            writer.sinks[path] = sink
+            writer.buffers[path] = []
+        return writer
+
+    ############################
+    def is_columnar(self, path):
+        """Checks if an opened file is written as a columnar table.
+
+           Args:
+               path (string): CSV file path given to open().
+
+           Returns:
+               bool: True if file is a columnar table.
+        """
+        return isinstance(self.sinks.get(path), ColumnarSink)
+
+    ############################
+    def write(self, path, row):
+        """Adds a row to a trace file. File should be opened with open() before.
+
+           Args:
+               path (string): CSV file path given to open().
+               row (List): Row values.
+
+           Returns:
+        """
+        buf = self.buffers[path]
+        buf.append(row)
+        if len(buf) >= self.flush_size:
+            with self._lock:
+                self.buffers[path] = []
+                self._submit(path, buf)
+
+    ############################
+    def flush(self):
+        """Writes all buffered rows and waits until they are written to disk.
+
+           Args:
+
+           Returns:
+        """
+        with self._lock:
+            for path, buf in self.buffers.items():
+                if buf:
+                    self.buffers[path] = []
+                    self._submit(path, buf)
+        if self._queue is not None:
+            self._queue.join()
+        with self._lock:
+            for sink in self.sinks.values():
+                sink.flush()
+
+    ############################
+    def close(self):
+        """Flushes all rows, stops the writer thread and closes all files.
+
+           Args:
+
+           Returns:
+        """
+        self.flush()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            self._queue = None
+        with self._lock:
+            for sink in self.sinks.values():
+                sink.close()
+            self.sinks.clear()
+            self.buffers.clear()
+        atexit.unregister(self.close)
+
+    ############################
+    def _submit(self, path, rows):
+        """Writes rows now or hands them to the writer thread. Called with the lock held."""
+        sink = self.sinks[path]
+        if not self.background:
+            sink.write_rows(rows)
+            return
+        if self._thread is None:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._work, name='TraceWriter', daemon=True)
+            self._thread.start()
+        self._queue.put((sink, rows))
+
+    ############################
+    def _work(self):
+        """Writer thread loop. Writes batches in order until it gets None."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                sink, rows = item
+                sink.write_rows(rows)
+            finally:
+                self._queue.task_done()
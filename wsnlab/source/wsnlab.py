@@ -3,36 +3,67 @@ Based on wsnsimpy library. Timers, Network address and Sleep mode are included b
 """
 
 import bisect
+import gc
+import heapq
 import inspect
+import math
+import os
+import pickle
 import random
+import time
+from types import GeneratorType
+import numpy as np
 import simpy
 from simpy.util import start_delayed
 from source import config
+from source import profiler
+from source import trace
 
 ###########################################################
 
 
 class Addr:
-    """Use for a network address which has two parts
+    """Use for a network address which has two parts. Addr objects are immutable and interned:
+    Addr(f, l) returns the same object for the same parts, so equality is mostly an identity check
+    and Addr objects can be used as dict keys and set members.
 
        Attributes:
-           f (int): First part of the address.
-           l (int): Last part of the address.
+           net_addr (int): First part of the address.
+           node_addr (int): Last part of the address.
     """
+    __slots__ = ('net_addr', 'node_addr', '_hash')
+    _cache = {}
 
     ############################
-    def __init__(self, net_addr, node_addr):
-        """Constructor for Addr class.
+    def __new__(cls, net_addr, node_addr):
+        """Constructor for Addr class. Returns the cached object if the address was created before.
 
            Args:
-               f (int): First part of the address.
-               l (int): Last part of the address.
+               net_addr (int): First part of the address.
+               node_addr (int): Last part of the address.
 
            Returns:
-               Addr: Created Addr object.
+               Addr: Addr object.
         """
-        self.net_addr = net_addr
-        self.node_addr = node_addr
+        key = (net_addr, node_addr)
+        addr = cls._cache.get(key)
+        if addr is None:
+            addr = object.__new__(cls)
+            object.__setattr__(addr, 'net_addr', net_addr)
+            object.__setattr__(addr, 'node_addr', node_addr)
+            object.__setattr__(addr, '_hash', hash(key))
+            # setdefault keeps the object of a thread that interned the same address first
+            addr = cls._cache.setdefault(key, addr)
+        return addr
+
+    ############################
+    def __setattr__(self, name, value):
+        raise AttributeError('Addr is immutable')
+
+    ############################
+    def __reduce__(self):
+        """Pickles Addr so that it is interned again when loaded."""
+        return Addr, (self.net_addr, self.node_addr)
 
     ############################
     def __repr__(self):
@@ -45,6 +76,10 @@ class Addr:
         """
         return '[%d,%d]' % (self.net_addr, self.node_addr)
 
+    ############################
+    def __hash__(self):
+        return self._hash
+
     ############################
     def __eq__(self, other):
         """ == operator function for Addr objects.
@@ -55,14 +90,12 @@ class Addr:
            Returns:
                bool: returns True if the objects are equal, otherwise False.
         """
+        if self is other:
+            return True
         # Handle None comparison safely
-        if other is None:
-            return False
         if not isinstance(other, Addr):
             return False
-        if self.net_addr == other.net_addr and self.node_addr == other.node_addr:
-            return True
-        return False
+        return self.net_addr == other.net_addr and self.node_addr == other.node_addr
 
     ############################
     def is_equal(self, other):
@@ -74,9 +107,7 @@ class Addr:
            Returns:
                bool: returns True if the objects are equal, otherwise False.
         """
-        if self.net_addr == other.net_addr and self.node_addr == other.node_addr:
-            return True
-        return False
+        return self is other or (self.net_addr == other.net_addr and self.node_addr == other.node_addr)
 
 
 BROADCAST_ADDR = Addr(config.BROADCAST_NET_ADDR, config.BROADCAST_NODE_ADDR)
@@ -84,6 +115,257 @@ BROADCAST_ADDR = Addr(config.BROADCAST_NET_ADDR, config.BROADCAST_NODE_ADDR)
 """
 
 
+class _Missing:
+    """Type of the sentinel of unset Packet fields. It is pickled by name, so it stays the same object."""
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_MISSING'
+
+
+_MISSING = _Missing()
+
+
+###########################################################
+class Packet:
+    """Network package with a fixed header kept in slots and a lazily created payload dict.
+    Header fields are type, src, dest, next_hop, pkt_id, creation_time and hop_count; 'source' is an
+    alias of src. Any other key goes to the payload. Path (ids of nodes that sent the package) is
+    kept apart from the payload.
+
+    copy() is O(1): path and payload are shared with the copy and only copied by the first of them
+    that changes them, so a forwarder can set next_hop or extend the path without touching the
+    package other receivers got. Unset header fields hold a private sentinel, use the dict
+    accessors (pck['type'], pck.get(), 'next_hop' in pck) to read them.
+
+       Attributes:
+           type (string): Package type.
+           src (Addr): Source address.
+           dest (Addr): Destination address.
+           next_hop (Addr): Next hop address.
+           pkt_id (int): Package id given by Node.send().
+           creation_time (double): Time package is first sent.
+           hop_count (int): Hop count.
+    """
+    HEADER = ('type', 'src', 'dest', 'next_hop', 'pkt_id', 'creation_time', 'hop_count')
+    KEYS = {'type': 'type', 'src': 'src', 'source': 'src', 'dest': 'dest', 'next_hop': 'next_hop',
+            'pkt_id': 'pkt_id', 'creation_time': 'creation_time', 'hop_count': 'hop_count'}
+    __slots__ = HEADER + ('_path', '_payload', '_shared_path', '_shared_payload')
+
+    ############################
+    def __init__(self, fields=None, **kwargs):
+        """Constructor for Packet class.
+
+           Args:
+               fields (Dict): Initial fields of package.
+               kwargs: Initial fields of package.
+
+           Returns:
+               Packet: Created Packet object.
+        """
+        self.type = self.src = self.dest = self.next_hop = _MISSING
+        self.pkt_id = self.creation_time = self.hop_count = _MISSING
+        self._path = _MISSING
+        self._payload = None
+        self._shared_path = self._shared_payload = False
+        if fields:
+            for key, value in fields.items():
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    ############################
+    def copy(self):
+        """Returns a copy of package sharing path and payload until one of them changes.
+
+           Args:
+
+           Returns:
+               Packet: Copy of package.
+        """
+        cpy = Packet.__new__(Packet)
+        cpy.type, cpy.src, cpy.dest, cpy.next_hop = self.type, self.src, self.dest, self.next_hop
+        cpy.pkt_id, cpy.creation_time, cpy.hop_count = self.pkt_id, self.creation_time, self.hop_count
+        cpy._path, cpy._payload = self._path, self._payload
+        self._shared_path = cpy._shared_path = self._path is not _MISSING
+        self._shared_payload = cpy._shared_payload = self._payload is not None
+        return cpy
+
+    ############################
+    def append_path(self, node_id):
+        """Appends a node id to path, copying path first if it is shared.
+
+           Args:
+               node_id (int): Id of node.
+
+           Returns:
+        """
+        if self._path is _MISSING:
+            self._path = [node_id]
+        elif self._shared_path:
+            self._path = self._path + [node_id]
+            self._shared_path = False
+        else:
+            self._path.append(node_id)
+
+    ############################
+    def __getitem__(self, key):
+        """Returns value of a header field, path or payload key. Returned path should not be changed.
+
+           Args:
+               key (string): Field name.
+
+           Returns:
+               object: Value of field.
+
+           Raises:
+               KeyError: If field is not set.
+        """
+        slot = Packet.KEYS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+        elif key == 'path':
+            value = self._path
+        elif self._payload is not None:
+            return self._payload[key]
+        else:
+            raise KeyError(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    ############################
+    def __setitem__(self, key, value):
+        """Sets value of a header field, path or payload key. Payload is copied first if it is shared.
+
+           Args:
+               key (string): Field name.
+               value (object): Value of field.
+
+           Returns:
+        """
+        slot = Packet.KEYS.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+        elif key == 'path':
+            self._path = value
+            self._shared_path = False
+        else:
+            if self._payload is None:
+                self._payload = {}
+            elif self._shared_payload:
+                self._payload = dict(self._payload)
+                self._shared_payload = False
+            self._payload[key] = value
+
+    ############################
+    def __contains__(self, key):
+        """Checks if a field is set.
+
+           Args:
+               key (string): Field name.
+
+           Returns:
+               bool: True if field is set.
+        """
+        slot = Packet.KEYS.get(key)
+        if slot is not None:
+            return getattr(self, slot) is not _MISSING
+        if key == 'path':
+            return self._path is not _MISSING
+        return self._payload is not None and key in self._payload
+
+    ############################
+    def get(self, key, default=None):
+        """Returns value of a field if it is set, else default.
+
+           Args:
+               key (string): Field name.
+               default (object): Value to return if field is not set.
+
+           Returns:
+               object: Value of field or default.
+        """
+        slot = Packet.KEYS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+        elif key == 'path':
+            value = self._path
+        elif self._payload is not None:
+            return self._payload.get(key, default)
+        else:
+            return default
+        return default if value is _MISSING else value
+
+    ############################
+    def setdefault(self, key, default=None):
+        """Sets field to default if it is not set and returns its value.
+
+           Args:
+               key (string): Field name.
+               default (object): Value to set if field is not set.
+
+           Returns:
+               object: Value of field.
+        """
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    ############################
+    def keys(self):
+        """Returns names of set fields. Header fields come first, src is named 'src'.
+
+           Args:
+
+           Returns:
+               List of strings: Field names.
+        """
+        keys = [name for name in Packet.HEADER if getattr(self, name) is not _MISSING]
+        if self._path is not _MISSING:
+            keys.append('path')
+        if self._payload is not None:
+            keys.extend(self._payload)
+        return keys
+
+    ############################
+    def items(self):
+        """Returns set fields as (name, value) pairs.
+
+           Args:
+
+           Returns:
+               List of Tuple(string,object): Fields.
+        """
+        return [(key, self[key]) for key in self.keys()]
+
+    ############################
+    def __iter__(self):
+        return iter(self.keys())
+
+    ############################
+    def to_dict(self):
+        """Returns set fields as a new dict.
+
+           Args:
+
+           Returns:
+               Dict: Fields.
+        """
+        return dict(self.items())
+
+    ############################
+    def __repr__(self):
+        """Representation method of Packet.
+
+           Args:
+
+           Returns:
+               string: represents Packet object as a string.
+        """
+        return 'Packet(%r)' % self.to_dict()
+
+
 ###########################################################
 def ensure_generator(env, func, *args, **kwargs):
     '''
@@ -111,7 +393,200 @@ def distance(pos1, pos2):
        Returns:
            double: returns the distance between two positions.
     """
-    return ((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2) ** 0.5
+    dx = pos1[0] - pos2[0]
+    dy = pos1[1] - pos2[1]
+    return math.sqrt(dx * dx + dy * dy)
+
+
+###########################################################
+def pairs_within(points, radius):
+    """Finds every ordered pair of positions within a given distance in one batched NumPy pass.
+    Positions are binned into cells of radius size and only pairs in adjacent cells are compared.
+
+       Args:
+           points (ndarray): (N,2) array of positions.
+           radius (double): Max distance of a pair.
+
+       Returns:
+           Tuple(ndarray,ndarray,ndarray): Indexes i and j and distances of the pairs. Both (i,j) and (j,i) are included.
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    cells = np.floor(points / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    rows = cells[:, 1].max() + 2
+    keys = cells[:, 0] * rows + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    all_i, all_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            other = keys + dx * rows + dy
+            lo = np.searchsorted(sorted_keys, other, 'left')
+            cnt = np.searchsorted(sorted_keys, other, 'right') - lo
+            total = cnt.sum()
+            # index of each pair inside the run of its cell, shifted to the start of the run
+            run_start = np.repeat(lo - (np.cumsum(cnt) - cnt), cnt)
+            all_i.append(np.repeat(np.arange(len(points)), cnt))
+            all_j.append(order[run_start + np.arange(total)])
+    i = np.concatenate(all_i)
+    j = np.concatenate(all_j)
+    diff = points[i] - points[j]
+    d = np.sqrt(diff[:, 0] * diff[:, 0] + diff[:, 1] * diff[:, 1])
+    mask = (i != j) & (d <= radius)
+    return i[mask], j[mask], d[mask]
+
+
+###########################################################
+class SpatialGrid:
+    """Uniform grid of square cells used to look up nodes near a position.
+
+       A node can only hear nodes within the largest TX range, so with cells of that size
+       every possible neighbor of a node lies in its own cell or one of the 8 adjacent cells.
+
+       Attributes:
+           cell_size (double): Edge length of a cell.
+           cells (Dict of Tuple(int,int) to List of Node): Nodes stored in each non-empty cell.
+           node_cells (Dict of int to Tuple(int,int)): Cell of each stored node by node id.
+    """
+
+    ############################
+    def __init__(self, cell_size):
+        """Constructor for SpatialGrid class.
+
+           Args:
+               cell_size (double): Edge length of a cell. Should be at least the max TX range.
+
+           Returns:
+               SpatialGrid: Created SpatialGrid object.
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+        self.node_cells = {}
+
+    ############################
+    def cell_of(self, pos):
+        """Finds the cell which contains the given position.
+
+           Args:
+               pos (Tuple(double,double)): A position.
+
+           Returns:
+               Tuple(int,int): Key of the cell.
+        """
+        return int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)
+
+    ############################
+    def insert(self, node):
+        """Adds a node into the cell of its current position.
+
+           Args:
+               node (Node): Node to add.
+
+           Returns:
+
+        """
+        key = self.cell_of(node.pos)
+        self.cells.setdefault(key, []).append(node)
+        self.node_cells[node.id] = key
+
+    ############################
+    def remove(self, node):
+        """Removes a node from the cell it was inserted in, if it exists.
+
+           Args:
+               node (Node): Node to remove.
+
+           Returns:
+
+        """
+        key = self.node_cells.pop(node.id, None)
+        if key is None:
+            return
+        cell = self.cells[key]
+        cell.remove(node)
+        if not cell:
+            del self.cells[key]
+
+    ############################
+    def nearby(self, pos):
+        """Yields the nodes in the cell of given position and in its 8 adjacent cells.
+
+           Args:
+               pos (Tuple(double,double)): A position.
+
+           Returns:
+               Generator of Node: Nodes that may be within cell_size of pos.
+        """
+        cx, cy = self.cell_of(pos)
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    yield from cell
+
+
+###########################################################
+class TimerHandle:
+    """Handle of a timer set by Node.set_timer(). It is used to cancel the timer in O(1).
+    Heap kernel removes a cancelled timer from the queue. SimPy kernel can not cancel its Process,
+    so cancelling only deactivates the handle and the stale wake-up still reaches
+    Node.on_timer_fired_check(), which ignores it.
+
+       Attributes:
+           node (Node): Owner node of the timer.
+           name (string): Name of timer.
+           event (List or Process): Scheduler entry (heap kernel) or Process (SimPy kernel) of the timer.
+           active (bool): True until the timer fires or is cancelled.
+    """
+    __slots__ = ('node', 'name', 'event', 'active')
+
+    ############################
+    def __init__(self, node, name):
+        """Constructor for TimerHandle class.
+
+           Args:
+               node (Node): Owner node of the timer.
+               name (string): Name of timer.
+
+           Returns:
+               TimerHandle: Created TimerHandle object.
+        """
+        self.node = node
+        self.name = name
+        self.event = None
+        self.active = True
+
+    ############################
+    def __repr__(self):
+        """Representation method of TimerHandle.
+
+           Args:
+
+           Returns:
+               string: represents TimerHandle object as a string.
+        """
+        return '<Timer %s of node %d%s>' % (self.name, self.node.id, '' if self.active else ' inactive')
+
+    ############################
+    def cancel(self):
+        """Cancels the timer if it is active. Its scheduler entry is dropped from the event queue.
+
+           Args:
+
+           Returns:
+
+        """
+        if not self.active:
+            return
+        self.active = False
+        timers = self.node.timers
+        if timers.get(self.name) is self:
+            del timers[self.name]
+        self.node.sim.cancel(self.event)
+        self.event = None
 
 
 ###########################################################
@@ -128,10 +603,11 @@ class Node:
            is_sleep (bool): If it is True, It means node is sleeping and can not receive messages.
            Otherwise, node is awaken.
            logging (bool): It is a flag for logging. If it is True, nodes outputs can be seen in terminal.
-           active_timer_list (List of strings): It keeps the names of active timers.
-           neighbor_distance_list (List of Tuple(double,int)): Sorted list of nodes distances to other nodes.
-            Each Tuple keeps a distance and a node id.
-           timeout (Function): timeout function
+           timers (Dict of string to TimerHandle): Active timers by name. Only one timer per name can be active.
+           rx_time (double): Arrival time of the package being delivered in fan-out mode, otherwise None.
+           active_timer_list (List of strings): Names of active timers.
+           neighbor_distance_list (List of Tuple(double,Node)): Sorted list of distances to the nodes within
+            the simulator's neighbor range. Each Tuple keeps a distance and a node.
 
     """
 
@@ -155,9 +631,9 @@ class Node:
         self.ch_addr = None
         self.is_sleep = False
         self.logging = True
-        self.active_timer_list = []
+        self.timers = {}
+        self.rx_time = None
         self.neighbor_distance_list = []
-        self.timeout = self.sim.timeout
 
     ############################
     def __repr__(self):
@@ -170,6 +646,15 @@ class Node:
         """
         return '<Node %d:(%.2f,%.2f)>' % (self.id, self.pos[0], self.pos[1])
 
+    ############################
+    def __getstate__(self):
+        """Returns the pickled state of Node. Neighbors are kept by id, so pickling a node does not recurse
+        through the whole neighbor graph. Simulator.__setstate__() links them again.
+        """
+        state = self.__dict__.copy()
+        state['neighbor_distance_list'] = [(dist, node.id) for dist, node in self.neighbor_distance_list]
+        return state
+
     ############################
     @property
     def now(self):
@@ -182,6 +667,31 @@ class Node:
         """
         return self.sim.env.now
 
+    ############################
+    @property
+    def timeout(self):
+        """Property for timeout function of simulation.
+
+           Args:
+
+           Returns:
+               Function: Timeout function.
+        """
+        return self.sim.timeout
+
+    ############################
+    @property
+    def receive_time(self):
+        """Property for arrival time of the package being received. It differs from now only while a package
+        is delivered in broadcast fan-out mode.
+
+           Args:
+
+           Returns:
+               double: Arrival time of the package.
+        """
+        return self.rx_time if self.rx_time is not None else self.sim.env.now
+
     ############################
     def log(self, msg):
         """Writes outputs of node to terminal.
@@ -204,33 +714,31 @@ class Node:
            Returns:
                bool: returns True if the given package is proper to receive .
         """
-        dest = pck['next_hop'] if 'next_hop' in pck.keys() else pck['dest']
+        dest = pck['next_hop'] if 'next_hop' in pck else pck['dest']
         # Handle None destination (shouldn't happen, but be safe)
         if dest is None:
             return False
-        if dest.is_equal(BROADCAST_ADDR):  # if destination address is broadcast address
+        # Addr objects are interned, so identity is equality
+        if dest is BROADCAST_ADDR:  # if destination address is broadcast address
             return True
-        if self.addr is not None:  # if node's address is assigned
-            if dest.is_equal(self.addr):  # if destination address is node's address
-                return True
-            # if destination address is local broadcast address of node's network
-            elif dest.node_addr == config.BROADCAST_NODE_ADDR and dest.net_addr == self.addr.net_addr:
-                return True
-        if self.ch_addr is not None:  # if node's cluster head address is assigned
-            # if destination address is node's cluster head address
-            if dest.is_equal(self.ch_addr):
+        # if destination address is node's address or node's cluster head address
+        if dest is self.addr or dest is self.ch_addr:
+            return True
+        # if destination address is local broadcast address of node's network or cluster head network
+        if dest.node_addr == config.BROADCAST_NODE_ADDR:
+            if self.addr is not None and dest.net_addr == self.addr.net_addr:
                 return True
-            # if destination address is local broadcast address of node's cluster head network
-            elif dest.node_addr == config.BROADCAST_NODE_ADDR and dest.net_addr == self.ch_addr.net_addr:
+            if self.ch_addr is not None and dest.net_addr == self.ch_addr.net_addr:
                 return True
         return False
 
     ############################
     def send(self, pck):
         """Sends given package. If dest address in pck is broadcast address, it sends the package to all neighbors.
+        If pck is a Packet, each receiver gets its own copy of it.
 
            Args:
-                pck (Dict): Package to be sent. It should contain 'dest' which is destination address.
+                pck (Dict or Packet): Package to be sent. It should contain 'dest' which is destination address.
            Returns:
 
         """
@@ -247,22 +755,71 @@ class Node:
         if path is None:
             pck['path'] = [self.id]
         elif path and path[-1] != self.id:
-            pck['path'].append(self.id)
+            if isinstance(pck, Packet):
+                pck.append_path(self.id)
+            else:
+                path.append(self.id)
 
         # Also ensure source_gui is set
         pck.setdefault('source_gui', getattr(self, 'id', None))
 
+        if self.sim.fanout:
+            receivers = []
+            for (dist, node) in self.neighbor_distance_list:
+                if dist <= self.tx_range:
+                    if node.can_receive(pck):
+                        prop_time = dist / 1000000 - 0.00001 if dist / 1000000 - 0.00001 > 0 else 0.00001
+                        receivers.append((prop_time, node))
+                else:
+                    break
+            if receivers:
+                first = min(prop_time for prop_time, node in receivers)
+                self.delayed_exec(first + 0.00001, self.deliver, pck, receivers, self.now)
+            return
+
         for (dist, node) in self.neighbor_distance_list:
             if dist <= self.tx_range:
                 if node.can_receive(pck):
                     prop_time = dist / 1000000 - 0.00001 if dist / 1000000 - 0.00001 > 0 else 0.00001
-                    self.delayed_exec(prop_time, node.on_receive_check, pck)
+                    self.delayed_exec(prop_time, node.on_receive_check,
+                                      pck.copy() if isinstance(pck, Packet) else pck)
             else:
                 break
 
+    ############################
+    def deliver(self, pck, receivers, sent_at):
+        """Delivers a package sent in fan-out mode to all receivers in one event, in ascending distance order.
+        While a receiver handles the package, its rx_time is the time the package would arrive at it.
+
+           Args:
+                pck (Dict or Packet): Package sent.
+                receivers (List of Tuple(double,Node)): Propagation time and node of each receiver.
+                sent_at (double): Time the package was sent.
+           Returns:
+
+        """
+        is_packet = isinstance(pck, Packet)
+        for prop_time, node in receivers:
+            if not node.is_sleep:
+                node.rx_time = sent_at + prop_time + 0.00001
+                node.on_receive(pck.copy() if is_packet else pck)
+                node.rx_time = None
+
+    ############################
+    @property
+    def active_timer_list(self):
+        """Property for names of active timers.
+
+           Args:
+
+           Returns:
+               List of strings: Names of active timers.
+        """
+        return list(self.timers)
+
     ############################
     def set_timer(self, name, time, *args, **kwargs):
-        """Sets a timer with a given name. It appends name of timer to the active timer list.
+        """Sets a timer with a given name. If a timer with the same name is active, it is cancelled first.
 
            Args:
                 name (string): Name of timer.
@@ -270,23 +827,30 @@ class Node:
                 *args (string): Additional args.
                 **kwargs (string): Additional key word args.
            Returns:
+                TimerHandle: Handle of the timer.
 
         """
-        self.active_timer_list.append(name)
-        self.delayed_exec(
-            time - 0.00001, self.on_timer_fired_check, name, *args, **kwargs)
+        old = self.timers.get(name)
+        if old is not None:
+            old.cancel()
+        handle = TimerHandle(self, name)
+        self.timers[name] = handle
+        handle.event = self.delayed_exec(
+            time - 0.00001, self.on_timer_fired_check, handle, *args, **kwargs)
+        return handle
 
     ############################
     def kill_timer(self, name):
-        """Kills a timer with a given name. It removes name of timer from the active timer list if exists.
+        """Kills a timer with a given name or handle, if it is active.
 
            Args:
-                name (string): Name of timer.
+                name (string or TimerHandle): Name or handle of timer.
            Returns:
 
         """
-        if name in self.active_timer_list:
-            self.active_timer_list.remove(name)
+        handle = name if isinstance(name, TimerHandle) else self.timers.get(name)
+        if handle is not None:
+            handle.cancel()
 
     ############################
     def kill_all_timers(self):
@@ -297,7 +861,8 @@ class Node:
            Returns:
 
         """
-        self.active_timer_list = []
+        for handle in list(self.timers.values()):
+            handle.cancel()
 
     ############################
     def delayed_exec(self, delay, func, *args, **kwargs):
@@ -387,20 +952,23 @@ class Node:
         pass
 
     ############################
-    def on_timer_fired_check(self, name, *args, **kwargs):
-        """Checks if the timer about to fire is in active timer list or not. If not, does not call on_timer_fired().
+    def on_timer_fired_check(self, handle, *args, **kwargs):
+        """Checks if the timer about to fire is still active or not. If not, does not call on_timer_fired().
+        Heap kernel drops cancelled timers from the queue, SimPy kernel still delivers them here.
 
            Args:
-                name (string): Name of timer.
+                handle (TimerHandle): Handle of timer.
                 *args (string): Additional args.
                 **kwargs (string): Additional key word args.
            Returns:
 
         """
-        if name in self.active_timer_list:
-            self.active_timer_list.remove(name)
+        if handle.active:
+            handle.active = False
+            handle.event = None
+            del self.timers[handle.name]
             self.delayed_exec(0.00001, self.on_timer_fired,
-                              name, *args, **kwargs)
+                              handle.name, *args, **kwargs)
 
     ############################
     def sleep(self):
@@ -446,11 +1014,27 @@ class Simulator:
            duration (double): Duration of simulation.
            random (Random): Random object to use.
            timeout (Function): Timeout Function.
+           neighbor_range (double): Max distance kept in neighbor lists. It is the max TX range.
+           grid (SpatialGrid): Spatial index of nodes with cells of neighbor_range size.
+           kernel (string): 'simpy' runs every delayed_exec() as a SimPy process. 'heap' keeps a heap of
+            (time, seq, callback, args, kwargs) entries and calls callbacks directly. SimPy is then only used
+            for generator processes such as generator run() methods.
+           event_count (int): Number of callbacks scheduled with delayed_exec().
+           fanout (bool): If True, each transmission is delivered to all its receivers in a single event
+            instead of two events per receiver.
+           trace (TraceWriter): Buffered writer of trace files (CSV or columnar). It is flushed when run() ends.
+           params (object): Config values (attributes named like in config.py) used by the simulator and nodes.
+           checkpoint_interval (double): Sim seconds between checkpoints written by run(), 0 for none.
+           checkpoint_path (string): File of the checkpoints written by run().
+           profiler (Profiler): Event counters and handler wall times, or None if SIM_PROFILE is not set.
+           COMPACT_THRESHOLD (int): Min number of cancelled heap entries before the heap is compacted.
 
     """
+    COMPACT_THRESHOLD = 1024
+    CHECKPOINT_VERSION = 1
 
     ############################
-    def __init__(self, duration, timescale=1, seed=0):
+    def __init__(self, duration, timescale=1, seed=0, kernel=None, params=None, output_dir='.'):
         """Constructor for Simulator class.
 
            Args:
@@ -458,20 +1042,48 @@ class Simulator:
                 timescale (double): Seconds in real time for 1 second in simulation. It arranges speed of simulation
                                   If <= 0, uses regular Environment (no real-time delays, runs as fast as possible)
                 seed (double): seed for Random bbject.
+                kernel (string): 'simpy' or 'heap'. If None, params.SIM_KERNEL is used.
+                params (object): Config values, e.g. a RunParams object. If None, the config module is used.
+                output_dir (string): Directory of the trace files.
 
            Returns:
                 Simulator: Created Simulator object.
         """
-        # Use regular Environment (no real-time delays) if timescale <= 0 for maximum speed
-        if timescale > 0:
+        self.params = params if params is not None else config
+        self.kernel = kernel if kernel is not None else getattr(self.params, 'SIM_KERNEL', 'simpy')
+        if self.kernel not in ('simpy', 'heap'):
+            raise ValueError('Unknown simulation kernel: %s' % self.kernel)
+        self.checkpoint_interval = getattr(self.params, 'CHECKPOINT_INTERVAL', 0)
+        self.checkpoint_path = os.path.join(output_dir, getattr(self.params, 'CHECKPOINT_FILE', 'checkpoint.pkl'))
+        self._checkpoint_count = 0
+        if self.checkpoint_interval and self.kernel != 'heap':
+            raise ValueError('Checkpoints need the heap kernel')
+        # Use regular Environment (no real-time delays) if timescale <= 0 for maximum speed.
+        # Heap kernel keeps real-time pace by itself.
+        if timescale > 0 and self.kernel == 'simpy':
             self.env = simpy.rt.RealtimeEnvironment(factor=timescale, strict=False)
         else:
             self.env = simpy.Environment()
+        self._queue = [] if self.kernel == 'heap' else None
+        self._seq = 0
+        self._cancelled = 0
+        self.event_count = 0
+        self.profiler = profiler.Profiler() if getattr(self.params, 'SIM_PROFILE', False) else None
+        self.fanout = getattr(self.params, 'SIM_BROADCAST_FANOUT', False)
+        self.trace = trace.TraceWriter(getattr(self.params, 'TRACE_FLUSH_SIZE', 1000),
+                                       getattr(self.params, 'TRACE_BACKGROUND', True),
+                                       getattr(self.params, 'TRACE_FORMAT', 'csv'),
+                                       getattr(self.params, 'TRACE_COMPRESS', False),
+                                       output_dir)
         self.nodes = []
         self.duration = duration
         self.timescale = timescale
         self.random = random.Random(seed)
         self.timeout = self.env.timeout
+        # Nodes can not hear each other beyond the max TX range, so neighbor lists are kept within it
+        tx_ranges = list(getattr(self.params, 'NODE_TX_RANGES', {}).values()) + [self.params.NODE_TX_RANGE]
+        self.neighbor_range = max(tx_ranges) * self.params.SCALE
+        self.grid = SpatialGrid(self.neighbor_range)
         # Packet tracking attributes
         self.packet_seq = 0
         self.packet_log = []
@@ -499,10 +1111,141 @@ class Simulator:
                 *args (double): Function args.
                 delay (double): Function key word args.
            Returns:
+                List or Process: Scheduled event. It can be given to cancel() in heap kernel.
 
         """
+        self.event_count += 1
+        if self.profiler is not None:
+            self.profiler.scheduled(func, args)
+        if self._queue is not None:
+            if delay < 0:
+                raise ValueError('delay(=%s) must be >= 0.' % delay)
+            event = [self.env._now + delay, self._seq, func, args, kwargs]
+            heapq.heappush(self._queue, event)
+            self._seq += 1
+            return event
+        if self.profiler is not None and not inspect.isgeneratorfunction(func):
+            func, args, kwargs = self.profiler.call, (func, args, kwargs), {}
         func = ensure_generator(self.env, func, *args, **kwargs)
-        start_delayed(self.env, func, delay=delay)
+        return start_delayed(self.env, func, delay=delay)
+
+    ############################
+    def cancel(self, event):
+        """Cancels an event scheduled with delayed_exec() in heap kernel. Cancelled entries are skipped when
+        they are popped, and the heap is compacted when they become more than half of it.
+        SimPy processes can not be cancelled, so it does nothing in SimPy kernel.
+
+           Args:
+                event (List): Scheduled event returned by delayed_exec().
+           Returns:
+
+        """
+        if self._queue is None or event is None or event[2] is None:
+            return
+        event[2] = event[3] = event[4] = None
+        self._cancelled += 1
+        if self._cancelled > self.COMPACT_THRESHOLD and self._cancelled * 2 > len(self._queue):
+            self._queue[:] = [e for e in self._queue if e[2] is not None]
+            heapq.heapify(self._queue)
+            self._cancelled = 0
+
+    ############################
+    def __getstate__(self):
+        """Returns the pickled state of Simulator. SimPy environment and trace writer are left out,
+        see save_checkpoint() and load_checkpoint().
+        """
+        state = self.__dict__.copy()
+        del state['env'], state['timeout'], state['trace']
+        state['_env_now'] = self.env.now
+        if state['params'] is config:
+            state['params'] = None
+        return state
+
+    ############################
+    def __setstate__(self, state):
+        """Restores Simulator from its pickled state with a new SimPy environment at the pickled time."""
+        now = state.pop('_env_now')
+        self.__dict__.update(state)
+        if self.params is None:
+            self.params = config
+        # nodes are restored before their simulator, their neighbor lists still hold ids
+        nodes = self.nodes
+        for node in nodes:
+            node.neighbor_distance_list = [(dist, nodes[id]) for dist, id in node.neighbor_distance_list]
+        self.env = simpy.Environment(initial_time=now)
+        self.timeout = self.env.timeout
+        self.trace = None
+
+    ############################
+    def save_checkpoint(self, path=None):
+        """Writes the full state of the simulation to a checkpoint file: event queue, nodes and their
+        timers, random state, every object reachable from the simulator (e.g. its ctx) and the sizes
+        of the trace files. The file is replaced atomically. Scheduled callbacks and their args should
+        be picklable, i.e. bound methods or module level functions, not lambdas or closures.
+        Only heap kernel runs without pending SimPy processes can be checkpointed.
+
+           Args:
+                path (string): Checkpoint file. If None, checkpoint_path is used.
+           Returns:
+
+        """
+        if self._queue is None:
+            raise ValueError('Checkpoints need the heap kernel')
+        if self.env.peek() != float('inf'):
+            raise ValueError('SimPy processes can not be checkpointed')
+        path = path if path is not None else self.checkpoint_path
+        state = {'version': self.CHECKPOINT_VERSION, 'time': self.now, 'trace': self.trace.checkpoint(), 'sim': self}
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    ############################
+    def _run_heap(self, until):
+        """Runs heap kernel events and SimPy events in time order until given time.
+        Heap callbacks returning a generator are started as SimPy processes.
+
+           Args:
+                until (double): Simulation time to stop at.
+           Returns:
+
+        """
+        queue = self._queue
+        env = self.env
+        heappop = heapq.heappop
+        profiler = self.profiler
+        realtime = self.timescale > 0
+        wall_start = time.monotonic()
+        sim_start = env.now
+        while True:
+            env_time = env.peek()
+            if queue and queue[0][0] <= env_time:
+                if queue[0][2] is None:
+                    # cancelled entry
+                    heappop(queue)
+                    self._cancelled -= 1
+                    continue
+                event_time = queue[0][0]
+                if event_time >= until:
+                    break
+                if realtime:
+                    delay = wall_start + (event_time - sim_start) * self.timescale - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                event_time, _, func, args, kwargs = heappop(queue)
+                env._now = event_time
+                if profiler is None:
+                    result = func(*args, **kwargs)
+                else:
+                    result = profiler.call(func, args, kwargs)
+                if type(result) is GeneratorType:
+                    env.process(result)
+            else:
+                if env_time >= until:
+                    break
+                env.step()
+        if until != float('inf'):
+            env._now = until
 
     ############################
     def add_node(self, node_class, pos):
@@ -520,11 +1263,69 @@ class Simulator:
         self.update_neighbor_list(id)
         return node
 
+    ############################
+    def add_nodes(self, node_class, positions):
+        """Adds many nodes in to network at once. Neighbor distances of all new nodes are computed in one
+        batched pass and neighbor lists are filled without a per node update_neighbor_list() call.
+
+           Args:
+                node_class (Class): Node class inherited from Node.
+                positions (ndarray or List of Tuple(double,double)): (N,2) positions of nodes.
+           Returns:
+                List of nodeclass object: Created nodeclass objects
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        # Nodes and neighbor tuples are created in bulk and never freed here, so cyclic
+        # garbage collection passes during construction are wasted work
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._add_nodes(node_class, positions)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    ############################
+    def _add_nodes(self, node_class, positions):
+        """Creates nodes for add_nodes() and fills neighbor lists of new nodes and their neighbors."""
+        first = len(self.nodes)
+        new_nodes = []
+        for pos in positions.tolist():
+            node = node_class(self, len(self.nodes), tuple(pos))
+            self.nodes.append(node)
+            self.grid.insert(node)
+            new_nodes.append(node)
+        if not new_nodes:
+            return new_nodes
+
+        all_pos = np.array([n.pos for n in self.nodes])
+        i, j, d = pairs_within(all_pos, self.neighbor_range)
+        # pairs between two old nodes are already in the lists
+        mask = (i >= first) | (j >= first)
+        i, j, d = i[mask], j[mask], d[mask]
+        order = np.lexsort((d, i))
+        i, j, d = i[order], j[order], d[order]
+        bounds = np.searchsorted(i, np.arange(len(self.nodes) + 1)).tolist()
+        nodes = self.nodes
+        pairs = list(zip(d.tolist(), map(nodes.__getitem__, j.tolist())))
+        for k, n in enumerate(nodes):
+            lo, hi = bounds[k], bounds[k + 1]
+            if lo == hi:
+                continue
+            added = pairs[lo:hi]
+            if k >= first:
+                n.neighbor_distance_list = added
+            else:
+                n.neighbor_distance_list.extend(added)
+                n.neighbor_distance_list.sort(key=lambda t: t[0])
+        return new_nodes
+
     ############################
     def update_neighbor_list(self, id):
         '''
         Maintain each node's neighbor list by sorted distance after affected
-        by addition or relocation of node with ID id
+        by addition or relocation of node with ID id. Only nodes in the grid
+        cells around its old and new positions are touched.
 
         Args:
             id (int): Global unique id of node
@@ -533,33 +1334,53 @@ class Simulator:
         '''
         me = self.nodes[id]
 
-        # (re)sort other nodes' neighbor lists by distance
-        for n in self.nodes:
-            # skip this node
-            if n is me:
-                continue
-
+        # remove this node from its old neighbors' lists
+        for (dist, n) in me.neighbor_distance_list:
             nlist = n.neighbor_distance_list
-
-            # remove this node from other nodes' neighbor lists
-            for i, (dist, neighbor) in enumerate(nlist):
+            for i, (d, neighbor) in enumerate(nlist):
                 if neighbor is me:
                     del nlist[i]
                     break
 
-            # then insert it while maintaining sort order by distance
-            bisect.insort(nlist, (distance(n.pos, me.pos), me))
+        self.grid.remove(me)
+        self.grid.insert(me)
 
-        self.nodes[id].neighbor_distance_list = [
-            (distance(n.pos, me.pos), n)
-            for n in self.nodes if n is not me
-        ]
-        self.nodes[id].neighbor_distance_list.sort()
+        # then insert it into its new neighbors' lists while maintaining sort order by distance
+        mylist = []
+        for n in self.grid.nearby(me.pos):
+            # skip this node
+            if n is me:
+                continue
+            dist = distance(n.pos, me.pos)
+            if dist <= self.neighbor_range:
+                bisect.insort(n.neighbor_distance_list, (dist, me))
+                mylist.append((dist, n))
+        mylist.sort()
+        me.neighbor_distance_list = mylist
 
     ############################
     def run(self):
         """Runs the simulation. It initialize every node, then executes each nodes run function.
-        Finally calls finish functions of nodes.
+        Finally calls finish functions of nodes. Trace files are flushed even if the run is interrupted.
+        If checkpoint_interval is set, a checkpoint is written every checkpoint_interval sim seconds.
+
+           Args:
+
+           Returns:
+
+        """
+        try:
+            self.start()
+            self.run_until(self.duration)
+            for n in self.nodes:
+                n.finish()
+        finally:
+            self.trace.flush()
+
+    ############################
+    def start(self):
+        """Initializes every node and starts its run function. run() calls it; call it directly to run
+        a simulation in parts with run_until() and resume().
 
            Args:
 
@@ -568,8 +1389,83 @@ class Simulator:
         """
         for n in self.nodes:
             n.init()
-        for n in self.nodes:
-            self.env.process(ensure_generator(self.env, n.run))
-        self.env.run(until=self.duration)
-        for n in self.nodes:
-            n.finish()
+        if self._queue is not None:
+            for n in self.nodes:
+                result = n.run()
+                if type(result) is GeneratorType:
+                    self.env.process(result)
+        else:
+            for n in self.nodes:
+                self.env.process(ensure_generator(self.env, n.run))
+
+    ############################
+    def resume(self):
+        """Continues a simulation loaded with load_checkpoint() until its duration and calls finish
+        functions of nodes. Nodes are not initialized again. Events run exactly as they would have
+        in the run the checkpoint was taken from.
+
+           Args:
+
+           Returns:
+
+        """
+        try:
+            self.run_until(self.duration)
+            for n in self.nodes:
+                n.finish()
+        finally:
+            self.trace.flush()
+
+    ############################
+    def run_until(self, until):
+        """Runs events before given simulation time, stopping to write a checkpoint every
+        checkpoint_interval sim seconds. Events at until are left for the next call.
+
+           Args:
+                until (double): Simulation time to stop at.
+           Returns:
+
+        """
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+            try:
+                self._run_until(until)
+            finally:
+                self.profiler.run_ns += time.perf_counter_ns() - start
+        else:
+            self._run_until(until)
+
+    ############################
+    def _run_until(self, until):
+        """Runs events of run_until()."""
+        if self._queue is None:
+            self.env.run(until=until)
+            return
+        if self.checkpoint_interval:
+            # checkpoint times are counted, so a resumed run stops at the same times
+            while (self._checkpoint_count + 1) * self.checkpoint_interval < until:
+                self._run_heap((self._checkpoint_count + 1) * self.checkpoint_interval)
+                self._checkpoint_count += 1
+                self.save_checkpoint()
+        self._run_heap(until)
+
+
+###########################################################
+def load_checkpoint(path):
+    """Loads a simulation from a checkpoint file written by Simulator.save_checkpoint(). Its trace
+    files are reopened and cut back to their sizes at the checkpoint. Call resume() to continue it.
+    Modules of the pickled node classes and callbacks should be importable.
+
+       Args:
+           path (string): Checkpoint file.
+
+       Returns:
+           Simulator: Restored Simulator object.
+    """
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != Simulator.CHECKPOINT_VERSION:
+        raise ValueError('Unsupported checkpoint version: %s' % state.get('version'))
+    sim = state['sim']
+    sim.trace = trace.TraceWriter.resume(state['trace'])
+    return sim
@@ -1,10 +1,9 @@
 """Visualisation of wsnlab library. Based on wsnsimpy_tk. Used package instead of message by Mustafa Tosun.
+topovis and Tk are only imported when a visual Simulator is created, headless runs use NullScene.
 """
 from source import wsnlab
 from source.wsnlab import *
 from threading import Thread
-from topovis import Scene
-from topovis.TkPlotter import Plotter
 
 
 class Node(wsnlab.Node):
@@ -46,7 +45,7 @@ class Node(wsnlab.Node):
             self.sim.total_tx_attempts += 1
         
         # Simulate packet loss
-        if random.random() < config.PACKET_LOSS_RATIO:
+        if self.sim.random.random() < self.sim.params.PACKET_LOSS_RATIO:
             # Count drops
             if hasattr(self.sim, "total_tx_dropped"):
                 self.sim.total_tx_dropped += 1
@@ -83,8 +82,9 @@ class Node(wsnlab.Node):
            Returns:
 
         """
-        obj_id = self.scene.circle(
-            self.pos[0], self.pos[1], self.tx_range, line="wsnsimpy:tx")
+        if self.sim.visual:
+            obj_id = self.scene.circle(
+                self.pos[0], self.pos[1], self.tx_range, line="wsnsimpy:tx")
         # self.delayed_exec(0.2, self.scene.delshape, obj_id)
 
     def move(self, x, y):
@@ -109,7 +109,8 @@ class Node(wsnlab.Node):
            Returns:
 
         """
-        self.scene.addlink(self.parent_gui, self.id, "parent")
+        if self.sim.visual:
+            self.scene.addlink(self.parent_gui, self.id, "parent")
 
     ####################
     def erase_parent(self):
@@ -120,17 +121,126 @@ class Node(wsnlab.Node):
            Returns:
 
         """
-        if self.parent_gui is not None:
+        if self.parent_gui is not None and self.sim.visual:
             self.scene.dellink(self.parent_gui, self.id, "parent")
 
 
 ###########################################################
-class _FakeScene:
-    def _fake_method(self, *args, **kwargs):
+class NullScene:
+    """Scene of headless runs. It has the drawing methods of topovis Scene as no-ops, so calls cost a plain
+    method call. Hot paths should still check Simulator.visual and skip drawing entirely. Method signatures
+    mirror topovis.Scene, see it for the arguments.
+    """
+
+    ####################
+    def init(self, tx, ty):
+        """Initializes the scene. Does nothing."""
+        pass
+
+    ####################
+    def setTime(self, time):
+        """Sets the current time of the scene. Does nothing."""
+        pass
+
+    ####################
+    def node(self, id, x, y):
+        """Defines a node at (x,y). Does nothing."""
+        pass
+
+    ####################
+    def nodemove(self, id, x, y):
+        """Moves a node to (x,y). Does nothing."""
+        pass
+
+    ####################
+    def nodehollow(self, id, flag):
+        """Sets hollow display of a node. Does nothing."""
+        pass
+
+    ####################
+    def nodedouble(self, id, flag):
+        """Sets double-outline display of a node. Does nothing."""
+        pass
+
+    ####################
+    def nodecolor(self, id, r, g, b):
+        """Sets rgb color of a node. Does nothing."""
+        pass
+
+    ####################
+    def nodewidth(self, id, width):
+        """Sets outline width of a node. Does nothing."""
+        pass
+
+    ####################
+    def nodelabel(self, id, label):
+        """Sets label of a node. Does nothing."""
+        pass
+
+    ####################
+    def nodescale(self, id, scale):
+        """Sets scaling factor of a node. Does nothing."""
+        pass
+
+    ####################
+    def addlink(self, src, dst, style):
+        """Adds a link with given style between two nodes. Does nothing."""
         pass
 
-    def __getattr__(self, name):
-        return self._fake_method
+    ####################
+    def dellink(self, src, dst, style):
+        """Removes a link with given style between two nodes. Does nothing."""
+        pass
+
+    ####################
+    def clearlinks(self):
+        """Deletes all links. Does nothing."""
+        pass
+
+    ####################
+    def show(self):
+        """Forces update of topology view. Does nothing."""
+        pass
+
+    ####################
+    def circle(self, x, y, r, id=None, line=None, fill=None, delay=None):
+        """Draws or updates a circle. Does nothing."""
+        pass
+
+    ####################
+    def line(self, x1, y1, x2, y2, id=None, line=None, delay=None):
+        """Draws or updates a line. Does nothing."""
+        pass
+
+    ####################
+    def rect(self, x1, y1, x2, y2, id=None, line=None, fill=None, delay=None):
+        """Draws or updates a rectangle. Does nothing."""
+        pass
+
+    ####################
+    def delshape(self, id):
+        """Deletes a shape drawn before. Does nothing."""
+        pass
+
+    ####################
+    def linestyle(self, id, **kwargs):
+        """Defines or redefines a line style. Does nothing."""
+        pass
+
+    ####################
+    def fillstyle(self, id, **kwargs):
+        """Defines or redefines a fill style. Does nothing."""
+        pass
+
+    ####################
+    def textstyle(self, id, **kwargs):
+        """Defines or redefines a text style. Does nothing."""
+        pass
+
+    ####################
+    def addPlotter(self, plotter):
+        """Adds a plotter of scene scripts. Does nothing."""
+        pass
 
 
 ###########################################################
@@ -142,11 +252,12 @@ class Simulator(wsnlab.Simulator):
     main thread
 
     Attributes:
-        visual (bool): A flag to visualising process.
+        visual (bool): A flag to visualising process. If False, scene is a NullScene.
         terrain_size (Tuple(double,double)): Size of visualised terrain.
     '''
 
-    def __init__(self, duration, timescale=1, seed=0, terrain_size=(1000, 1000), visual=True, title=None):
+    def __init__(self, duration, timescale=1, seed=0, terrain_size=(1000, 1000), visual=True, title=None,
+                 kernel=None, params=None, output_dir='.'):
         """Constructor for visualised Simulator class.
 
            Args:
@@ -156,17 +267,24 @@ class Simulator(wsnlab.Simulator):
                terrain_size (Tuple(double,double)): Size of visualised terrain.
                visual (bool): A flag to visualising process.
                title (string): Title of scene.
+               kernel (string): Simulation kernel, 'simpy' or 'heap'. If None, params.SIM_KERNEL is used.
+               params (object): Config values, e.g. a RunParams object. If None, the config module is used.
+               output_dir (string): Directory of the trace files.
 
            Returns:
                Simulator: Created Simulator object.
         """
-        super().__init__(duration, timescale, seed)
+        super().__init__(duration, timescale, seed, kernel, params, output_dir)
+        if visual and self.checkpoint_interval:
+            raise ValueError('Visual simulations can not be checkpointed')
         self.visual = visual
         self.terrain_size = terrain_size
         # Packet loss statistics
         self.total_tx_attempts = 0
         self.total_tx_dropped = 0
         if self.visual:
+            from topovis import Scene
+            from topovis.TkPlotter import Plotter
             self.scene = Scene(realtime=True)
             self.scene.linestyle("wsnsimpy:tx", color=(0, 0, 1), dash=(5, 5))
             self.scene.linestyle("wsnsimpy:tx_root", color=(0, 1, 1), dash=(5, 5))  # Cyan for root TX range
@@ -184,7 +302,7 @@ class Simulator(wsnlab.Simulator):
             self.scene.addPlotter(self.tkplot)
             self.scene.init(*terrain_size)
         else:
-            self.scene = _FakeScene()
+            self.scene = NullScene()
 
     def _update_time(self):
         """Updates time in scene.
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Parameter sweeps of the data collection tree scenario with an on-disk result cache.
+
+A sweep is a list of points, each a dict of config overrides, run with every seed. The points
+come from a grid (cartesian product of value lists) or from a JSON list of override dicts.
+Each (point, seed) run is keyed by the SHA-256 of its fully resolved config (config.py values
+with the overrides applied), the seed and the code version (hash of data_collection_tree.py and
+source/*.py except config.py). Runs whose key is already in the cache are not run again; the
+missing ones run in parallel on a ProcessPoolExecutor, and their summary records (see
+replicate.py) are stored in the cache as soon as they finish. Adding a value to a sweep only
+runs the new points, and editing the simulator code invalidates every cached result.
+
+Outputs in <out>:
+    sweep.csv          one row per (point, seed): swept parameters, seed, key, cached, metrics
+    sweep_summary.csv  one row per point and metric: n, mean, std and 95% confidence interval
+
+Usage (from wsnlab directory):
+    python sweep.py --grid "PACKET_LOSS_RATIO=[0.0, 0.05, 0.1]" --grid "SIM_NODE_COUNT=[50, 100]" \\
+        [--seeds 3] [--workers W] [--cache DIR] [--out DIR]
+    python sweep.py --points points.json [...]
+"""
+
+import argparse
+import ast
+import csv
+import glob
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import data_collection_tree
+import replicate
+
+WSNLAB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_version():
+    """SHA-256 of the simulation code: data_collection_tree.py and source/*.py except config.py.
+    config.py is left out because its values are part of every resolved config."""
+    paths = [os.path.join(WSNLAB_DIR, "data_collection_tree.py")]
+    paths += sorted(p for p in glob.glob(os.path.join(WSNLAB_DIR, "source", "*.py"))
+                    if os.path.basename(p) != "config.py")
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, WSNLAB_DIR).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def resolve_config(overrides, seed):
+    """Fully resolved config values of a run, as run_replication() would run it."""
+    params = data_collection_tree.RunParams(dict(overrides, SEED=seed, SIM_VISUALIZATION=False))
+    return {name: value for name, value in vars(params).items() if name.isupper()}
+
+
+def run_key(overrides, seed, version):
+    """Cache key of a run: SHA-256 of its resolved config, seed and code version."""
+    blob = json.dumps({"config": resolve_config(overrides, seed), "seed": seed, "code": version},
+                      sort_keys=True, default=repr)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def grid_points(grid):
+    """Cartesian product of a dict of name -> list of values, as a list of override dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+class ResultCache:
+    """Summary records of finished runs, one JSON file per key under <path>/<key[:2]>/.
+
+       Attributes:
+           path (string): Cache directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def get(self, key):
+        """Returns the cached entry of a key, or None."""
+        try:
+            with open(self._file(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        """Stores an entry. The file is written under a temporary name and renamed, so an
+        interrupted sweep never leaves a partial entry."""
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f, default=repr)
+        os.replace(tmp, path)
+
+    def run_dir(self, key):
+        """Output directory of the run of a key."""
+        return os.path.join(self.path, "runs", key)
+
+
+def run_sweep(points, seeds, workers=None, cache_dir=".sweep_cache", output_dir="sweep", progress=True):
+    """Runs every point with every seed, skipping runs found in the cache.
+
+    Args:
+        points (List of Dicts): Config overrides of each point.
+        seeds (List of int): Seeds each point is run with.
+        workers (int): Worker processes for missing runs. None uses every core.
+        cache_dir (string): Result cache directory. Run outputs go to <cache_dir>/runs/<key>/.
+        output_dir (string): Directory of sweep.csv and sweep_summary.csv.
+        progress (bool): If True, print a line per finished run.
+
+    Returns:
+        List of Dicts: One row per (point, seed) with the point overrides, seed, key, cached flag
+        and summary record metrics.
+    """
+    cache = ResultCache(cache_dir)
+    version = code_version()
+    runs = [(i, point, seed, run_key(point, seed, version))
+            for i, point in enumerate(points) for seed in seeds]
+    entries = {key: cache.get(key) for _, _, _, key in runs}
+    missing = {key: (point, seed) for _, point, seed, key in runs if entries[key] is None}
+    cached = {key for key in entries if entries[key] is not None}
+    if progress:
+        print(f"{len(runs)} runs: {len(cached)} cached, {len(missing)} to run")
+
+    if missing:
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(missing))) as pool:
+            futures = {pool.submit(replicate.run_replication, seed, point, cache.run_dir(key)): key
+                       for key, (point, seed) in missing.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                point, seed = missing[key]
+                entry = {"overrides": point, "seed": seed, "code_version": version,
+                         "record": future.result()}
+                cache.put(key, entry)
+                entries[key] = entry
+                if progress:
+                    print(f"[{done}/{len(missing)}] {point} seed {seed} done "
+                          f"({time.time() - start:.1f} s elapsed)")
+
+    rows = []
+    for i, point, seed, key in runs:
+        row = {"point": i}
+        row.update(point)
+        row.update(seed=seed, key=key[:16], cached=key in cached)
+        row.update((m, entries[key]["record"].get(m)) for m in replicate.METRICS)
+        rows.append(row)
+    _write_tables(rows, points, output_dir)
+    return rows
+
+
+def _write_tables(rows, points, output_dir):
+    """Writes sweep.csv and sweep_summary.csv."""
+    os.makedirs(output_dir, exist_ok=True)
+    names = []
+    for point in points:
+        names += [n for n in point if n not in names]
+    columns = ["point"] + names + ["seed", "key", "cached"] + replicate.METRICS
+    with open(os.path.join(output_dir, "sweep.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with open(os.path.join(output_dir, "sweep_summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["point"] + names + ["metric", "n", "mean", "std",
+                                                                  "ci_low", "ci_high", "min", "max"],
+                                restval="")
+        writer.writeheader()
+        for i, point in enumerate(points):
+            for agg in replicate.aggregate([r for r in rows if r["point"] == i]):
+                writer.writerow(dict(agg, point=i, **point))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=[V1, V2, ...]",
+                        help="swept config name and Python list of values")
+    parser.add_argument("--points", help="JSON file with a list of override dicts")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help="config override shared by all points")
+    parser.add_argument("--seeds", type=int, default=1, help="seeds per point (1 .. SEEDS)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--cache", default=".sweep_cache", help="result cache directory")
+    parser.add_argument("--out", default="sweep", help="output directory")
+    args = parser.parse_args()
+
+    grid = {}
+    for item in args.grid:
+        name, _, values = item.partition("=")
+        grid[name] = list(ast.literal_eval(values))
+    points = grid_points(grid) if grid else [{}]
+    if args.points:
+        with open(args.points) as f:
+            points = json.load(f) if not grid else points + json.load(f)
+    shared = replicate.parse_overrides(args.overrides)
+    points = [dict(shared, **point) for point in points]
+
+    run_sweep(points, list(range(1, args.seeds + 1)), args.workers, args.cache, args.out)
+    print(f"\n📁 Tables written to {os.path.join(args.out, 'sweep.csv')} and "
+          f"{os.path.join(args.out, 'sweep_summary.csv')}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())